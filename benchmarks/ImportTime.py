@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.ImportTime
+Measures how long it takes a fresh python process to import the packages,
+compared with loading everything up front (which is what importing the
+packages used to do).
+
+Run from the repository's parent directory or the repository itself:
+    python benchmarks/ImportTime.py [--runs 10]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each scenario is a snippet run in a fresh process
+scenarios = {
+    'baseline (python -c pass)': 'pass',
+    'import judges': 'import judges',
+    'from judges import NameFinder': 'from judges import NameFinder',
+    'judges, everything loaded': 'import judges\n'
+                                 'from judges import LoadData, QueryTools, NameFinder\n'
+                                 'QueryTools.CourtAbbreviations()',
+    'import dispositions': 'import dispositions',
+    'dispositions, everything loaded': 'from dispositions import CivilDictionaryClassifier as c\n'
+                                       'c.Stemmer(); c.SentTokenizer(); c.Dictionaries(); c.DefaultNormalizer()',
+}
+
+def TimeSnippet(snippet, runs=10):
+    """
+    Runs snippet in runs fresh processes
+    :return: list of wall times (seconds), or str with the error
+    """
+    times = []
+    for n in range(runs):
+        start = time.perf_counter()
+        p = subprocess.run([sys.executable, '-c', snippet], cwd=repo_path,
+                           stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        times.append(time.perf_counter() - start)
+        if p.returncode != 0:
+            return p.stderr.decode('utf-8').strip().split('\n')[-1]
+    return times
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Time package imports in fresh processes.')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--json', default=None, help='also write results to this file')
+    args = parser.parse_args(args)
+
+    results = {}
+    for name in scenarios:
+        times = TimeSnippet(scenarios[name], args.runs)
+        if type(times) is str:
+            results[name] = {'error': times}
+            print('{:35s} failed: {}'.format(name, times))
+        else:
+            results[name] = {'median_ms': 1000 * statistics.median(times),
+                             'min_ms': 1000 * min(times), 'runs': args.runs}
+            print('{:35s} {:8.1f} ms (min {:.1f} ms)'.format(name, results[name]['median_ms'],
+                                                          results[name]['min_ms']))
+    if args.json is not None:
+        with open(args.json, 'w') as fp:
+            json.dump(results, fp, indent=4)
+
+if __name__ == '__main__':
+    main()
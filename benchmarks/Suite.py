@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.Suite
+Times the package's hot paths (NameFinder, Classify, SittingJudges,
+ReshapeData) on synthetic data (see benchmarks.Synthetic) at several input
+sizes. Runs offline: the court files SittingJudges and ReshapeData read
+(courts.csv, states.txt) are also synthetic. Results can be saved as JSON and compared with an
+earlier run, e.g., before and after a commit:
+    python benchmarks/Suite.py --json before.json
+    python benchmarks/Suite.py --json after.json --compare before.json
+Use --quick for smaller inputs, and --only to run some benchmarks, e.g.
+    python benchmarks/Suite.py --only NameFinder "NameFinder (NameIndex)"
+Benchmarks that cannot run (e.g., NLTK is not installed) are reported and skipped.
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import random
+import argparse
+import platform
+import datetime
+import tempfile
+import statistics
+import subprocess
+
+repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_path)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import Synthetic
+
+def Time(run, setup=None, repeat=3):
+    """
+    Times run(*setup()) repeat times (setup is not timed)
+    :return: list of wall times (seconds)
+    """
+    times = []
+    for n in range(repeat):
+        args = setup() if setup is not None else ()
+        start = time.perf_counter()
+        run(*args)
+        times.append(time.perf_counter() - start)
+    return times
+
+def KnownCourts():
+    # Use court names in courts.csv, so SittingJudges can abbreviate them
+    from judges.QueryTools import CourtAbbreviations
+    known = set(CourtAbbreviations())
+    courts = [x for x in Synthetic.Courts() if x in known]
+    return courts if courts != [] else sorted(x for x in known if x != '')
+
+# Benchmarks
+## Each one takes an input size and returns (items, setup, run), where items
+## is the number of units of work in one run (used for the time per item)
+def NameFinderBench(size, index=False):
+    from judges.NameFinder import NameFinder, NameIndex
+    namedict = Synthetic.NameDict(Synthetic.FJCData(size, seed=1))
+    strings = Synthetic.NameStrings(namedict, 500, seed=2)
+    ni = NameIndex(namedict) if index else None
+    def run():
+        for s in strings:
+            NameFinder(namedict, s, index=ni)
+    return len(strings), None, run
+
+def ClassifyBench(size):
+    from dispositions.CivilDictionaryClassifier import Classify
+    cases = Synthetic.DocketCases(size, seed=3)
+    Classify(cases[0]) # load NLTK and the dictionaries
+    def run():
+        for case in cases:
+            Classify(case)
+    return len(cases), None, run
+
+def ClassifyCorpusBench(size):
+    from dispositions.CorpusClassifier import ClassifyCorpus
+    cases = Synthetic.DocketCases(size, seed=3)
+    ClassifyCorpus(cases[:1]) # load NLTK, numpy and the dictionaries
+    def run():
+        ClassifyCorpus(cases)
+    return len(cases), None, run
+
+def SittingQueries(n=200, seed=4):
+    r = random.Random(seed)
+    from judges.QueryTools import CourtAbbreviations
+    abbr = CourtAbbreviations()
+    courts = sorted(set(abbr[x] for x in KnownCourts()))
+    queries = []
+    for i in range(n):
+        begdate = datetime.date(1850, 1, 1) + datetime.timedelta(r.randint(0, 62000))
+        enddate = begdate + datetime.timedelta(r.randint(0, 1000)) if r.random() < 0.5 else None
+        queries.append((begdate, enddate, r.choice(courts + [None])))
+    return queries
+
+def SittingJudgesBench(size, index=None):
+    from judges.QueryTools import SittingJudges, SittingIndex, SpellColumns
+    data = Synthetic.FJCData(size, seed=1, courts=KnownCourts())
+    queries = SittingQueries()
+    if index == 'SpellColumns':
+        # Every day of a year for each court
+        columns = SpellColumns(data)
+        days = [datetime.date(1990, 1, 1) + datetime.timedelta(x) for x in range(365)]
+        courts = sorted(set(x[2] for x in queries if x[2] is not None))
+        def run():
+            for c in courts:
+                columns.SittingJudges(days, c)
+        return len(days) * len(courts), None, run
+    si = SittingIndex(data) if index == 'SittingIndex' else None
+    def run():
+        for begdate, enddate, court in queries:
+            SittingJudges(data, begdate, enddate, court, index=si)
+    return len(queries), None, run
+
+def ReshapeDataBench(size):
+    from judges.LoadData import ReshapeData
+    data = Synthetic.FJCData(size, seed=1)
+    return size, lambda: (copy.deepcopy(data),), ReshapeData
+
+benchmarks = {
+    'NameFinder': (NameFinderBench, {}, [100, 500, 2000], [100, 300]),
+    'NameFinder (NameIndex)': (NameFinderBench, {'index': True}, [100, 500, 2000], [100, 300]),
+    'Classify': (ClassifyBench, {}, [100, 400, 1600], [50, 200]),
+    'Classify (ClassifyCorpus)': (ClassifyCorpusBench, {}, [100, 400, 1600], [50, 200]),
+    'SittingJudges': (SittingJudgesBench, {}, [500, 2000, 8000], [500, 2000]),
+    'SittingJudges (SittingIndex)': (SittingJudgesBench, {'index': 'SittingIndex'}, [500, 2000, 8000], [500, 2000]),
+    'SittingJudges (SpellColumns)': (SittingJudgesBench, {'index': 'SpellColumns'}, [500, 2000, 8000], [500, 2000]),
+    'ReshapeData': (ReshapeDataBench, {}, [500, 2000, 8000], [500, 2000]),
+}
+
+def Commit():
+    try:
+        p = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repo_path,
+                           stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return p.stdout.decode('utf-8').strip() if p.returncode == 0 else None
+    except OSError:
+        return None
+
+def RunSuite(names=None, quick=False, repeat=3):
+    """
+    Runs the benchmarks
+    :return: dict with 'meta' (commit, python version, etc.) and 'results'
+        ({benchmark: {size: {'median_s', 'min_s', 'items', 'per_item_us'}}}
+        or {benchmark: {'error': message}})
+    """
+    output = {'meta': {'commit': Commit(), 'python': platform.python_version(),
+                       'platform': platform.platform(), 'cpus': os.cpu_count(),
+                       'date': datetime.datetime.now().isoformat(), 'quick': quick, 'repeat': repeat},
+              'results': {}}
+    from judges.CourtNames import SetDataPath
+    courtfiles = tempfile.TemporaryDirectory()
+    Synthetic.WriteCourtFiles(courtfiles.name)
+    for name in benchmarks if names is None else names:
+        bench, options, sizes, quick_sizes = benchmarks[name]
+        output['results'][name] = {}
+        for size in quick_sizes if quick else sizes:
+            try:
+                items, setup, run = bench(size, **options)
+                times = Time(run, setup, repeat)
+            except Exception as e:
+                output['results'][name] = {'error': type(e).__name__ + ': ' + str(e)}
+                print('{:30s} failed: {}'.format(name, output['results'][name]['error']))
+                break
+            result = {'median_s': statistics.median(times), 'min_s': min(times), 'items': items,
+                      'per_item_us': 1e6 * min(times) / items}
+            output['results'][name][str(size)] = result
+            print('{:30s} {:>6d} {:10.4f} s (min {:.4f} s, {:.1f} us/item)'.format(
+                name, size, result['median_s'], result['min_s'], result['per_item_us']))
+    SetDataPath()
+    courtfiles.cleanup()
+    return output
+
+def Compare(new, old):
+    """
+    Prints the speedup of each benchmark in new over old (old time / new time)
+    """
+    print('\nCompared with ' + str(old['meta'].get('commit')) + ' (>1 is faster):')
+    for name in new['results']:
+        for size in new['results'][name]:
+            if size == 'error' or size not in old['results'].get(name, {}):
+                continue
+            ratio = old['results'][name][size]['min_s'] / new['results'][name][size]['min_s']
+            print('{:30s} {:>6s} {:8.2f}x'.format(name, size, ratio))
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Time NameFinder, Classify, SittingJudges and ReshapeData on synthetic data.')
+    parser.add_argument('--only', nargs='+', default=None, choices=list(benchmarks), help='benchmarks to run')
+    parser.add_argument('--quick', action='store_true', help='use smaller inputs')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', default=None, help='write results to this file')
+    parser.add_argument('--compare', default=None, help='JSON results of an earlier run to compare with')
+    args = parser.parse_args(args)
+
+    output = RunSuite(args.only, args.quick, args.repeat)
+    if args.json is not None:
+        with open(args.json, 'w') as fp:
+            json.dump(output, fp, indent=4)
+    if args.compare is not None:
+        with open(args.compare, 'r') as fp:
+            Compare(output, json.load(fp))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.Synthetic
+Synthetic data for the benchmarks, so they run offline and without the real
+FJC data. Everything is generated from a seed, so runs are reproducible.
+
+- FJCData: FJC-like judge records (fjc_dict), with the column layout of the
+  FJC's judges.csv; WriteFJCCsv saves them as a csv file
+- NameDict, NameStrings: judges' names and text mentioning them (NameFinder)
+- DocketCases: cases with docket entries (Classify)
+- WriteCourtFiles: a courts.csv and states.txt matching Courts(), for
+  judges.CourtNames.SetDataPath (SittingJudges, ReshapeData)
+"""
+
+import os
+import csv
+import random
+import datetime
+
+repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Column layout of judges.csv
+## One block of columns for each of a judge's (up to 6) appointments
+person_columns = ['nid', 'jid', 'Last Name', 'First Name', 'Middle Name', 'Suffix',
+                  'Birth Month', 'Birth Day', 'Birth Year', 'Birth City', 'Birth State',
+                  'Death Month', 'Death Day', 'Death Year', 'Death City', 'Death State',
+                  'Gender', 'Race or Ethnicity']
+appointment_columns = ['Court Type', 'Court Name', 'Appointment Title', 'Appointing President',
+                       'Party of Appointing President', 'Reappointing President',
+                       'Party of Reappointing President', 'ABA Rating', 'Seat ID',
+                       'Statute Authorizing New Seat', 'Recess Appointment Date', 'Nomination Date',
+                       'Committee Referral Date', 'Hearing Date', 'Judiciary Committee Action',
+                       'Committee Action Date', 'Senate Vote Type', 'Ayes/Nays', 'Confirmation Date',
+                       'Commission Date', 'Service as Chief Judge, Begin', 'Service as Chief Judge, End',
+                       '2nd Service as Chief Judge, Begin', '2nd Service as Chief Judge, End',
+                       'Senior Status Date', 'Termination', 'Termination Date']
+columns = (person_columns +
+           [x + ' (' + str(n) + ')' for n in range(1, 7) for x in appointment_columns] +
+           ['Other Nominations/Recess Appointments'] +
+           [x + ' (' + str(n) + ')' for n in range(1, 6) for x in ['School', 'Degree', 'Degree Year']] +
+           ['Professional Career'] +
+           ['Other Federal Judicial Service (' + str(n) + ')' for n in range(1, 5)])
+
+states = ['Alabama', 'Arkansas', 'California', 'Florida', 'Georgia', 'Illinois', 'Kansas', 'Kentucky',
+          'Louisiana', 'Michigan', 'Mississippi', 'Missouri', 'New York', 'North Carolina', 'Ohio',
+          'Oklahoma', 'Pennsylvania', 'Tennessee', 'Texas', 'Virginia', 'Washington', 'West Virginia',
+          'Wisconsin', 'Arizona', 'Colorado', 'Delaware', 'Nevada', 'Maine', 'Oregon', 'Utah']
+districts = ['Northern', 'Southern', 'Eastern', 'Western', 'Middle', 'Central']
+circuits = ['First', 'Second', 'Third', 'Fourth', 'Fifth', 'Sixth', 'Seventh', 'Eighth', 'Ninth',
+            'Tenth', 'Eleventh', 'District of Columbia', 'Federal']
+
+first_names = ['John', 'Mary', 'Robert', 'Patricia', 'James', 'Jennifer', 'Michael', 'Linda', 'William',
+               'Barbara', 'David', 'Susan', 'Richard', 'Jessica', 'Joseph', 'Sarah', 'Thomas', 'Karen',
+               'Charles', 'Nancy', 'Sonia', 'Ruth', 'Felix', 'Lee', 'Jerome', 'Ann', 'Al', 'Harry']
+middle_names = ['', '', '', 'A.', 'B.', 'Lynn', 'Marie', 'Bader', 'H.', 'Anne', 'J.', 'Xavier', 'Lee']
+surname_parts = ['Rob', 'Ginz', 'Far', 'Smith', 'Ward', 'Dell', 'Van', 'Berg', 'Mac', 'Kin', 'Alt', 'Hof',
+                 'Stein', 'Wood', 'Lee', 'Ash', 'Cole', 'Hart', 'Mor', 'Ton', 'Ley', 'Son', 'Man', 'Burg']
+surnames = ['Roberts', 'Doe', 'Major', 'Farris', 'Della Vigna', 'Van Der Berg', 'Ginsburg', 'Settle',
+            'Justice', "O'Connor", 'St. John', 'Judge', 'Lynn', 'Mary-Kate', 'Lee', 'Young']
+suffixes = ['', '', '', '', 'Jr.', 'Sr.', 'III']
+postal = ['al', 'ar', 'ca', 'fl', 'ga', 'il', 'ks', 'ky', 'la', 'mi', 'ms', 'mo', 'ny', 'nc', 'oh',
+          'ok', 'pa', 'tn', 'tx', 'va', 'wa', 'wv', 'wi', 'az', 'co', 'de', 'nv', 'me', 'or', 'ut']
+
+def Courts():
+    """
+    Court names as they appear in the FJC data
+    """
+    courts = ['Supreme Court of the United States', 'U.S. Court of International Trade',
+              'U.S. Court of Claims']
+    courts += ['U.S. Court of Appeals for the ' + x + ' Circuit' for x in circuits]
+    courts += ['U.S. District Court for the District of Columbia']
+    for i, s in enumerate(states):
+        if i % 3 == 0:
+            courts.append('U.S. District Court for the District of ' + s)
+        else:
+            courts += ['U.S. District Court for the ' + x + ' District of ' + s for x in districts[:2 + i % 3]]
+    return courts
+
+def Surname(r):
+    if r.random() < 0.2:
+        return r.choice(surnames)
+    return ''.join(r.choice(surname_parts) for x in range(r.randint(1, 3))).capitalize()
+
+def FormatDate(date):
+    return str(date.month).zfill(2) + '/' + str(date.day).zfill(2) + '/' + str(date.year)
+
+def FJCData(n=1000, seed=1, courts=None):
+    """
+    Makes n FJC-like judge records
+    :param courts: list of court names to use (default: Courts())
+    :return: dict (fjc_dict), keyed by nid
+    """
+    r = random.Random(seed)
+    courts = Courts() if courts is None else list(courts)
+    data = {}
+    for i in range(n):
+        nid = str(1380000 + i)
+        row = {x: '' for x in columns}
+        row.update({'nid': nid, 'jid': str(i + 1), 'Last Name': Surname(r), 'First Name': r.choice(first_names),
+                    'Middle Name': r.choice(middle_names), 'Suffix': r.choice(suffixes),
+                    'Birth Year': str(r.randint(1740, 1975)), 'Birth State': r.choice(states)[:2].upper(),
+                    'Gender': r.choice(['Male', 'Female'])})
+
+        # Appointments, one after the other
+        start = datetime.date(1789, 1, 1) + datetime.timedelta(r.randint(0, 85000))
+        for a in range(1, r.choice([1, 1, 1, 2, 2, 3]) + 1):
+            if start > datetime.date(2023, 12, 31):
+                break
+            commission = start + datetime.timedelta(r.randint(30, 400))
+            block = {'Court Type': 'U.S. District Court', 'Court Name': r.choice(courts),
+                     'Appointment Title': 'Judge', 'Appointing President': 'President ' + str(r.randint(1, 46)),
+                     'Party of Appointing President': r.choice(['Democratic', 'Republican']),
+                     'Nomination Date': FormatDate(commission - datetime.timedelta(r.randint(40, 200))),
+                     'Confirmation Date': FormatDate(commission - datetime.timedelta(r.randint(1, 30))),
+                     'Commission Date': FormatDate(commission)}
+            if r.random() < 0.05:
+                block['Recess Appointment Date'] = FormatDate(commission - datetime.timedelta(r.randint(100, 300)))
+            if r.random() < 0.7:
+                block['Hearing Date'] = FormatDate(commission - datetime.timedelta(r.randint(31, 39)))
+            end = commission + datetime.timedelta(r.randint(500, 12000))
+            if r.random() < 0.4:
+                block['Senior Status Date'] = FormatDate(end)
+                end = end + datetime.timedelta(r.randint(100, 5000))
+            if end < datetime.date(2024, 1, 1):
+                block['Termination'] = r.choice(['Death', 'Retirement', 'Resignation', 'Reassignment'])
+                block['Termination Date'] = FormatDate(end)
+            for x in block:
+                row[x + ' (' + str(a) + ')'] = block[x]
+            start = end
+
+        if r.random() < 0.1:
+            year = r.randint(1971, 2010)
+            row['Other Federal Judicial Service (1)'] = ('U.S. Magistrate, ' + r.choice(courts) + ', ' +
+                                                         str(year) + '-' + str(year + r.randint(1, 12)))
+        data[nid] = row
+    return data
+
+def WriteFJCCsv(path, data):
+    """
+    Saves FJC-like records as a csv file (like the FJC's judges.csv)
+    """
+    with open(path, 'w', newline='', encoding='utf-8') as fp:
+        writer = csv.DictWriter(fp, fieldnames=columns)
+        writer.writeheader()
+        for k in data:
+            writer.writerow(data[k])
+
+def NameDict(data):
+    """
+    The namedict used by NameFinder, from FJC-like records
+    """
+    return {k: {x: data[k][x] for x in ['First Name', 'Middle Name', 'Last Name', 'Suffix']} for k in data}
+
+def NameStrings(namedict, n=500, seed=2):
+    """
+    Makes n strings (like docket entries) that mention judges in namedict,
+    written in the different ways NameFinder looks for
+    """
+    r = random.Random(seed)
+    keys = list(namedict)
+    filler = ['ORDER by', 'Judge', 'JUSTICE', 'signed by Magistrate Judge', 'MJ', 're:', 'the court',
+              'Hon.', 'motion to dismiss referred to', 'and', 'Chief Judge', 'case reassigned to']
+    strings = []
+    for i in range(n):
+        parts = []
+        for j in range(r.randint(1, 4)):
+            d = namedict[r.choice(keys)]
+            f, m, l = d['First Name'], d['Middle Name'], d['Last Name']
+            form = r.randint(0, 6)
+            if form == 0:
+                name = f + ' ' + m + ' ' + l
+            elif form == 1:
+                name = f + ' ' + l
+            elif form == 2:
+                name = f[0] + '. ' + l
+            elif form == 3:
+                name = l
+            elif form == 4:
+                name = (f[0] + '.' + (m[:1] or 'K') + '. ' + l).upper()
+            elif form == 5:
+                name = f + ' ' + l + ' ' + d['Suffix']
+            else:
+                name = Surname(r) # someone not in namedict
+            parts.append(r.choice(filler) + ' ' + name)
+        strings.append(' '.join(parts) + r.choice(['', '.', ' on ' + FormatDate(datetime.date(2003, 1, 2))]))
+    return strings
+
+def DocketTerms():
+    # Words from the classifier's dictionary files, so the generated entries
+    # exercise the same code paths as real ones
+    path = os.path.join(repo_path, 'dispositions', 'data')
+    terms = []
+    for f in ['shorthand.txt', 'phrases_settlement.txt', 'phrases_prejudice.txt']:
+        with open(os.path.join(path, f), 'r') as fp:
+            terms += [x.split('\t')[0].replace('?', '') for x in fp.read().split('\n')
+                      if x.strip() != '' and 'Source' not in x]
+    return terms
+
+templates = ['ORDER granting [{n}] Motion to Dismiss for Failure to State a Claim filed by {party}. Signed by Judge {judge} on {date}.',
+             'ORDER denying [{n}] Motion for Summary Judgment filed by {party}. Signed by Judge {judge} on {date}.',
+             'MEMORANDUM AND ORDER granting in part and denying in part [{n}] Motion for Summary Judgment.',
+             'STIPULATION of Dismissal with prejudice by {party}. (Attachments: # 1 Proposed Order)',
+             'NOTICE of Settlement by {party}',
+             'ORDER of dismissal upon settlement. Case closed.',
+             'JUDGMENT in favor of {party} against {other}. Signed by Judge {judge} on {date}.',
+             'REPORT AND RECOMMENDATIONS re [{n}] Petition for Writ of Habeas Corpus. Adopted.',
+             'ORDER ADOPTING REPORT AND RECOMMENDATIONS; petition denied.',
+             'ORDER TRANSFERRING CASE to the District of {state}.',
+             'ORDER remanding case to state court for lack of jurisdiction.',
+             'CLERK\'S ENTRY OF DEFAULT as to {party}. Default Judgment entered.',
+             'MOTION for Leave to Proceed in forma pauperis by {party}.',
+             'Minute Entry for proceedings held before Judge {judge}: Status Conference held on {date}.',
+             'CONSENT DECREE signed by Judge {judge}.',
+             'ORDER affirming the decision of the Commissioner.']
+
+def DocketCases(n=500, seed=3, entries=(1, 6)):
+    """
+    Makes n cases for Classify: dicts of entries {entry number: {'entry_text': ...}},
+    mixing common docket entry templates with words from the dictionaries
+    :param entries: (min, max) number of entries in each case
+    """
+    r = random.Random(seed)
+    terms = DocketTerms()
+    parties = ['Plaintiff ACME Corp.', 'Defendant John Smith', 'Defendants City of Springfield',
+               'Petitioner', 'Respondent Warden', 'Plaintiff Jane Doe', 'Defendant United States']
+    cases = []
+    for i in range(n):
+        case = {}
+        for e in range(r.randint(*entries)):
+            text = r.choice(templates).format(n=r.randint(1, 120), party=r.choice(parties),
+                                              other=r.choice(parties), judge=r.choice(first_names) + ' ' + Surname(r),
+                                              date=FormatDate(datetime.date(2000, 1, 1) + datetime.timedelta(r.randint(0, 7000))),
+                                              state=r.choice(states))
+            if r.random() < 0.5:
+                text = text + ' ' + ' '.join(r.choice(terms) for x in range(r.randint(1, 8)))
+            if r.random() < 0.3:
+                text = text.upper()
+            case[str(e + 1)] = {'entry_text': text}
+        cases.append(case)
+    return cases
+
+def WriteCourtFiles(directory):
+    """
+    Saves states.txt and courts.csv (in the format of judges/data) for the
+    courts in Courts(), and points judges.CourtNames at them
+    """
+    from judges.CourtNames import SetDataPath, AbbreviateCourt
+    with open(os.path.join(directory, 'states.txt'), 'w') as fp:
+        fp.write('\n'.join(x + '\t' + y for x, y in zip(postal, states)))
+    SetDataPath(directory)
+    with open(os.path.join(directory, 'courts.csv'), 'w', newline='') as fp:
+        writer = csv.writer(fp)
+        writer.writerow(['full_name', 'abbr'])
+        for x in Courts():
+            writer.writerow([x, AbbreviateCourt(x.lower()).upper()])
+    SetDataPath(directory)
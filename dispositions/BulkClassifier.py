@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Ryan Hübert
+# Department of Political Science
+# University of California, Davis
+
+"""
+dispositions.BulkClassifier v1.4
+Classifies the outcomes of many cases (e.g., a whole corpus of docket sheets)
+with CivilDictionaryClassifier.Classify, using multiple processes.
+
+Cases are read from a JSONL file, one case per line, for example:
+    {"case_id": "cand-3:17-cv-01234", "entries": {"1": {"entry_text": "..."}, ...}}
+(an optional "habeas" key overrides the habeas option for that case).
+Outcomes are written in the same order as JSONL or CSV, one row per case.
+A line that cannot be parsed or classified gives a row with an "error" (the
+line number and the exception) instead of outcomes, and the run goes on.
+
+Long runs can save a checkpoint as they go, and be resumed after a crash:
+    python -m dispositions.BulkClassifier cases.jsonl outcomes.csv --format csv \\
+        --checkpoint outcomes.ckpt --resume
+
+New in v1.1: --stats saves the time spent in each stage of Classify (see
+judges.Stats), combined across processes.
+Functions take any stats object with Clock, Lap and Count (and, with several
+workers, ToDict and Merge), such as judges.Stats.Stats; only the --stats
+option of the command line imports judges.
+New in v1.2: custom outcome rules (rules=OutcomeRules.RuleEngine(table)).
+New in v1.3: --cache keeps processed entries in a persistent cache (see
+dispositions.EntryCache), so re-classifying grown dockets only processes new
+entries.
+New in v1.4: bad lines give error rows instead of stopping the run.
+"""
+
+import os
+import io
+import csv
+import json
+import argparse
+import multiprocessing
+from collections import deque
+
+from dispositions.CivilDictionaryClassifier import Classify, outvars
+
+def ClassifyRecord(record, id_key='case_id', habeas=False, stats=None, rules=None, cache=None):
+    """
+    Classifies one case (a dict with an ID and entries)
+    :return: tuple of (case ID, outcome dict)
+    """
+    outcome, text_merge = Classify(record.get('entries', {}), habeas=record.get('habeas', habeas), stats=stats,
+                                   rules=rules, cache=cache)
+    return record.get(id_key), outcome
+
+def ClassifyLine(line, id_key, habeas, stats=None, rules=None, cache=None):
+    """
+    Classifies one JSONL line
+    :return: tuple of (case ID, outcome dict), or (case ID or None, {'error': message})
+        if the line cannot be parsed or classified; None for a blank line
+    """
+    if line.strip() == '':
+        return None
+    record = None
+    try:
+        record = json.loads(line)
+        return ClassifyRecord(record, id_key, habeas, stats, rules, cache)
+    except Exception as e:
+        case_id = record.get(id_key) if isinstance(record, dict) else None
+        return case_id, {'error': type(e).__name__ + ': ' + str(e)}
+
+def ClassifyLines(lines, id_key, habeas, stats=None, rules=None, cache=None):
+    return [ClassifyLine(x, id_key, habeas, stats, rules, cache) for x in lines]
+
+# The RuleEngine and EntryCache used by a worker process (set once, when
+# the worker starts; each worker opens its own connection to the cache)
+worker_rules = None
+worker_cache = None
+
+def SetWorker(rules, cache_settings):
+    global worker_rules, worker_cache
+    worker_rules = rules
+    if cache_settings is not None:
+        from dispositions.EntryCache import EntryCache
+        worker_cache = EntryCache(**cache_settings)
+
+def ClassifyChunk(lines, id_key, habeas, collect=None):
+    # Worker task: lines are parsed in the worker to spread the work
+    # Returns the results, and the chunk's stats (as a dict) if collect (the
+    # class of the caller's stats object) is given
+    stats = collect() if collect is not None else None
+    results = ClassifyLines(lines, id_key, habeas, stats, worker_rules, worker_cache)
+    if worker_cache is not None:
+        worker_cache.commit()
+    return results, stats.ToDict() if stats is not None else None
+
+def Chunks(iterable, chunksize):
+    chunk = []
+    for x in iterable:
+        chunk.append(x)
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+    if chunk != []:
+        yield chunk
+
+def ClassifyMany(lines, workers=None, chunksize=100, id_key='case_id', habeas=False, max_pending=None,
+                 stats=None, rules=None, cache=None):
+    """
+    Classifies cases given as JSONL lines (any iterable of str, e.g. an open
+    file), using a pool of worker processes.
+    Yields (case ID, outcome dict) for each line in order (None for blank lines,
+    and (case ID or None, {'error': message}) for lines that fail; see ClassifyLine).
+    At most max_pending chunks (default: 4 per worker) are held in memory.
+    If stats (e.g., judges.Stats.Stats) is given, the stats of every worker are
+    added to it (each worker collects them in a new object of the same class).
+    rules (OutcomeRules.RuleEngine) replaces the default outcome rules, and
+    cache (EntryCache.EntryCache) keeps the processed entries.
+    """
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    if workers <= 1:
+        for chunk in Chunks(lines, chunksize):
+            yield from ClassifyLines(chunk, id_key, habeas, stats, rules, cache)
+        return
+
+    def Results(job):
+        results, chunkstats = job.get()
+        if stats is not None:
+            stats.Merge(chunkstats)
+        return results
+
+    max_pending = workers * 4 if max_pending is None else max_pending
+    cache_settings = cache.__getstate__() if cache is not None else None
+    with multiprocessing.Pool(workers, initializer=SetWorker, initargs=(rules, cache_settings)) as pool:
+        pending = deque()
+        for chunk in Chunks(lines, chunksize):
+            pending.append(pool.apply_async(ClassifyChunk, (chunk, id_key, habeas, type(stats) if stats is not None else None)))
+            while len(pending) >= max_pending:
+                yield from Results(pending.popleft())
+        while pending:
+            yield from Results(pending.popleft())
+
+def FormatRow(case_id, outcome, fmt='jsonl', id_key='case_id'):
+    """
+    Formats one output row (bytes). In CSV, motions_petitions is joined with ";"
+    (empty if it is not a list), and the last column is the error (if any).
+    """
+    if fmt == 'jsonl':
+        row = {id_key: case_id}
+        row.update(outcome)
+        return (json.dumps(row) + '\n').encode('utf-8')
+    elif fmt == 'csv':
+        buffer = io.StringIO()
+        if 'error' in outcome:
+            csv.writer(buffer).writerow([case_id] + [''] * len(outvars) + [outcome['error']])
+        else:
+            # motions_petitions is False for cases without entries
+            csv.writer(buffer).writerow([case_id] + [(';'.join(outcome[x]) if isinstance(outcome[x], list) else '')
+                                                     if x == 'motions_petitions' else outcome[x]
+                                                     for x in outvars] + [''])
+        return buffer.getvalue().encode('utf-8')
+    else:
+        raise Exception("Output format must be 'jsonl' or 'csv'")
+
+def SaveCheckpoint(checkpoint, state):
+    # Write then rename, so a crash never leaves a half-written checkpoint
+    with open(checkpoint + '.tmp', 'w') as fp:
+        json.dump(state, fp)
+    os.replace(checkpoint + '.tmp', checkpoint)
+
+def BulkClassify(infile, outfile, fmt='jsonl', workers=None, chunksize=100,
+                 id_key='case_id', habeas=False, checkpoint=None, checkpoint_every=1000,
+                 resume=False, stats=None, rules=None, cache=None):
+    """
+    Classifies every case in infile (JSONL) and writes outcomes to outfile.
+    :param fmt: 'jsonl' or 'csv'
+    :param checkpoint: path of a checkpoint file, updated every checkpoint_every cases
+    :param resume: if True (and checkpoint exists), continue from the checkpoint
+    :param stats: stats object (optional, e.g., judges.Stats.Stats) to collect stats of Classify
+    :param rules: OutcomeRules.RuleEngine (optional) to use custom outcome rules
+    :param cache: EntryCache.EntryCache (optional) to keep processed entries
+    :return: number of cases classified in this run (not counting error rows)
+    """
+    state = {'input_lines': 0, 'output_bytes': 0, 'format': fmt}
+    if resume and checkpoint is not None and os.path.exists(checkpoint):
+        with open(checkpoint, 'r') as fp:
+            state = json.load(fp)
+        if state['format'] != fmt:
+            raise Exception("Checkpoint was written with format " + state['format'])
+
+    # Drop any output written after the last checkpoint
+    with open(outfile, 'ab') as out:
+        out.truncate(state['output_bytes'])
+    with open(infile, 'r', encoding='utf-8') as inp, open(outfile, 'ab') as out:
+        if state['output_bytes'] == 0 and fmt == 'csv':
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow([id_key] + outvars + ['error'])
+            out.write(buffer.getvalue().encode('utf-8'))
+
+        # Skip cases that were already classified
+        for n in range(state['input_lines']):
+            inp.readline()
+
+        count, rows = 0, 0
+        for result in ClassifyMany(inp, workers=workers, chunksize=chunksize, id_key=id_key, habeas=habeas,
+                                   stats=stats, rules=rules, cache=cache):
+            state['input_lines'] += 1
+            if result is None:
+                continue
+            case_id, outcome = result
+            if 'error' in outcome:
+                outcome = {'error': 'line ' + str(state['input_lines']) + ': ' + outcome['error']}
+            else:
+                count += 1
+            out.write(FormatRow(case_id, outcome, fmt, id_key))
+            rows += 1
+            if checkpoint is not None and rows % checkpoint_every == 0:
+                out.flush()
+                os.fsync(out.fileno())
+                state['output_bytes'] = out.tell()
+                SaveCheckpoint(checkpoint, state)
+
+        out.flush()
+        state['output_bytes'] = out.tell()
+        if checkpoint is not None:
+            SaveCheckpoint(checkpoint, state)
+    return count
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Classify case outcomes for a JSONL file of docket entries.')
+    parser.add_argument('infile', help='JSONL file, one case per line')
+    parser.add_argument('outfile', help='output file')
+    parser.add_argument('--format', default='jsonl', choices=['jsonl', 'csv'])
+    parser.add_argument('--workers', type=int, default=None, help='number of processes (default: all CPUs)')
+    parser.add_argument('--chunksize', type=int, default=100, help='cases sent to a process at a time')
+    parser.add_argument('--id-key', default='case_id', help='key holding the case ID')
+    parser.add_argument('--habeas', action='store_true', help='treat all cases as habeas cases')
+    parser.add_argument('--checkpoint', default=None, help='checkpoint file')
+    parser.add_argument('--checkpoint-every', type=int, default=1000)
+    parser.add_argument('--resume', action='store_true', help='resume from the checkpoint')
+    parser.add_argument('--stats', default=None, help='save the time spent in each stage (JSON) to this file')
+    parser.add_argument('--cache', default=None, help='SQLite file to keep processed entries in')
+    parser.add_argument('--cache-size', type=int, default=1000000, help='most entries kept in the cache')
+    args = parser.parse_args(args)
+    cache = None
+    if args.cache is not None:
+        from dispositions.EntryCache import EntryCache
+        cache = EntryCache(args.cache, max_entries=args.cache_size)
+    stats = None
+    if args.stats is not None:
+        from judges.Stats import Stats
+        stats = Stats()
+    count = BulkClassify(args.infile, args.outfile, fmt=args.format, workers=args.workers,
+                         chunksize=args.chunksize, id_key=args.id_key, habeas=args.habeas,
+                         checkpoint=args.checkpoint, checkpoint_every=args.checkpoint_every,
+                         resume=args.resume, stats=stats, cache=cache)
+    if cache is not None:
+        cache.close()
+    print('Classified ' + str(count) + ' cases')
+    if stats is not None:
+        stats.Dump(args.stats)
+
+if __name__ == '__main__':
+    main()
@@ -6,17 +6,31 @@
 # University of California, Davis
 
 """
-dockets.CivilDictionaryClassifier v1.1
+dockets.CivilDictionaryClassifier v1.7
 A dictionary-based classifier that uses text of docket entries on or near a case
 termination date to code the outcome of the case.
+
+New in v1.2: TextNormalizer, a compiled version of the text preprocessing in
+BasicTextFormatter (which also allows custom dictionary files).
+New in v1.3: KeywordStem, which caches stems and skips tokens that cannot
+stem to a keyword.
+New in v1.4: NLTK and the dictionary files are loaded on first use.
+New in v1.5: optional instrumentation of Classify (stats=judges.Stats.Stats(),
+or any object with the same Clock, Lap and Count methods).
+New in v1.6: the outcome rules are a table (dispositions.OutcomeRules), compiled
+once and applied with a single scan of the text. Classify accepts custom
+tables (rules=RuleEngine(table)).
+New in v1.7: EntryClauses processes one entry; Classify can keep the results
+in a persistent cache (cache=dispositions.EntryCache.EntryCache(path)), so
+only new entries are processed when a case is classified again.
 """
 
 import re
 import os
-from nltk.stem.snowball import SnowballStemmer
+import hashlib
+from functools import lru_cache
 
-from nltk import sent_tokenize
-stemmer = SnowballStemmer("english")
+from dispositions.OutcomeRules import DefaultRules, RuleEngine
 
 # This sets current path depending on whether in IDE
 try:
@@ -25,7 +39,19 @@ except:
     current_path = os.getcwd()
 
 # Text Tools
-stemmer = SnowballStemmer("english")
+## NLTK and the dictionary files are loaded the first time they are needed,
+## not when this module is imported. The module-level names (stemmer,
+## sent_tokenize, abbr, keyphrsS, keyphrsP, keywords, settsearch1, normalizer) are still
+## available, and are loaded when first accessed.
+@lru_cache(maxsize=None)
+def Stemmer():
+    from nltk.stem.snowball import SnowballStemmer
+    return SnowballStemmer("english")
+
+@lru_cache(maxsize=None)
+def SentTokenizer():
+    from nltk import sent_tokenize
+    return sent_tokenize
 
 # We do not use this. Preserving for future consideration.
 # from nltk.corpus import stopwords
@@ -34,23 +60,104 @@ stemmer = SnowballStemmer("english")
 # stop_words.remove('against')
 # stop_words.remove('with')
 
-# Important search terms
-# NB: these words are not used: 'voluntary'
-abbr = {x.split('\t')[0] : x.split('\t')[1] for x in open(current_path + '/data/shorthand.txt','r').read().split('\n') if 'Source' not in x}
-keyphrsS = open(current_path +'/data/phrases_settlement.txt', 'r').read().split('\n')
-keyphrsP = open(current_path +'/data/phrases_prejudice.txt', 'r').read().split('\n')
-keywords = ['transfer', 'remand', 'vacate', 'reverse', 'affirm', 'default', 'habeas',
-            'dismissal', 'dismiss', 'settled', 'settlement', 'joint', 'stipulation', 'stipulated',
-            'motion', 'summary', 'judgment','grant', 'denial', 'deny',
-            'defendant', 'plaintiff', 'commissioner', 'petitioner', 'respondent',
-            'favor', 'against', 'award', 'entitled', 'damages', 'petition',
-            'lack', 'jurisdiction', 'standing', 'stay']
-keywords = [stemmer.stem(re.sub(' ','_',x)) for x in keywords + keyphrsS + keyphrsP]
-keywords = sorted(list(set(keywords)))
+@lru_cache(maxsize=None)
+def Dictionaries():
+    """
+    Loads the dictionary files and builds the search terms used by Classify
+    :return: dict
+    """
+    stemmer = Stemmer()
+
+    # Important search terms
+    # NB: these words are not used: 'voluntary'
+    abbr = {x.split('\t')[0] : x.split('\t')[1] for x in open(current_path + '/data/shorthand.txt','r').read().split('\n') if 'Source' not in x}
+    keyphrsS = open(current_path +'/data/phrases_settlement.txt', 'r').read().split('\n')
+    keyphrsP = open(current_path +'/data/phrases_prejudice.txt', 'r').read().split('\n')
+    keywords = ['transfer', 'remand', 'vacate', 'reverse', 'affirm', 'default', 'habeas',
+                'dismissal', 'dismiss', 'settled', 'settlement', 'joint', 'stipulation', 'stipulated',
+                'motion', 'summary', 'judgment','grant', 'denial', 'deny',
+                'defendant', 'plaintiff', 'commissioner', 'petitioner', 'respondent',
+                'favor', 'against', 'award', 'entitled', 'damages', 'petition',
+                'lack', 'jurisdiction', 'standing', 'stay']
+    keywords = [stemmer.stem(re.sub(' ','_',x)) for x in keywords + keyphrsS + keyphrsP]
+    keywords = sorted(list(set(keywords)))
+
+    # The Snowball stemmer only rewrites the end of a word and never makes it
+    # longer, so a token can only stem to a keyword if it starts with the same
+    # letter and is at least as long. Tokens with "_" are always kept.
+    keyword_initials = {}
+    for x in keywords:
+        if '_' not in x:
+            keyword_initials[x[0]] = min(keyword_initials.get(x[0], len(x)), len(x))
+
+    settlement_stems = [stemmer.stem(re.sub(' ','_',x)) for x in keyphrsS]
+    settsearch1 = '(' + '|'.join(settlement_stems) + ')'
+
+    return {'abbr': abbr, 'keyphrsS': keyphrsS, 'keyphrsP': keyphrsP, 'keywords': keywords,
+            'keyword_set': set(keywords), 'keyword_initials': keyword_initials,
+            'settlement_stems': settlement_stems, 'settsearch1': settsearch1}
+
+@lru_cache(maxsize=None)
+def DefaultNormalizer():
+    """
+    The TextNormalizer built from the default dictionary files
+    """
+    return TextNormalizer()
+
+@lru_cache(maxsize=None)
+def DictionaryVersion():
+    """
+    A hash of everything used to process entries (the dictionary files, the
+    keywords and the NLTK version), used to key EntryCache
+    """
+    import nltk
+    h = hashlib.sha256(('EntryClauses 1\n' + getattr(nltk, '__version__', '') + '\n').encode('utf-8'))
+    for x in ['shorthand.txt', 'phrases_settlement.txt', 'phrases_prejudice.txt']:
+        with open(current_path + '/data/' + x, 'rb') as fp:
+            h.update(fp.read() + b'\n')
+    h.update('\n'.join(Dictionaries()['keywords']).encode('utf-8'))
+    return h.hexdigest()
+
+def EntryKey(string):
+    """
+    Cache key of an entry's text (see EntryCache)
+    """
+    return hashlib.sha256((DictionaryVersion() + '\n' + string).encode('utf-8')).hexdigest()
+
+@lru_cache(maxsize=None)
+def DefaultRuleEngine():
+    """
+    The RuleEngine for the default rules (OutcomeRules.DefaultRules)
+    """
+    return RuleEngine(DefaultRules(Dictionaries()['settlement_stems']))
+
+def __getattr__(name):
+    if name == 'stemmer':
+        return Stemmer()
+    elif name == 'sent_tokenize':
+        return SentTokenizer()
+    elif name == 'normalizer':
+        return DefaultNormalizer()
+    elif name in ['abbr', 'keyphrsS', 'keyphrsP', 'keywords', 'settsearch1']:
+        return Dictionaries()[name]
+    raise AttributeError("module " + __name__ + " has no attribute " + name)
+
+@lru_cache(maxsize=2**17)
+def KeywordStem(token):
+    """
+    Stems a token from a docket entry and returns the stem if it is used by
+    Classify (i.e., it is in keywords or contains "_"), otherwise None.
+    Results are cached, since docket entries use a small vocabulary.
+    """
+    d = Dictionaries()
+    if '_' not in token and (token[0] not in d['keyword_initials'] or len(token) < d['keyword_initials'][token[0]]):
+        return None
+    x = Stemmer().stem(token)
+    return x if x in d['keyword_set'] or '_' in x else None
+
 clause_breaks = ',;:\n'
 
 
-settsearch1 = '(' + '|'.join([stemmer.stem(re.sub(' ','_',x)) for x in keyphrsS]) + ')'
 settsearch2 = '(case_settl|settlement|settl|joint|consent|stipul)'
 
 outvars = ['forma_pauperis',
@@ -74,243 +181,346 @@ outvars = ['forma_pauperis',
             'plaintiff',
             'motions_petitions']
 
-def BasicTextFormatter(string):
+class TextNormalizer(object):
+    """
+    Compiled version of the text standardization done by BasicTextFormatter
+    (everything up to sentence tokenization), built once from the dictionary
+    files. Use a custom TextNormalizer to use your own dictionary files:
+        normalizer = TextNormalizer(shorthand='my_shorthand.txt')
+        BasicTextFormatter(string, normalizer=normalizer)
+
+    The shorthand dictionary is applied in a single pass: one alternation regex
+    finds every word that is a shorthand term, and a lookup table gives its
+    replacement. The original sequence of re.sub calls (one per shorthand
+    term) is kept as a fallback for the rare strings where the order of the
+    substitutions matters (e.g., "sum jgm"), so the output is always identical.
+    """
+    def __init__(self, shorthand=current_path + '/data/shorthand.txt',
+                 settlement=current_path + '/data/phrases_settlement.txt',
+                 prejudice=current_path + '/data/phrases_prejudice.txt'):
+        self.abbr = {x.split('\t')[0] : x.split('\t')[1] for x in open(shorthand,'r').read().split('\n') if 'Source' not in x}
+        self.keyphrs = open(settlement, 'r').read().split('\n') + open(prejudice, 'r').read().split('\n')
+        self.phrasesearch = re.compile('|'.join([re.escape(x) for x in self.keyphrs if x != ''])) \
+            if any(x != '' for x in self.keyphrs) else None
+
+        # Fallback: one pass per shorthand term
+        self.sequential = [(re.compile('(^|[^A-z])' + s + '($|[^A-z])'), '\\1' + self.abbr[s] + '\\2')
+                           for s in self.abbr]
+
+        # Single pass: word -> replacement for each term (in dictionary order)
+        self.words = {}
+        triggers = [] # terms that force the fallback
+        self.unsafe = set() # terms whose replacement may create another term
+        self.fast = True
+        expanded = [ExpandTerm(s) for s in self.abbr]
+        if any(x is None for x in expanded) or any('\\' in self.abbr[s] for s in self.abbr):
+            self.fast = False # not a plain list of terms; always use fallback
+            return
+        terms = list(self.abbr)
+        for n, s in enumerate(terms):
+            if all(re.fullmatch('[A-z]+', x) for x in expanded[n]):
+                for x in expanded[n]:
+                    self.words.setdefault(x, []).append(s)
+            else:
+                # Multi-word terms, terms with numbers, etc.
+                triggers.append(s)
+            for t in terms[n+1:]:
+                if TermInteracts(self.abbr[s], t, expanded[terms.index(t)]):
+                    self.unsafe.add(s)
+        self.wordsearch = re.compile('(?<![A-z])(?:' + '|'.join(sorted([re.escape(x) for x in self.words], key=len, reverse=True)) + ')(?![A-z])') \
+            if self.words != {} else None
+        self.triggersearch = re.compile('(?<![A-z])(?:' + '|'.join(triggers) + ')(?![A-z])') \
+            if triggers != [] else None
+
+    def Shorthand(self, i):
+        """
+        Replaces shorthand terms in i (same as applying each term in order)
+        """
+        if self.fast and (self.triggersearch is None or not self.triggersearch.search(i)):
+            if self.wordsearch is None:
+                return i
+            lastend = {} # term -> end of its last replacement
+            hits = set()
+            def Replace(m):
+                for s in self.words[m.group(0)]:
+                    # An occurrence right after a replacement of the same
+                    # term is skipped by re.sub (its left boundary was used up)
+                    if lastend.get(s) == m.start() - 1:
+                        continue
+                    lastend[s] = m.end()
+                    hits.add(s)
+                    return self.abbr[s]
+                return m.group(0)
+            j = self.wordsearch.sub(Replace, i)
+            if hits.isdisjoint(self.unsafe):
+                return j
+        for pattern, repl in self.sequential:
+            i = pattern.sub(repl, i)
+        return i
+
+    def Normalize(self, string):
+        """
+        Takes a raw string (e.g., entry from docket sheet) and returns the
+        standardized text, ready to be split into sentences and clauses
+        """
+        i = string.lower()
+
+        # Remove parenthetical and bracketed statements
+        i = re_parens.sub(' ', i)
+        i = re_brackets.sub(' ', i)
+
+        # Remove any token NOT containint
+        i = ' '.join(i.replace('\n\n', '. ').split())
+
+        # Standardize possessives and apostrophes
+        i = i.replace("'s ", " _s ")
+        i = i.replace("s' ", "s _s ")
+
+        # Standardize party names
+        ## Respondent -> Defendant
+        ## Petitioner -> Plaintiff
+        i = i.replace(' respondent', ' defendant')
+        i = i.replace(' petitioner', ' plaintiff')
+
+        # Replace shorthand phrases (using list of abbreviations)
+        i = i.replace('&', ' and ')
+        i = i.replace(' w/ ', ' with ')
+        i = i.replace(' w/p', ' with p')
+        i = i.replace(' w/o ', ' without ')
+        i = i.replace(' w/out ', ' without ')
+        i = i.replace(' w/ out ', ' without ')
+
+        i = self.Shorthand(i)
+        i = i.replace(' is gr ', ' is granted ')
+
+        i = i.replace(" _s ", "_s ")
+
+        ## Clean up motions
+        i = re_motion1.sub(' \\1 \\2 ', i)
+        i = re_motion2.sub(' by_\\1 \\2 ', i)
+        i = re_motion3.sub(' by_\\1 ', i)
+
+        # Retain some key phrases when tokenizing
+        if self.phrasesearch is not None and self.phrasesearch.search(i):
+            for s in self.keyphrs:
+                i = i.replace(s, s.replace(' ', '_'))
+        i = i.replace(' r and r ', ' r_r ')
+        i = i.replace(' report and recommendations ', ' r_r ')
+        i = i.replace(' report and recommendation ', ' r_r ')
+
+        # Remove "stipulation and order"
+        i = i.replace(' stipulation and order ', ' order ')
+
+        # Clean up judgment directions
+        i = re_judgment1.sub('judgment in favor of \\1', i)
+        i = re_judgment2.sub('judgment in favor of \\1', i)
+
+        # Final clean-up
+        i = re_short.sub('\\1 \\2', i)
+        i = ' '.join(i.split())
+        i = i.replace('plaintiffs_s ','plaintiff ')
+        i = i.replace('plaintiff_s ', 'plaintiff ')
+        i = i.replace('defendants_s ', 'defendant ')
+        i = i.replace('defendant_s ', 'defendant ')
+
+        i = re_punct.sub('\\1', i)
+        return i
+
+def ExpandTerm(term):
+    """
+    Lists every string matched by a shorthand term (e.g., "defts?" matches
+    "deft" and "defts"). Returns None if term uses other regex syntax.
+    """
+    found = ['']
+    for n, c in enumerate(term):
+        if c == '?':
+            continue
+        if c in '.^$*+{}[]\\|()':
+            return None
+        if n + 1 < len(term) and term[n+1] == '?':
+            found = found + [x + c for x in found]
+        else:
+            found = [x + c for x in found]
+    return sorted(set(found))
+
+def TermInteracts(replacement, term, expanded):
+    """
+    Checks whether replacing a shorthand term with replacement could create
+    a new match for (a later) term, either inside the replacement or together
+    with the text around it.
+    """
+    if re.search('(?<![A-z])(?:' + term + ')(?![A-z])', replacement):
+        return True
+    if any(replacement in x for x in expanded):
+        return True
+    def Boundary(string, n):
+        return n < 0 or n >= len(string) or not re.match('[A-z]', string[n])
+    # Replacement could change the boundaries of the surrounding text
+    if Boundary(replacement, 0) or Boundary(replacement, len(replacement) - 1):
+        return True
+    for x in expanded:
+        for n in range(1, len(x)):
+            # Part of x at the end of the replacement, rest after it
+            if Boundary(x, n) and replacement.endswith(x[:n]) and Boundary(replacement, len(replacement) - n - 1):
+                return True
+            # Part of x before the replacement, rest at its start
+            if Boundary(x, n - 1) and replacement.startswith(x[n:]) and Boundary(replacement, len(x) - n):
+                return True
+    return False
+
+re_parens = re.compile('\([^\)]*\)')
+re_brackets = re.compile('\[[^\]]*\]')
+re_motion1 = re.compile(' (petitions?|motions?) (?:for|to) ([^ ]+) ')
+re_motion2 = re.compile(' (def|pla)(?:endant|intiff)s?(?:_s)? (petitions?|motions?)')
+re_motion3 = re.compile(' (?:by|filed by) (?:the )?(def|pla)(?:endant|intiff)s? ')
+re_judgment1 = re.compile('judgment for (?:all )?(def|pla)')
+re_judgment2 = re.compile('judgment (?:is )?granted +(?:for|to) +(?:all +)?(def|pla)')
+re_short = re.compile('(^| )[^a-z' + clause_breaks + ']{2,}($| )')
+re_punct = re.compile(' ([,\.;:_])')
+re_clause = re.compile('[' + clause_breaks + ']')
+re_nonword = re.compile('[^_a-z]')
+
+def BasicTextFormatter(string, normalizer=None, stats=None):
     """
     Takes a raw string (e.g., entry from docket sheet) and does some preprocessing to standardize the text.
     This is designed to work with the dictionary-based classifier of civil outcomes.
     :param string: str of docket text
+    :param normalizer: TextNormalizer (to use custom dictionary files)
+    :param stats: stats object (optional, e.g., judges.Stats.Stats) to time each stage
     :return: list of str, each representing a clause in string with processed text
     """
 
-    i = string.lower()
-
-    # Remove parenthetical and bracketed statements
-    i = re.sub('\([^\)]*\)', ' ', i)
-    i = re.sub('\[[^\]]*\]', ' ', i)
-
-    # Remove any token NOT containint
-    i = ' '.join(i.replace('\n\n', '. ').split())
-
-    # Standardize possessives and apostrophes
-    i = i.replace("'s ", " _s ")
-    i = i.replace("s' ", "s _s ")
-
-    # Standardize party names
-    ## Respondent -> Defendant
-    ## Petitioner -> Plaintiff
-    i = i.replace(' respondent', ' defendant')
-    i = i.replace(' petitioner', ' plaintiff')
-
-    # Replace shorthand phrases (using list of abbreviations)
-    i = i.replace('&', ' and ')
-    i = i.replace(' w/ ', ' with ')
-    i = i.replace(' w/p', ' with p')
-    i = i.replace(' w/o ', ' without ')
-    i = i.replace(' w/out ', ' without ')
-    i = i.replace(' w/ out ', ' without ')
-
-    for s in abbr:
-        i = re.sub('(^|[^A-z])' + s + '($|[^A-z])', '\\1' + abbr[s] + '\\2', i)
-    i = i.replace(' is gr ', ' is granted ')
-
-    i = i.replace(" _s ", "_s ")
-
-    ## Clean up motions
-    i = re.sub(' (petitions?|motions?) (?:for|to) ([^ ]+) ', ' \\1 \\2 ', i)
-    i = re.sub(' (def|pla)(?:endant|intiff)s?(?:_s)? (petitions?|motions?)', ' by_\\1 \\2 ', i)
-    i = re.sub(' (?:by|filed by) (?:the )?(def|pla)(?:endant|intiff)s? ', ' by_\\1 ', i)
-
-    # Retain some key phrases when tokenizing
-    for s in keyphrsS + keyphrsP:
-        i = i.replace(s, s.replace(' ', '_'))
-    i = i.replace(' r and r ', ' r_r ')
-    i = i.replace(' report and recommendations ', ' r_r ')
-    i = i.replace(' report and recommendation ', ' r_r ')
-
-    # Remove "stipulation and order"
-    i = i.replace(' stipulation and order ', ' order ')
-
-    # Clean up judgment directions
-    i = re.sub('judgment for (?:all )?(def|pla)', 'judgment in favor of \\1', i)
-    i = re.sub('judgment (?:is )?granted +(?:for|to) +(?:all +)?(def|pla)', 'judgment in favor of \\1', i)
-
-    # Final clean-up
-    i = re.sub('(^| )[^a-z' + clause_breaks + ']{2,}($| )', '\\1 \\2', i)
-    i = ' '.join(i.split())
-    i = i.replace('plaintiffs_s ','plaintiff ')
-    i = i.replace('plaintiff_s ', 'plaintiff ')
-    i = i.replace('defendants_s ', 'defendant ')
-    i = i.replace('defendant_s ', 'defendant ')
-
-    i = re.sub(' ([,\.;:_])', '\\1', i)
-    sentences = [x if x[-1] != '.' else x[:-1] for x in sent_tokenize(i)]
-    clauses = [[x for x in re.split('[' + clause_breaks + ']', y) if any(z.islower() for z in x)] for y in sentences]
-    clauses = [[' '.join(re.sub('[^_a-z]', ' ', y).split()) for y in x] for x in clauses]
+    if stats is not None:
+        t = stats.Clock()
+    normalizer = DefaultNormalizer() if normalizer is None else normalizer
+    i = normalizer.Normalize(string)
+    if stats is not None:
+        t = stats.Lap('classify.normalize', t)
+    sentences = [x if x[-1] != '.' else x[:-1] for x in SentTokenizer()(i)]
+    if stats is not None:
+        t = stats.Lap('classify.sent_tokenize', t)
+    clauses = [[x for x in re_clause.split(y) if any(z.islower() for z in x)] for y in sentences]
+    clauses = [[' '.join(re_nonword.sub(' ', y).split()) for y in x] for x in clauses]
+    if stats is not None:
+        stats.Lap('classify.clauses', t)
 
     return clauses
 
-def Classify(entries, habeas=False):
+def EntryClauses(string, stats=None):
+    """
+    Processes the text of one docket entry for Classify
+    :param string: str of docket text
+    :param stats: stats object (optional, e.g., judges.Stats.Stats) to time each stage
+    :return: tuple of (list of str, the clauses; list of lists of str, the
+        stemmed keywords in each clause, without clauses that have none;
+        int, the number of tokens)
+    """
+    # We use "settle" to classify cases as settlement, and this judge's
+    # name is causing problems
+    string = string.replace('Benjamin H. Settle'.lower(), ' ')
+    string = string.replace('Benjamin Settle'.lower(), ' ')
+    raw = [y for x in BasicTextFormatter(string, stats=stats) for y in x if y != ""]
+
+    if stats is not None:
+        t = stats.Clock()
+    # clauses = [re.sub('  +',' ',x) for x in clauses]
+    clauses = [[x for x in y.split(' ') if re.search("[a-z]", x) and len(x) > 1] for y in raw]
+    tokens = sum([len(x) for x in clauses])
+    clauses = [[KeywordStem(x) for x in y] for y in clauses]
+    clauses = [[x for x in y if x is not None] for y in clauses]
+    clauses = [x for x in clauses if x != []]
+    if stats is not None:
+        stats.Lap('classify.stem', t)
+
+    return raw, clauses, tokens
+
+def CaseClauses(entries, stats=None, cache=None):
+    """
+    Processes the entries of a case (with EntryClauses, or from cache)
+    :return: tuple of (str, the clauses joined by " "; list of lists of str,
+        the stemmed keywords in each clause)
+    """
+    texts = [entries[x]['entry_text'] for x in entries]
+    if cache is not None:
+        keys = [EntryKey(x) for x in texts]
+        found = cache.Get(keys)
+        new = {}
+        if stats is not None:
+            stats.Count('classify.cache_lookups', len(keys))
+            stats.Count('classify.cache_hits', sum([1 for x in keys if x in found]))
+    raw = []
+    clauses = []
+    for n, string in enumerate(texts):
+        if cache is None:
+            processed = EntryClauses(string, stats)
+        elif keys[n] in found:
+            processed = found[keys[n]]
+        else:
+            processed = EntryClauses(string, stats)
+            found[keys[n]] = new[keys[n]] = processed
+        raw.extend(processed[0])
+        clauses.extend(processed[1])
+        if stats is not None:
+            stats.Count('classify.clauses', len(processed[0]))
+            stats.Count('classify.tokens', processed[2])
+            stats.Count('classify.keywords', sum([len(x) for x in processed[1]]))
+    if cache is not None:
+        cache.Put(new)
+    return ' '.join(raw), clauses
+
+def DedupeMotions(mss):
+    """
+    Drops motions and petitions that are part of a longer one (e.g.,
+    "defendant/mot_pet" when "defendant/mot_pet/grant" was found) and sorts them
+    """
+    mss = ["" if any((x in z and len(x) < len(z)) for z in mss) else x for x in mss]
+    mss = [x for x in mss if x != ""]
+    return sorted(mss)
+
+def Classify(entries, habeas=False, stats=None, rules=None, cache=None):
     """
     Take a set of docket entries (for civil cases) and use dictionary methods to
     classify the case outcome(s) using categories in outvars
     :param entries: dict generated by ExtractEntries()
     :param habeas: bool
+    :param stats: stats object (optional, e.g., judges.Stats.Stats); adds the time spent in each
+        stage (classify.normalize, .sent_tokenize, .clauses, .stem, .rules,
+        .motions) and counters (cases, entries, clauses, tokens, keywords,
+        and cache_lookups, cache_hits with a cache)
+    :param rules: OutcomeRules.RuleEngine (optional) to use a custom rule table
+    :param cache: EntryCache.EntryCache (optional); processed entries are
+        saved in it, and entries found in it are not processed again
     :return: tuple of dict with classifications and cleaned text
     """
 
     outcome = {x: False for x in outvars}
+    if stats is not None:
+        stats.Count('classify.cases')
+        stats.Count('classify.entries', len(entries))
     if entries == {}:
         return (outcome, '')
 
     # Break entries into clauses (useful down below)
-    clauses = []
-    for string in [entries[x]['entry_text'] for x in entries]:
-        # We use "settle" to classify cases as settlement, and this judge's
-        # name is causing problems
-        string = string.replace('Benjamin H. Settle'.lower(), ' ')
-        string = string.replace('Benjamin Settle'.lower(), ' ')
-        clauses.extend([y for x in BasicTextFormatter(string) for y in x if y != ""])
-
-    ## Catch some useful stuff
-    if 'forma pauperis' in ' '.join(clauses):
-        outcome['forma_pauperis'] = True
-    if 'forum non conveniens' in ' '.join(clauses):
-        outcome['forum_non_conveniens'] = True
-
-    # clauses = [re.sub('  +',' ',x) for x in clauses]
-    clauses = [[x for x in y.split(' ') if re.search("[a-z]", x) and len(x) > 1] for y in clauses]
-    clauses = [[stemmer.stem(x) for x in y] for y in clauses]
-    clauses = [[x for x in y if x in keywords or '_' in x] for y in clauses]
-    clauses = [x for x in clauses if x != []]
+    raw, clauses = CaseClauses(entries, stats, cache)
 
     text_merge = '-'.join(['.'.join(x) for x in clauses])
 
+    if stats is not None:
+        t = stats.Clock()
+
     # CODE OUTCOMES ACCORDING TO RULES
+    ## See OutcomeRules.DefaultRules; also keeps all formatted strings
+    ## related to motions and petitions, can use later to code outcomes
+    ## that are blank
+    rules = DefaultRuleEngine() if rules is None else rules
+    mss = rules.Apply(raw, text_merge, outcome, habeas)
 
-    ## Find R&Rs
-    if 'r_r' in text_merge and 'adopt' in text_merge:
-        outcome['r&r'] = True
-
-    ## Case transfered elsewhere, not terminated
-    if 'transfer' in text_merge:
-        outcome['transfer'] = True
-
-    ## Default judgment, favors plaintiff
-    if 'default.judgment' in text_merge and 'dismiss' not in text_merge:
-        outcome['default'] = True
-
-        ## Review of agencies and state courts: affirm, reverse, remand
-    if 'remand' in text_merge:
-        outcome['remand'] = True
-        if re.search(settsearch2, text_merge):
-            outcome['settlement'] = True
-
-    if 'affirm' in text_merge:
-        outcome['review'] = True
-        outcome['defendant'] = True  # Affirm = pro-defendant (eg, SSA)
-
-    if 'revers' in text_merge:
-        outcome['review'] = True
-        outcome['plaintiff'] = True
-
-    ## Habeas Cases
-    if habeas == True or 'habea' in text_merge:
-        if 'petit.deni' in text_merge and not 'petit.grant' in text_merge:
-            outcome['dismiss'] = True
-            if not 'without_prejudic' in text_merge:
-                outcome['w_prej-involuntary'] = True
-            else:
-                outcome['wo_prej'] = True
-        if 'petit.grant' in text_merge and not 'petit.deni' in text_merge:
-            outcome['plaintiff'] = True
-        if ('deni' in text_merge or 'dismiss' in text_merge) and not 'grant' in text_merge:
-            outcome['dismiss'] = True
-            if not 'without_prejudic' in text_merge:
-                outcome['w_prej-involuntary'] = True
-            else:
-                outcome['wo_prej'] = True
-        if ('deni' not in text_merge and 'dismiss' not in text_merge) and 'grant' in text_merge:
-            outcome['plaintiff'] = True
-
-    ## Settlements and dismissals
-    if re.search(settsearch1, text_merge):
-        outcome['dismiss'] = True
-        outcome['settlement'] = True
-        outcome['w_prej-voluntary'] = True
-    elif 'dismiss' in text_merge and (habeas == False and 'habea' not in text_merge):
-        outcome['dismiss'] = True
-        # Prejudice language in text (all allowed, e.g, dismissals of multiple claims)
-        if 'without_prejudic' in text_merge:
-            outcome['wo_prej'] = True
-        if 'with_prejudic' in text_merge:
-            if re.search(settsearch2, text_merge):
-                outcome['settlement'] = True
-                outcome['w_prej-voluntary'] = True
-            else:
-                outcome['w_prej-involuntary'] = True
-        # No prejudice language at all
-        if 'without_prejudic' not in text_merge and 'with_prejudic' not in text_merge:
-            if 'stipul' in text_merge and 'proposed_ord' in text_merge:
-                outcome['settlement'] = True
-                outcome['w_prej-voluntary'] = True
-            else:  # This is our reversion classification -- when not clear what kind of dism
-                outcome['wo_prej_d'] = True
-
-    ## Wrong venue?
-    if 'lack.jurisdict' in text_merge:
-        outcome['lack_jurisdiction'] = True
-    if 'lack.stand' in text_merge:
-        outcome['lack_standing'] = True
-
-    ## Identify summary judgments, other judgments (e.g., after trial)
-
-    ## Also keep all formatted strings related to motions and petitions
-    ## can use later to code outcomes that are blank
-    mss = []
-    for clause in clauses:
-        i = '.'.join(clause)
-        if 'petit' in i or 'motion' in i:
-            i = i.replace('petit','motion')
-            if 'by_def' in i or 'defend.motion' in i:
-                mss.append('defendant/mot_pet')
-                for r in re.findall('(?:grant|deni)', i):
-                    mss.append('defendant/mot_pet/' + r)
-            if ('by_pla' in i or 'plaintiff.motion' in i) and 'grant' in i:
-                mss.append('plaintiff/mot_pet')
-                for r in re.findall('(?:grant|deni)', i):
-                    mss.append('plaintiff/mot_pet/' + r)
-        if 'summari.judgment' in i and not 'deni' in i:
-            outcome['sumjud'] = True
-            if 'motion.summari.judgment' in i and ('grant' in i and 'deni' not in i):
-                if 'by_def' in i or 'defend' in i:
-                    outcome['defendant'] = True
-                if 'by_pla' in i or 'plaintiff' in i:
-                    outcome['plaintiff'] = True
-        elif 'judgment' in i and not 'default.judgment' in i:
-            if not any(outcome[z] for z in outcome if
-                       z not in ['r&r', 'lack_jurisdiction', 'lack_standing', 'forma_pauperis',
-                                 'forum_non_conveniens']):
-                outcome['jud'] = True
-        else:  # do not code direction if language above not found
-            continue
+    if stats is not None:
+        t = stats.Lap('classify.rules', t)
 
-    mss = ["" if any((x in z and len(x) < len(z)) for z in mss) else x for x in mss]
-    mss = [x for x in mss if x != ""]
+    outcome['motions_petitions'] = DedupeMotions(mss)
 
-    ## Code directions if a judgment is identified
-    ## This is overly inclusive -- will code D and P decisions liberally!
-    if outcome['jud'] == True or outcome['sumjud'] == True:
-        if 'favor.defend' in text_merge or 'against.plaintiff' in text_merge:
-            outcome['defendant'] = True
-        if 'favor.plaintiff' in text_merge or 'against.defend' in text_merge:
-            outcome['plaintiff'] = True
-        if 'award.platiff.damag' in text_merge:
-            outcome['plaintiff'] = True
-        if 'plaintiff.entitl.judgment' in text_merge:
-            outcome['plaintiff'] = True
-        if 'defend.entitl.judgment' in text_merge:
-            outcome['defendant'] = True
-
-    outcome['motions_petitions'] = sorted(mss)
+    if stats is not None:
+        stats.Lap('classify.motions', t)
 
     return outcome, text_merge
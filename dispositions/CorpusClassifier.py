@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Ryan Hübert
+# Department of Political Science
+# University of California, Davis
+
+"""
+dispositions.CorpusClassifier v1.1
+Codes the outcomes of a whole corpus of cases at once, with the rules of
+Classify (dispositions.CivilDictionaryClassifier) evaluated as array
+operations over all cases together. Requires numpy.
+    features = CorpusFeatures()
+    for entries in cases:
+        features.Add(entries)
+    table = EvaluateRules(features)
+    table['dismiss'] # numpy array of bool, one per case
+or simply table = ClassifyCorpus(cases). The table has one column for each
+of outvars (and any other outcome coded by a custom rule table), and agrees
+with Classify case by case.
+
+Each case is encoded as a sparse matrix of features: the stemmed keywords
+and n-grams of keywords (e.g., "petit.deni", "lack.jurisdict") in each
+clause that contain a pattern used by the rules. A second sparse matrix maps
+each feature to the patterns it contains, so the patterns found in every
+clause and case are computed together, and each rule is a few boolean
+operations on columns. Dense boolean matrices are only built for a block of
+cases at a time (EvaluateRules(features, block=10000)), so memory use grows
+with the size of the sparse features, not with cases x patterns. Clause texts
+are not kept: the occurrences of the 'each' patterns of rules that add motions
+and petitions are found as cases are added, and stored as small ids.
+
+New in v1.1: rules are evaluated in blocks of cases, and texts are not kept.
+"""
+
+import re
+import array
+from functools import lru_cache
+
+from dispositions.CivilDictionaryClassifier import CaseClauses, DedupeMotions, DefaultRuleEngine, outvars
+from dispositions.OutcomeRules import Patterns
+
+@lru_cache(maxsize=None)
+def Numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise Exception('CorpusClassifier requires numpy')
+    return numpy
+
+def Regexes(condition):
+    """
+    Lists the regexes in a condition
+    """
+    if isinstance(condition, str):
+        return []
+    elif condition[0] in ['all', 'any', 'not']:
+        return [x for c in condition[1:] for x in Regexes(c)]
+    elif condition[0] == 'regex':
+        return [condition[1]]
+    return []
+
+class CorpusFeatures(object):
+    """
+    Keyword and n-gram features of many cases, for the patterns of a rule
+    table (an OutcomeRules.RuleEngine; the default rules if None).
+    Features are stored as compact arrays (CSR format): feature ids of each
+    clause, and clauses of each case.
+    """
+    def __init__(self, rules=None):
+        self.rules = DefaultRuleEngine() if rules is None else rules
+        table = self.rules.rules
+
+        # Columns: ('raw', pattern), ('text', pattern) (also used for
+        # clauses) and ('regex', scope, pattern)
+        self.columns = {}
+        for rule in table:
+            scope = 'raw' if rule['scope'] == 'raw' else 'text'
+            for x in Patterns(rule['when']):
+                self.columns.setdefault((scope, x), len(self.columns))
+            for x in Regexes(rule['when']):
+                self.columns.setdefault(('regex', rule['scope'], x), len(self.columns))
+        self.raw_patterns = [(x[1], n) for x, n in self.columns.items() if x[0] == 'raw' and x[1] != '']
+        self.regexes = {scope: [(re.compile(x[2]), n) for x, n in self.columns.items() if x[0] == 'regex' and x[1] == scope]
+                        for scope in ['raw', 'text', 'clause']}
+        # A pattern with k separators ("." or "-") is found in n-grams of k + 1 keywords
+        self.ngrams = {}
+        for x, n in self.columns.items():
+            if x[0] == 'text' and x[1] != '':
+                size = x[1].count('.') + x[1].count('-') + 1
+                self.ngrams.setdefault(size, []).append((x[1], n))
+        self.crossclause = any('-' in x[1] for x in self.columns if x[0] == 'text')
+        self.always = [n for x, n in self.columns.items() if x[0] in ['raw', 'text'] and x[1] == '']
+
+        # The 'each' patterns of rules that add motions and petitions: their
+        # occurrences in each clause (or case) are stored as ids of hit_table
+        self.eaches = {} # (scope, regex) -> position in self.hits
+        for rule in table:
+            each = [re.escape(x) for x in rule.get('each', []) if x != '']
+            if rule.get('emit') is not None and each != []:
+                self.eaches.setdefault((rule['scope'], '|'.join(each)), len(self.eaches))
+        self.each_regexes = [(scope, re.compile(x)) for scope, x in self.eaches]
+        self.hits = [array.array('i') for x in self.eaches] # one id per clause (or case)
+        self.hit_table = [()] # id -> tuple of occurrences
+        self.hit_ids = {(): 0}
+
+        self.vocabulary = {} # n-gram -> feature id (-1 if it contains no pattern)
+        self.clause_features = {} # clause -> feature ids (docket clauses repeat a lot)
+        self.feature_columns = [] # feature id -> columns
+        self.habeas = []
+        self.empty = array.array('b')
+        self.clause_counts = array.array('i')
+        self.row_ends = array.array('q') # end of each clause's features
+        self.row_features = array.array('i')
+        self.case_ends = array.array('q') # end of each case's own columns
+        self.case_columns = array.array('i') # raw patterns, regexes, patterns across clauses
+        self.extra_rows = array.array('q') # (row, column) of clause regexes
+        self.extra_columns = array.array('i')
+
+    def __len__(self):
+        return len(self.habeas)
+
+    def Feature(self, string):
+        """
+        Feature id of an n-gram (keywords joined by "." or "-"), or -1
+        """
+        if string not in self.vocabulary:
+            size = string.count('.') + string.count('-') + 1
+            columns = [n for x, n in self.ngrams.get(size, []) if x in string]
+            if columns == []:
+                self.vocabulary[string] = -1
+            else:
+                self.vocabulary[string] = len(self.feature_columns)
+                self.feature_columns.append(columns)
+        return self.vocabulary[string]
+
+    def HitId(self, found):
+        found = tuple(found)
+        if found not in self.hit_ids:
+            self.hit_ids[found] = len(self.hit_table)
+            self.hit_table.append(found)
+        return self.hit_ids[found]
+
+    def Hits(self, scope, regex, index):
+        """
+        Occurrences of an 'each' regex in a clause (index: its row) or a
+        case (index: its position), for scope 'clause' or 'raw'/'text'
+        """
+        return self.hit_table[self.hits[self.eaches[(scope, regex)]][index]]
+
+    def Add(self, entries, habeas=False, cache=None, stats=None):
+        """
+        Encodes one case
+        :param entries: dict of docket entries (as for Classify)
+        :param habeas: habeas option of Classify for this case
+        :param cache: EntryCache.EntryCache (optional)
+        """
+        self.habeas.append(habeas)
+        self.empty.append(entries == {})
+        raw, clauses = CaseClauses(entries, stats, cache) if entries != {} else ('', [])
+        text_merge = '-'.join(['.'.join(x) for x in clauses])
+        for n, (scope, regex) in enumerate(self.each_regexes):
+            if scope != 'clause':
+                self.hits[n].append(self.HitId(regex.findall(raw if scope == 'raw' else text_merge)))
+
+        for clause in clauses:
+            string = '.'.join(clause)
+            if string not in self.clause_features:
+                found = set()
+                for size in self.ngrams:
+                    grams = clause if size == 1 else ['.'.join(clause[i:i+size]) for i in range(len(clause) - size + 1)]
+                    for x in grams:
+                        f = self.vocabulary.get(x)
+                        found.add(self.Feature(x) if f is None else f)
+                found.discard(-1)
+                hits = [(n, self.HitId(regex.findall(string))) for n, (scope, regex) in enumerate(self.each_regexes)
+                        if scope == 'clause']
+                extra = [n for regex, n in self.regexes['clause'] if regex.search(string)]
+                if len(self.clause_features) >= 2**17:
+                    self.clause_features = {}
+                self.clause_features[string] = (sorted(found), hits, extra)
+            found, hits, extra = self.clause_features[string]
+            self.row_features.extend(found)
+            self.row_ends.append(len(self.row_features))
+            for n, x in hits:
+                self.hits[n].append(x)
+            for n in extra:
+                self.extra_rows.append(len(self.row_ends) - 1)
+                self.extra_columns.append(n)
+        self.clause_counts.append(len(clauses))
+
+        columns = [n for x, n in self.raw_patterns if x in raw]
+        columns += [n for regex, n in self.regexes['raw'] if regex.search(raw)]
+        columns += [n for regex, n in self.regexes['text'] if regex.search(text_merge)]
+        if self.crossclause:
+            # n-grams that span clauses
+            tokens = [x for y in clauses for x in y]
+            seps = ['-' if n == len(y) - 1 else '.' for y in clauses for n in range(len(y))][:-1]
+            for size in self.ngrams:
+                for i in range(len(tokens) - size + 1):
+                    if '-' in seps[i:i+size-1]:
+                        string = tokens[i] + ''.join([seps[j] + tokens[j+1] for j in range(i, i + size - 1)])
+                        f = self.Feature(string)
+                        if f != -1:
+                            columns.extend(self.feature_columns[f])
+        self.case_columns.extend(columns)
+        self.case_ends.append(len(self.case_columns))
+
+    def Arrays(self):
+        """
+        :return: dict of numpy arrays (views of the stored features)
+        """
+        np = Numpy()
+        def View(x, dtype):
+            return np.frombuffer(x, dtype=dtype).astype(np.int64) if len(x) > 0 else np.zeros(0, np.int64)
+        arrays = {'row_features': View(self.row_features, np.int32), 'row_ends': View(self.row_ends, np.int64),
+                  'clause_counts': View(self.clause_counts, np.int32), 'case_ends': View(self.case_ends, np.int64),
+                  'case_columns': View(self.case_columns, np.int32), 'extra_rows': View(self.extra_rows, np.int64),
+                  'extra_columns': View(self.extra_columns, np.int32)}
+        # Feature -> columns (CSR)
+        arrays['feature_counts'] = np.array([len(x) for x in self.feature_columns], dtype=np.int64)
+        arrays['feature_columns'] = np.array([x for y in self.feature_columns for x in y], dtype=np.int64)
+        arrays['feature_starts'] = np.cumsum(arrays['feature_counts']) - arrays['feature_counts']
+        # First clause (row) of each case, and of the case after the last;
+        # start of each clause's features and each case's own columns
+        arrays['first'] = np.concatenate([[0], np.cumsum(arrays['clause_counts'])]).astype(np.int64)
+        arrays['row_bounds'] = np.concatenate([[0], arrays['row_ends']]).astype(np.int64)
+        arrays['case_bounds'] = np.concatenate([[0], arrays['case_ends']]).astype(np.int64)
+        return arrays
+
+    def Matrices(self, arrays=None, start=0, stop=None):
+        """
+        Dense matrices for cases start to stop
+        :param arrays: output of Arrays() (computed if None)
+        :return: tuple of (bool matrix cases x columns of patterns found in each
+            case, bool matrix clauses x columns of patterns found in each
+            clause, array of each case's first clause), for those cases only
+        """
+        np = Numpy()
+        arrays = self.Arrays() if arrays is None else arrays
+        stop = len(self.habeas) if stop is None else stop
+        ncases, ncolumns = stop - start, len(self.columns)
+        lo, hi = arrays['first'][start], arrays['first'][stop]
+        nrows = int(hi - lo)
+
+        # Clause -> features (CSR), for the block's clauses
+        bounds = arrays['row_bounds'][lo:hi + 1]
+        features = arrays['row_features'][bounds[0]:bounds[-1]]
+        rows = np.repeat(np.arange(nrows), np.diff(bounds))
+
+        # Clause -> columns: expand each (clause, feature) into its columns
+        n = arrays['feature_counts'][features]
+        rows = np.repeat(rows, n)
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(n) - n, n)
+        columns = arrays['feature_columns'][np.repeat(arrays['feature_starts'][features], n) + offsets]
+        clauses = np.zeros((nrows, ncolumns), dtype=bool)
+        clauses[rows, columns] = True
+        extra = slice(*np.searchsorted(arrays['extra_rows'], [lo, hi])) # rows are in order
+        clauses[arrays['extra_rows'][extra] - lo, arrays['extra_columns'][extra]] = True
+
+        # Case -> columns: its clauses and its own columns
+        counts = arrays['clause_counts'][start:stop]
+        first = arrays['first'][start:stop] - lo
+        cases = np.zeros((ncases, ncolumns), dtype=bool)
+        cases[np.repeat(np.arange(ncases), counts)[rows], columns] = True
+        bounds = arrays['case_bounds'][start:stop + 1]
+        own = arrays['case_columns'][bounds[0]:bounds[-1]]
+        cases[np.repeat(np.arange(ncases), np.diff(bounds)), own] = True
+        for x in self.always:
+            cases[:, x] = True
+            clauses[:, x] = True
+        return cases, clauses, first
+
+    def Vector(self, condition, X, scope, outcome, options, active=None):
+        """
+        Evaluates a condition for every row of X
+        :param outcome: dict of outcome -> array (all cases)
+        :param options: dict of (option, value) -> array (all cases)
+        :param active: the cases in X (None if X has every case)
+        :return: numpy array of bool
+        """
+        np = Numpy()
+        if isinstance(condition, str):
+            return X[:, self.columns[('raw' if scope == 'raw' else 'text', condition)]]
+        op, args = condition[0], condition[1:]
+        if op in ['all', 'any']:
+            output = np.full(X.shape[0], op == 'all')
+            for x in args:
+                if op == 'all':
+                    output = output & self.Vector(x, X, scope, outcome, options, active)
+                else:
+                    output = output | self.Vector(x, X, scope, outcome, options, active)
+            return output
+        elif op == 'not':
+            return ~self.Vector(args[0], X, scope, outcome, options, active)
+        elif op == 'outcome':
+            output = np.zeros(X.shape[0], dtype=bool)
+            for x in args:
+                if x in outcome:
+                    output = output | (outcome[x] if active is None else outcome[x][active])
+            return output
+        elif op == 'option':
+            return options[(args[0], args[1])] if active is None else options[(args[0], args[1])][active]
+        elif op == 'regex':
+            return X[:, self.columns[('regex', scope, args[0])]]
+        raise Exception('Unknown condition: ' + repr(condition))
+
+def EvaluateRules(features, stats=None, block=10000):
+    """
+    Applies the rules of features (a CorpusFeatures) to every case
+    :param block: number of cases evaluated at a time (bounds the size of
+        the dense matrices)
+    :return: dict of outcome -> numpy array of bool (one per case), and
+        'motions_petitions' -> list (one per case)
+    """
+    np = Numpy()
+    if stats is not None:
+        t = stats.Clock()
+    ncases = len(features)
+    table = features.rules.rules
+    outcome = {x: np.zeros(ncases, dtype=bool) for x in outvars if x != 'motions_petitions'}
+    for rule in table:
+        for x in rule['set']:
+            outcome.setdefault(x, np.zeros(ncases, dtype=bool))
+    values = set()
+    def Options(condition):
+        if isinstance(condition, str):
+            return
+        if condition[0] == 'option':
+            values.add((condition[1], condition[2]))
+        elif condition[0] in ['all', 'any', 'not']:
+            for x in condition[1:]:
+                Options(x)
+    for rule in table:
+        Options(rule['when'])
+    options = {x: np.array([{'habeas': h}.get(x[0]) == x[1] for h in features.habeas], dtype=bool) for x in values}
+    motions = [[] for n in range(ncases)]
+
+    # Groups of consecutive rules with the same scope, as in RuleEngine
+    groups = []
+    for rule in table:
+        if groups != [] and groups[-1][0] == rule['scope']:
+            groups[-1][1].append(rule)
+        else:
+            groups.append((rule['scope'], [rule]))
+    eaches = [[('|'.join([re.escape(x) for x in rule.get('each', []) if x != '']) or None)
+               if rule.get('emit') is not None else None for rule in group] for scope, group in groups]
+
+    arrays = features.Arrays()
+    for start in range(0, ncases, block):
+        stop = min(start + block, ncases)
+        size = stop - start
+        cases, clauses, first = features.Matrices(arrays, start, stop)
+        if stats is not None:
+            t = stats.Lap('corpus.matrices', t)
+        # Views of the block's outcomes and options (rules write through them)
+        found_outcome = {x: outcome[x][start:stop] for x in outcome}
+        found_options = {x: options[x][start:stop] for x in options}
+        counts = arrays['clause_counts'][start:stop]
+        offset = arrays['first'][start]
+
+        for (scope, group), regexes in zip(groups, eaches):
+            if scope == 'clause':
+                # Clause by clause: the k-th clause of every case together
+                positions = [(k, np.nonzero(counts > k)[0]) for k in range(int(counts.max()) if size > 0 else 0)]
+            else:
+                positions = [(None, np.arange(size))]
+            for k, active in positions:
+                X = clauses[first[active] + k] if scope == 'clause' else cases
+                subset = active if len(active) < size else None
+                for rule, regex in zip(group, regexes):
+                    found = active[features.Vector(rule['when'], X, scope, found_outcome, found_options, subset)]
+                    for x in rule['set']:
+                        found_outcome[x][found] = True
+                    if rule.get('emit') is not None:
+                        for n in found:
+                            motions[start + n].append(rule['emit'])
+                            if regex is not None:
+                                index = offset + first[n] + k if scope == 'clause' else start + n
+                                motions[start + n].extend(rule['emit'] + '/' + x
+                                                          for x in features.Hits(scope, regex, index))
+        if stats is not None:
+            t = stats.Lap('corpus.rules', t)
+
+    # Cases without entries are not coded (as in Classify)
+    empty = np.frombuffer(features.empty, dtype=np.int8).astype(bool) if ncases > 0 else np.zeros(0, dtype=bool)
+    for x in outcome:
+        outcome[x][empty] = False
+    outcome['motions_petitions'] = [DedupeMotions(x) if not empty[n] else False for n, x in enumerate(motions)]
+    if stats is not None:
+        stats.Lap('corpus.motions', t)
+    return outcome
+
+def ClassifyCorpus(cases, habeas=False, rules=None, cache=None, stats=None):
+    """
+    Codes the outcomes of many cases (same as Classify on each case)
+    :param cases: iterable of dicts of docket entries (as for Classify)
+    :param habeas: habeas option of Classify, for all cases
+    :param rules: OutcomeRules.RuleEngine (optional) to use a custom rule table
+    :param cache: EntryCache.EntryCache (optional)
+    :param stats: stats object (optional, e.g., judges.Stats.Stats)
+    :return: dict of outcome -> numpy array of bool (one per case), and
+        'motions_petitions' -> list (one per case)
+    """
+    features = CorpusFeatures(rules)
+    for entries in cases:
+        if stats is not None:
+            stats.Count('classify.cases')
+            stats.Count('classify.entries', len(entries))
+        features.Add(entries, habeas, cache, stats)
+    return EvaluateRules(features, stats)
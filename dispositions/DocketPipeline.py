@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Ryan Hübert
+# Department of Political Science
+# University of California, Davis
+
+"""
+dispositions.DocketPipeline v1.2
+An asyncio pipeline that codes cases as they arrive:
+    read -> parse -> tag (judges.NameFinder) -> classify (Classify) -> write
+Stages are connected by bounded queues, so when a stage (or the disk) is
+slow, the stages before it wait instead of filling memory, and the other
+stages keep working. NameFinder and Classify run in an executor (by default,
+a pool of worker processes), and each stage runs several tasks at once
+(concurrency={'tag': 4, ...}).
+
+Cases are read from a source:
+- DirectorySource: a spool directory of JSON (one case) or JSONL (one case
+  per line) files, like the input of BulkClassifier. With poll=seconds, new
+  files are picked up until the pipeline is stopped; with done=directory,
+  files are moved there once all their cases (or errors) are written and
+  the sink is flushed (JSONLSink also syncs the file to disk), so a crash
+  never loses a case: it is either still in the spool or in the output.
+  Files should be written elsewhere and moved into the spool directory
+  when complete.
+- QueueSource: an asyncio.Queue of cases (dicts, or JSON strings); None ends it.
+Results are written to a sink: JSONLSink (a file), QueueSink (an
+asyncio.Queue), or any object with async Write(row) and Close() methods (and,
+optionally, async Flush(), awaited before a source's item is acknowledged).
+    pipeline = DocketPipeline(DirectorySource('spool', poll=5, done='spool/done'),
+                              JSONLSink('outcomes.jsonl'), namedict=LoadData())
+    asyncio.run(pipeline.Run())
+Stop() stops reading new cases; cases already read are finished and written
+before Run returns (e.g., loop.add_signal_handler(signal.SIGTERM, pipeline.Stop)).
+
+Each row has the case ID, the outcomes (as in BulkClassifier) and 'judges'
+({entry key: IDs found by NameFinder}). Cases that cannot be read or coded
+have 'error' instead (a bad line of a JSONL file only affects that line's
+case). Rows are written as cases finish, which may not be the
+order they were read.
+
+New in v1.1: sinks are flushed before finished files are moved to done.
+New in v1.2: a bad JSONL line gives an error row for that line instead of
+failing the whole file.
+"""
+
+import os
+import json
+import glob
+import asyncio
+import argparse
+import functools
+import concurrent.futures
+
+from dispositions.CivilDictionaryClassifier import Classify
+
+stages = ['read', 'parse', 'tag', 'classify', 'write']
+
+# Worker state (set by InitWorker in each worker process)
+_worker = {}
+
+def InitWorker(namedict, namefinder_options, rules):
+    _worker['namedict'] = namedict
+    _worker['options'] = namefinder_options
+    _worker['rules'] = rules
+    _worker['index'] = None
+    if namedict is not None:
+        from judges.NameFinder import NameIndex
+        _worker['index'] = NameIndex(namedict, namefinder_options.get('namekeys', ("First Name","Middle Name","Last Name","Suffix")),
+                                     namefinder_options.get('fuzzy', 0))
+
+def TagEntries(entries):
+    """
+    Worker task: IDs of the judges named in each entry
+    """
+    from judges.NameFinder import NameFinder
+    return {k: NameFinder(_worker['namedict'], entries[k]['entry_text'], index=_worker['index'],
+                          easy_output=True, **_worker['options'])
+            for k in entries}
+
+def ClassifyEntries(entries, habeas):
+    """
+    Worker task: outcomes of a case
+    """
+    return Classify(entries, habeas=habeas, rules=_worker['rules'])[0]
+
+class Item(object):
+    """
+    One item from a source (a file or a queued case), and its cases
+    """
+    def __init__(self, path=None, text=None, record=None, ack=None):
+        self.path = path
+        self.text = text
+        self.record = record
+        self.ack = ack # called once every case of the item is written
+        self.error = None
+        self.remaining = 0
+
+class Case(object):
+    def __init__(self, item, record=None, error=None):
+        self.item = item
+        self.record = record
+        self.error = error
+        self.judges = None
+        self.outcome = None
+
+class DirectorySource(object):
+    """
+    Cases in the files of a spool directory (see module docstring)
+    :param pattern: file names to read
+    :param poll: seconds between looks for new files (None: read the files
+        that are there and stop)
+    :param done: directory where finished files are moved (None: leave them)
+    """
+    def __init__(self, path, pattern='*.json*', poll=None, done=None):
+        self.path = path
+        self.pattern = pattern
+        self.poll = poll
+        self.done = done
+        self.stopping = None
+
+    def Stop(self):
+        if self.stopping is not None:
+            self.stopping.set()
+
+    def Ack(self, path):
+        if self.done is not None:
+            os.makedirs(self.done, exist_ok=True)
+            os.replace(path, os.path.join(self.done, os.path.basename(path)))
+
+    async def Items(self):
+        self.stopping = asyncio.Event()
+        seen = set()
+        while not self.stopping.is_set():
+            for path in sorted(glob.glob(os.path.join(self.path, self.pattern))):
+                if self.stopping.is_set():
+                    return
+                if path not in seen and os.path.isfile(path):
+                    seen.add(path)
+                    yield Item(path=path, ack=functools.partial(self.Ack, path))
+            if self.poll is None:
+                return
+            try:
+                await asyncio.wait_for(self.stopping.wait(), self.poll)
+            except asyncio.TimeoutError:
+                pass
+
+class QueueSource(object):
+    """
+    Cases put in an asyncio.Queue (dicts like a line of BulkClassifier's
+    input, or JSON strings); None marks the end
+    """
+    def __init__(self, queue):
+        self.queue = queue
+        self.stopping = None
+
+    def Stop(self):
+        if self.stopping is not None:
+            self.stopping.set()
+
+    async def Items(self):
+        self.stopping = asyncio.Event()
+        stop = asyncio.ensure_future(self.stopping.wait())
+        try:
+            while not self.stopping.is_set():
+                get = asyncio.ensure_future(self.queue.get())
+                await asyncio.wait([get, stop], return_when=asyncio.FIRST_COMPLETED)
+                if not get.done():
+                    get.cancel()
+                    return
+                x = get.result()
+                if x is None:
+                    return
+                yield Item(text=x) if isinstance(x, str) else Item(record=x)
+        finally:
+            stop.cancel()
+
+class JSONLSink(object):
+    """
+    Writes rows to a JSONL file (appended)
+    """
+    def __init__(self, path):
+        self.fp = open(path, 'a', encoding='utf-8')
+
+    async def Write(self, row):
+        line = json.dumps(row) + '\n'
+        await asyncio.get_running_loop().run_in_executor(None, self.fp.write, line)
+
+    def Sync(self):
+        self.fp.flush()
+        os.fsync(self.fp.fileno())
+
+    async def Flush(self):
+        """
+        Saves the rows written so far to disk
+        """
+        await asyncio.get_running_loop().run_in_executor(None, self.Sync)
+
+    async def Close(self):
+        self.fp.close()
+
+class QueueSink(object):
+    """
+    Puts rows in an asyncio.Queue, then None when the pipeline is done
+    """
+    def __init__(self, queue):
+        self.queue = queue
+
+    async def Write(self, row):
+        await self.queue.put(row)
+
+    async def Flush(self):
+        pass
+
+    async def Close(self):
+        await self.queue.put(None)
+
+def ReadFile(path):
+    with open(path, 'r', encoding='utf-8') as fp:
+        return fp.read()
+
+def ParseText(text):
+    """
+    Cases in a JSON object or JSONL text; a JSONL line that cannot be parsed
+    gives an error for that line only (if no line can be parsed, the text is
+    taken to be one bad JSON object)
+    :return: list of (dict, None) or (None, error message)
+    """
+    text = text.strip()
+    if text == '':
+        return []
+    try:
+        return [(json.loads(text), None)]
+    except ValueError as e:
+        whole = 'ValueError: ' + str(e)
+    cases = []
+    for n, line in enumerate(text.split('\n')):
+        if line.strip() == '':
+            continue
+        try:
+            cases.append((json.loads(line), None))
+        except ValueError as e:
+            cases.append((None, 'line ' + str(n + 1) + ': ValueError: ' + str(e)))
+    if all(x[0] is None for x in cases):
+        return [(None, whole)]
+    return cases
+
+_end = object() # marks the end of a queue (one per task of the next stage)
+
+class DocketPipeline(object):
+    """
+    :param source: DirectorySource, QueueSource (or anything with async
+        Items() and Stop())
+    :param sink: JSONLSink, QueueSink (or anything with async Write(row) and Close())
+    :param namedict: namedict for NameFinder (None: do not tag judges)
+    :param executor: concurrent.futures executor for NameFinder and Classify
+        (default: a ProcessPoolExecutor with workers processes). The workers
+        of a custom executor must run InitWorker(*pipeline.WorkerArgs());
+        it is run in this process, so a ThreadPoolExecutor needs nothing else.
+    :param concurrency: dict of stage -> number of tasks (default: 4 for
+        read, workers for tag and classify, 1 otherwise)
+    :param queue_size: most items waiting between two stages
+    :param habeas: habeas option of Classify (a case's "habeas" key overrides it)
+    :param namefinder_options: other options of NameFinder (e.g., matches)
+    :param rules: OutcomeRules.RuleEngine (optional) to use custom outcome rules
+    :param stats: stats object (optional, e.g., judges.Stats.Stats); adds the time spent in each
+        stage (pipeline.read, ...) and counters (items, cases, errors)
+    """
+    def __init__(self, source, sink, namedict=None, executor=None, workers=None, concurrency=None,
+                 queue_size=100, id_key='case_id', habeas=False, namefinder_options=None, rules=None,
+                 stats=None):
+        self.source = source
+        self.sink = sink
+        self.namedict = namedict
+        self.executor = executor
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.concurrency = {'read': 4, 'parse': 1, 'tag': self.workers, 'classify': self.workers, 'write': 1}
+        self.concurrency.update(concurrency or {})
+        self.queue_size = queue_size
+        self.id_key = id_key
+        self.habeas = habeas
+        self.namefinder_options = dict(namefinder_options or {})
+        self.rules = rules
+        self.stats = stats
+
+    def WorkerArgs(self):
+        return (self.namedict, self.namefinder_options, self.rules)
+
+    def Stop(self):
+        """
+        Stops reading new cases; Run returns once the cases already read are written
+        """
+        self.source.Stop()
+
+    async def Run(self):
+        """
+        Runs the pipeline until the source ends (or Stop is called)
+        :return: number of rows written
+        """
+        own = self.executor is None
+        if own:
+            executor = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=InitWorker,
+                                                              initargs=self.WorkerArgs())
+        else:
+            executor = self.executor
+            InitWorker(*self.WorkerArgs())
+        self.loop = asyncio.get_running_loop()
+        self.pool = executor
+        self.written = 0
+        queues = [asyncio.Queue(self.queue_size) for x in stages]
+        functions = {'read': self.Read, 'parse': self.Parse, 'tag': self.Tag,
+                     'classify': self.Classify, 'write': self.Write}
+        tasks = [asyncio.ensure_future(self.Feed(queues[0]))]
+        for n, stage in enumerate(stages):
+            outbox = queues[n + 1] if n + 1 < len(stages) else None
+            ends = self.concurrency[stages[n + 1]] if n + 1 < len(stages) else 0
+            tasks.append(asyncio.ensure_future(self.Stage(stage, functions[stage], queues[n], outbox, ends)))
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for x in tasks:
+                x.cancel()
+            raise
+        finally:
+            await self.sink.Close()
+            if own:
+                # Waits for the workers without blocking the loop
+                await self.loop.run_in_executor(None, executor.shutdown)
+        return self.written
+
+    async def Feed(self, outbox):
+        async for item in self.source.Items():
+            if self.stats is not None:
+                self.stats.Count('pipeline.items')
+            await outbox.put(item)
+        for n in range(self.concurrency['read']):
+            await outbox.put(_end)
+
+    async def Stage(self, stage, function, inbox, outbox, ends):
+        async def Task():
+            while True:
+                x = await inbox.get()
+                if x is _end:
+                    return
+                if self.stats is not None:
+                    t = self.stats.Clock()
+                output = await function(x)
+                if self.stats is not None:
+                    self.stats.Lap('pipeline.' + stage, t)
+                for y in output:
+                    await outbox.put(y)
+        await asyncio.gather(*[Task() for n in range(self.concurrency[stage])])
+        for n in range(ends):
+            await outbox.put(_end)
+
+    # Stages: each takes one item and returns a list of items for the next stage
+    async def Read(self, item):
+        if item.path is not None:
+            try:
+                item.text = await self.loop.run_in_executor(None, ReadFile, item.path)
+            except (OSError, UnicodeDecodeError) as e:
+                item.error = type(e).__name__ + ': ' + str(e)
+        return [item]
+
+    async def Parse(self, item):
+        if item.error is not None:
+            cases = [Case(item, error=item.error)]
+        elif item.record is not None:
+            cases = [Case(item, item.record)]
+        else:
+            cases = [Case(item, x, error) for x, error in ParseText(item.text)]
+        item.remaining = len(cases)
+        if cases == []:
+            await self.Ack(item)
+        return cases
+
+    async def Tag(self, case):
+        if case.error is None and self.namedict is not None:
+            try:
+                case.judges = await self.loop.run_in_executor(self.pool, TagEntries, case.record.get('entries', {}))
+            except Exception as e:
+                case.error = type(e).__name__ + ': ' + str(e)
+        return [case]
+
+    async def Classify(self, case):
+        if case.error is None:
+            try:
+                case.outcome = await self.loop.run_in_executor(self.pool, ClassifyEntries, case.record.get('entries', {}),
+                                                               case.record.get('habeas', self.habeas))
+            except Exception as e:
+                case.error = type(e).__name__ + ': ' + str(e)
+        return [case]
+
+    async def Write(self, case):
+        record = case.record if isinstance(case.record, dict) else {}
+        row = {self.id_key: record.get(self.id_key)}
+        if case.error is None:
+            row.update(case.outcome)
+            row['judges'] = case.judges
+        else:
+            row['error'] = case.error
+            if case.item.path is not None:
+                row['file'] = case.item.path
+        await self.sink.Write(row)
+        self.written += 1
+        if self.stats is not None:
+            self.stats.Count('pipeline.cases')
+            if case.error is not None:
+                self.stats.Count('pipeline.errors')
+        case.item.remaining -= 1
+        if case.item.remaining == 0:
+            await self.Ack(case.item)
+        return []
+
+    async def Ack(self, item):
+        # Every case of item is written: make sure the sink has them before
+        # the source forgets the item
+        if item.ack is None:
+            return
+        if hasattr(self.sink, 'Flush'):
+            await self.sink.Flush()
+        item.ack()
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Code the outcomes (and judges) of cases in a spool directory.')
+    parser.add_argument('directory', help='spool directory of JSON or JSONL files')
+    parser.add_argument('outfile', help='output file (JSONL)')
+    parser.add_argument('--poll', type=float, default=None, help='seconds between looks for new files (default: run once)')
+    parser.add_argument('--done', default=None, help='directory to move finished files to')
+    parser.add_argument('--judges', default=None, help='directory with judges.json (see judges.LoadData), to tag judges')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes (default: all CPUs)')
+    parser.add_argument('--queue-size', type=int, default=100)
+    parser.add_argument('--id-key', default='case_id', help='key holding the case ID')
+    parser.add_argument('--habeas', action='store_true', help='treat all cases as habeas cases')
+    args = parser.parse_args(args)
+
+    namedict = None
+    if args.judges is not None:
+        from judges.LoadData import LoadData
+        namedict = LoadData(args.judges)
+    pipeline = DocketPipeline(DirectorySource(args.directory, poll=args.poll, done=args.done), JSONLSink(args.outfile),
+                              namedict=namedict, workers=args.workers, queue_size=args.queue_size,
+                              id_key=args.id_key, habeas=args.habeas)
+
+    async def Run():
+        import signal
+        loop = asyncio.get_running_loop()
+        for s in [signal.SIGINT, signal.SIGTERM]:
+            try:
+                loop.add_signal_handler(s, pipeline.Stop)
+            except (NotImplementedError, RuntimeError): # e.g., Windows
+                pass
+        return await pipeline.Run()
+    print('Wrote ' + str(asyncio.run(Run())) + ' rows')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Ryan Hübert
+# Department of Political Science
+# University of California, Davis
+
+"""
+dispositions.EntryCache v1.2
+A persistent cache (an SQLite file) of the processed text of docket entries,
+so Classify only processes the entries of a case it has not seen before:
+    cache = EntryCache('entries.sqlite')
+    Classify(entries, cache=cache)
+    ...
+    cache.close()
+Re-classifying a docket that has grown then only costs the new entries.
+
+Records are keyed by a hash of the entry text and of the dictionary files
+(see CivilDictionaryClassifier.EntryKey), so editing the dictionaries never
+returns stale results. New records, and the records that were used, are kept
+in memory and saved in one short transaction every commit_every records (and
+by commit() and close()), so several processes can share a cache without
+waiting on each other's writes. When the file holds more than max_entries
+records after a commit, the least recently used are removed. "Recently used"
+is only as precise as the commits: records used between two commits (in any
+process) count as used at the same time.
+
+New in v1.1: reads no longer start a transaction, and writes are buffered
+until commit; the number of records and the clock are read from the file
+at each commit, so they are shared by every process using it.
+New in v1.2: the number of records is kept in the meta table (updated by
+each commit with the records it added and removed), so commits do not count
+the records.
+"""
+
+import json
+import sqlite3
+
+CACHE_VERSION = 1
+
+schema = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT, used INTEGER);
+CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+"""
+
+class EntryCache(object):
+    """
+    Maps keys (str) to JSON-serializable values, stored in an SQLite file.
+    :param path: file name (created if it does not exist)
+    :param max_entries: most records kept; the least recently used are removed
+    :param commit_every: number of new (or used) records between commits
+    """
+    def __init__(self, path, max_entries=1000000, commit_every=1000):
+        self.path = path
+        self.max_entries = max_entries
+        self.commit_every = commit_every
+        # Autocommit mode: transactions are only opened by commit()
+        self.connection = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(schema)
+        self.connection.execute("INSERT OR IGNORE INTO meta VALUES ('version', ?)", (str(CACHE_VERSION),))
+        version = self.connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if version[0] != str(CACHE_VERSION):
+            raise Exception(path + ' was written by another version of EntryCache')
+        # Files written by v1.1 have no count yet
+        self.connection.execute("INSERT OR IGNORE INTO meta VALUES ('count', (SELECT COUNT(*) FROM entries))")
+        self.count = self.Count()
+        self.pending = {} # key -> JSON of new records, not saved yet
+        self.used = set() # keys of saved records used since the last commit
+
+    # Pickle the path and settings (e.g., for BulkClassifier's worker processes)
+    def __getstate__(self):
+        return {'path': self.path, 'max_entries': self.max_entries, 'commit_every': self.commit_every}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['max_entries'], state['commit_every'])
+
+    def __len__(self):
+        """
+        Number of records in the file (as of the last commit of any process)
+        """
+        return self.Count()
+
+    def Count(self, change=0):
+        """
+        Adds change to the number of records in the meta table (inside a
+        commit's transaction) and returns the number
+        """
+        if change != 0:
+            self.connection.execute("UPDATE meta SET value = CAST(value AS INTEGER) + ? WHERE key = 'count'",
+                                    (change,))
+        return int(self.connection.execute("SELECT value FROM meta WHERE key = 'count'").fetchone()[0])
+
+    def Get(self, keys):
+        """
+        Looks up keys, and marks the records found as recently used
+        :return: dict of key -> value for the keys in the cache
+        """
+        keys = list(set(keys))
+        found = {k: json.loads(self.pending[k]) for k in keys if k in self.pending}
+        keys = [k for k in keys if k not in found]
+        # SQLite limits the number of parameters of a query
+        for n in range(0, len(keys), 500):
+            batch = keys[n:n+500]
+            rows = self.connection.execute('SELECT key, value FROM entries WHERE key IN (' +
+                                           ','.join(['?'] * len(batch)) + ')', batch).fetchall()
+            for k, v in rows:
+                found[k] = json.loads(v)
+                self.used.add(k)
+        if len(self.pending) + len(self.used) >= self.commit_every:
+            self.commit()
+        return found
+
+    def Put(self, items):
+        """
+        Saves records (at the next commit)
+        :param items: dict of key -> value
+        """
+        for k in items:
+            if k not in self.pending:
+                self.pending[k] = json.dumps(items[k])
+        if len(self.pending) + len(self.used) >= self.commit_every:
+            self.commit()
+
+    def Evict(self):
+        """
+        Removes the least recently used records, leaving 90% of max_entries
+        (so eviction does not run on every new record)
+        """
+        keep = int(self.max_entries * 0.9)
+        removed = self.connection.execute('DELETE FROM entries WHERE key IN '
+                                          '(SELECT key FROM entries ORDER BY used LIMIT ?)',
+                                          (max(self.count - keep, 0),)).rowcount
+        self.count = self.Count(-removed)
+
+    def clear(self):
+        self.pending, self.used = {}, set()
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            self.connection.execute('DELETE FROM entries')
+            self.connection.execute("UPDATE meta SET value = '0' WHERE key = 'count'")
+            self.connection.execute('COMMIT')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.count = 0
+
+    def commit(self):
+        """
+        Saves the new records and marks the used ones, in one transaction
+        """
+        if self.pending == {} and self.used == set():
+            return
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            clock = self.connection.execute('SELECT COALESCE(MAX(used), 0) + 1 FROM entries').fetchone()[0]
+            # Records another process saved first are ignored (not counted)
+            added = self.connection.executemany('INSERT OR IGNORE INTO entries VALUES (?, ?, ?)',
+                                                [(k, v, clock) for k, v in self.pending.items()]).rowcount
+            self.connection.executemany('UPDATE entries SET used = ? WHERE key = ?',
+                                        [(clock, k) for k in self.used])
+            self.count = self.Count(added)
+            if self.count > self.max_entries:
+                self.Evict()
+            self.connection.execute('COMMIT')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.pending, self.used = {}, set()
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
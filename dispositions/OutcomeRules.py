@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Ryan Hübert
+# Department of Political Science
+# University of California, Davis
+
+"""
+dispositions.OutcomeRules v1.1
+The rules Classify (dispositions.CivilDictionaryClassifier) uses to code case
+outcomes, written as a table, and RuleEngine, which compiles a table once and
+applies it to a case.
+
+A table is a list of rules, applied in order. Each rule is a dict with:
+- 'scope': where its patterns are searched:
+    'raw': the text of the clauses, before stemming (' '.join of the clauses)
+    'text': text_merge (the stemmed clauses, e.g. "grant.motion-dismiss")
+    'clause': each stemmed clause in turn (e.g. "grant.motion")
+  Consecutive 'clause' rules are applied to the first clause, then the
+  second clause, and so on.
+- 'when': a condition:
+    'dismiss'                  the pattern is in the text (a substring)
+    ('all', c1, c2, ...)       all conditions are true
+    ('any', c1, c2, ...)       at least one condition is true
+    ('not', c)                 c is false
+    ('outcome', x, y, ...)     at least one of these outcomes is already coded
+    ('option', 'habeas', v)    the habeas option of Classify == v
+    ('regex', pattern)         re.search(pattern, text)
+- 'set': list of outcomes to code as True when the condition is true
+- 'emit' (optional): a label to add to motions_petitions when the condition is
+  true, followed by label + '/' + x for each occurrence of the patterns
+  in 'each' (in the order they occur in the text)
+
+RuleEngine turns each condition into a function once, then applies the
+table rule by rule. Use your own table with:
+    rules = RuleEngine(DefaultRules(stems) + my_rules)
+    Classify(entries, rules=rules)
+
+New in v1.1: RuleEngine applies the table with functions built from the
+conditions instead of generating code.
+"""
+
+import re
+
+def DefaultRules(settlement):
+    """
+    The rules used by Classify
+    :param settlement: list of stemmed settlement phrases (e.g., "consent_judg")
+    :return: list of rules (see module docstring)
+    """
+    if all(re.escape(x) == x for x in settlement):
+        settled = ('any',) + tuple(settlement)
+    else:
+        settled = ('regex', '(' + '|'.join(settlement) + ')')
+    settled2 = ('any', 'case_settl', 'settlement', 'settl', 'joint', 'consent', 'stipul')
+    habeas = ('any', ('option', 'habeas', True), 'habea')
+    not_habeas = ('all', ('option', 'habeas', False), ('not', 'habea'))
+    dismissal = ('all', ('not', settled), 'dismiss', not_habeas)
+    # In clauses, petitions are treated as motions
+    motion = ('any', 'motion', 'petit')
+    sumjud = ('all', 'summari.judgment', ('not', 'deni'))
+    sumjud_granted = ('all', sumjud, ('any', 'motion.summari.judgment', 'petit.summari.judgment'), 'grant')
+    judgment = ('any', ('outcome', 'jud'), ('outcome', 'sumjud'))
+    return [
+        ## Catch some useful stuff
+        {'scope': 'raw', 'when': 'forma pauperis', 'set': ['forma_pauperis']},
+        {'scope': 'raw', 'when': 'forum non conveniens', 'set': ['forum_non_conveniens']},
+
+        ## Find R&Rs
+        {'scope': 'text', 'when': ('all', 'r_r', 'adopt'), 'set': ['r&r']},
+
+        ## Case transfered elsewhere, not terminated
+        {'scope': 'text', 'when': 'transfer', 'set': ['transfer']},
+
+        ## Default judgment, favors plaintiff
+        {'scope': 'text', 'when': ('all', 'default.judgment', ('not', 'dismiss')), 'set': ['default']},
+
+        ## Review of agencies and state courts: affirm, reverse, remand
+        {'scope': 'text', 'when': 'remand', 'set': ['remand']},
+        {'scope': 'text', 'when': ('all', 'remand', settled2), 'set': ['settlement']},
+        {'scope': 'text', 'when': 'affirm', 'set': ['review', 'defendant']}, # Affirm = pro-defendant (eg, SSA)
+        {'scope': 'text', 'when': 'revers', 'set': ['review', 'plaintiff']},
+
+        ## Habeas Cases
+        {'scope': 'text', 'when': ('all', habeas, 'petit.deni', ('not', 'petit.grant')),
+         'set': ['dismiss']},
+        {'scope': 'text', 'when': ('all', habeas, 'petit.deni', ('not', 'petit.grant'), ('not', 'without_prejudic')),
+         'set': ['w_prej-involuntary']},
+        {'scope': 'text', 'when': ('all', habeas, 'petit.deni', ('not', 'petit.grant'), 'without_prejudic'),
+         'set': ['wo_prej']},
+        {'scope': 'text', 'when': ('all', habeas, 'petit.grant', ('not', 'petit.deni')), 'set': ['plaintiff']},
+        {'scope': 'text', 'when': ('all', habeas, ('any', 'deni', 'dismiss'), ('not', 'grant')),
+         'set': ['dismiss']},
+        {'scope': 'text', 'when': ('all', habeas, ('any', 'deni', 'dismiss'), ('not', 'grant'), ('not', 'without_prejudic')),
+         'set': ['w_prej-involuntary']},
+        {'scope': 'text', 'when': ('all', habeas, ('any', 'deni', 'dismiss'), ('not', 'grant'), 'without_prejudic'),
+         'set': ['wo_prej']},
+        {'scope': 'text', 'when': ('all', habeas, ('not', 'deni'), ('not', 'dismiss'), 'grant'), 'set': ['plaintiff']},
+
+        ## Settlements and dismissals
+        {'scope': 'text', 'when': settled, 'set': ['dismiss', 'settlement', 'w_prej-voluntary']},
+        {'scope': 'text', 'when': dismissal, 'set': ['dismiss']},
+        # Prejudice language in text (all allowed, e.g, dismissals of multiple claims)
+        {'scope': 'text', 'when': ('all', dismissal, 'without_prejudic'), 'set': ['wo_prej']},
+        {'scope': 'text', 'when': ('all', dismissal, 'with_prejudic', settled2),
+         'set': ['settlement', 'w_prej-voluntary']},
+        {'scope': 'text', 'when': ('all', dismissal, 'with_prejudic', ('not', settled2)),
+         'set': ['w_prej-involuntary']},
+        # No prejudice language at all
+        {'scope': 'text', 'when': ('all', dismissal, ('not', 'without_prejudic'), ('not', 'with_prejudic'),
+                                   'stipul', 'proposed_ord'),
+         'set': ['settlement', 'w_prej-voluntary']},
+        # This is our reversion classification -- when not clear what kind of dism
+        {'scope': 'text', 'when': ('all', dismissal, ('not', 'without_prejudic'), ('not', 'with_prejudic'),
+                                   ('not', ('all', 'stipul', 'proposed_ord'))),
+         'set': ['wo_prej_d']},
+
+        ## Wrong venue?
+        {'scope': 'text', 'when': 'lack.jurisdict', 'set': ['lack_jurisdiction']},
+        {'scope': 'text', 'when': 'lack.stand', 'set': ['lack_standing']},
+
+        ## Keep all clauses related to motions and petitions
+        {'scope': 'clause', 'when': ('all', motion, ('any', 'by_def', 'defend.motion', 'defend.petit')),
+         'set': [], 'emit': 'defendant/mot_pet', 'each': ['grant', 'deni']},
+        {'scope': 'clause', 'when': ('all', motion, ('any', 'by_pla', 'plaintiff.motion', 'plaintiff.petit'), 'grant'),
+         'set': [], 'emit': 'plaintiff/mot_pet', 'each': ['grant', 'deni']},
+
+        ## Identify summary judgments, other judgments (e.g., after trial)
+        {'scope': 'clause', 'when': sumjud, 'set': ['sumjud']},
+        {'scope': 'clause', 'when': ('all', sumjud_granted, ('any', 'by_def', 'defend')), 'set': ['defendant']},
+        {'scope': 'clause', 'when': ('all', sumjud_granted, ('any', 'by_pla', 'plaintiff')), 'set': ['plaintiff']},
+        # Only if nothing else is coded (r&r, lack_jurisdiction, lack_standing,
+        # forma_pauperis and forum_non_conveniens are allowed)
+        {'scope': 'clause', 'when': ('all', ('not', sumjud), 'judgment', ('not', 'default.judgment'),
+                                     ('not', ('outcome', 'transfer', 'default', 'remand', 'review', 'dismiss',
+                                              'settlement', 'w_prej-voluntary', 'w_prej-involuntary', 'wo_prej',
+                                              'wo_prej_d', 'sumjud', 'jud', 'defendant', 'plaintiff'))),
+         'set': ['jud']},
+
+        ## Code directions if a judgment is identified
+        ## This is overly inclusive -- will code D and P decisions liberally!
+        {'scope': 'text', 'when': ('all', judgment, ('any', 'favor.defend', 'against.plaintiff')), 'set': ['defendant']},
+        {'scope': 'text', 'when': ('all', judgment, ('any', 'favor.plaintiff', 'against.defend')), 'set': ['plaintiff']},
+        {'scope': 'text', 'when': ('all', judgment, 'award.platiff.damag'), 'set': ['plaintiff']},
+        {'scope': 'text', 'when': ('all', judgment, 'plaintiff.entitl.judgment'), 'set': ['plaintiff']},
+        {'scope': 'text', 'when': ('all', judgment, 'defend.entitl.judgment'), 'set': ['defendant']},
+    ]
+
+def Patterns(condition):
+    """
+    Lists the plain patterns in a condition
+    """
+    if isinstance(condition, str):
+        return [condition]
+    elif condition[0] in ['all', 'any', 'not']:
+        return [x for c in condition[1:] for x in Patterns(c)]
+    elif condition[0] in ['outcome', 'option', 'regex']:
+        return []
+    raise Exception('Unknown condition: ' + repr(condition))
+
+def Condition(condition):
+    """
+    Turns a condition into a function of t (the text), o (the outcomes coded
+    so far) and opt (the options of Classify) that returns True or False;
+    'all' and 'any' stop at the first condition that decides them (conditions
+    have no side effects, so the order they are checked in does not matter)
+    """
+    if isinstance(condition, str):
+        return lambda t, o, opt: condition in t
+    op, args = condition[0], condition[1:]
+    if op in ['all', 'any']:
+        # Plain patterns (and negated ones) are checked first, without a call
+        present = [x for x in args if isinstance(x, str)]
+        absent = [x[1] for x in args if not isinstance(x, str) and len(x) == 2 and x[0] == 'not' and isinstance(x[1], str)]
+        functions = [Condition(x) for x in args if not isinstance(x, str) and not
+                     (len(x) == 2 and x[0] == 'not' and isinstance(x[1], str))]
+        if op == 'all':
+            def All(t, o, opt):
+                for x in present:
+                    if x not in t:
+                        return False
+                for x in absent:
+                    if x in t:
+                        return False
+                for f in functions:
+                    if not f(t, o, opt):
+                        return False
+                return True
+            return All
+        def Any(t, o, opt):
+            for x in present:
+                if x in t:
+                    return True
+            for x in absent:
+                if x not in t:
+                    return True
+            for f in functions:
+                if f(t, o, opt):
+                    return True
+            return False
+        return Any
+    elif op == 'not':
+        if len(args) != 1:
+            raise Exception('"not" takes one condition: ' + repr(condition))
+        f = Condition(args[0])
+        return lambda t, o, opt: not f(t, o, opt)
+    elif op == 'outcome':
+        return lambda t, o, opt: any(o.get(x) for x in args)
+    elif op == 'option':
+        name, value = args
+        return lambda t, o, opt: opt.get(name) == value
+    elif op == 'regex':
+        regex = re.compile(args[0])
+        return lambda t, o, opt: regex.search(t) is not None
+    raise Exception('Unknown condition: ' + repr(condition))
+
+class RuleEngine(object):
+    """
+    Applies a rule table (see module docstring) for Classify. Each condition
+    is turned into a function once (see Condition), and the rules are applied
+    in order, block by block.
+    """
+    def __init__(self, rules):
+        self.rules = list(rules)
+        scopes = ['raw', 'text', 'clause']
+        for rule in self.rules:
+            if rule.get('scope') not in scopes:
+                raise Exception('Unknown scope: ' + repr(rule.get('scope')))
+
+        # Blocks of consecutive rules with the same scope (clause rules are
+        # applied clause by clause); each rule is (condition, outcomes to
+        # set, label to emit, regex of its 'each')
+        self.blocks = []
+        for rule in self.rules:
+            each = [re.escape(x) for x in rule.get('each', []) if x != ''] if rule.get('emit') is not None else []
+            compiled = (Condition(rule['when']), list(rule['set']), rule.get('emit'),
+                        re.compile('|'.join(each)) if each != [] else None)
+            if self.blocks != [] and self.blocks[-1][0] == rule['scope']:
+                self.blocks[-1][1].append(compiled)
+            else:
+                self.blocks.append((rule['scope'], [compiled]))
+
+    # Pickle the table (e.g., for BulkClassifier's worker processes)
+    def __getstate__(self):
+        return {'rules': self.rules}
+
+    def __setstate__(self, state):
+        self.__init__(state['rules'])
+
+    def Apply(self, raw, text_merge, outcome, habeas=False):
+        """
+        Codes the outcomes of a case (in place)
+        :param raw: str, the clauses before stemming joined by " "
+        :param text_merge: str, the stemmed clauses (see Classify)
+        :param outcome: dict of outcomes (all False)
+        :param habeas: habeas option of Classify
+        :return: list of str, the motions and petitions found by 'emit' rules
+        """
+        clauses = text_merge.split('-') if text_merge != '' else []
+        options = {'habeas': habeas}
+        mss = []
+        for scope, block in self.blocks:
+            for t in (clauses if scope == 'clause' else [raw if scope == 'raw' else text_merge]):
+                for when, outcomes, emit, each in block:
+                    if not when(t, outcome, options):
+                        continue
+                    for x in outcomes:
+                        outcome[x] = True
+                    if emit is not None:
+                        mss.append(emit)
+                        if each is not None:
+                            mss.extend([emit + '/' + x for x in each.findall(t)])
+        return mss
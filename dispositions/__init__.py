@@ -9,7 +9,18 @@
 
 import os
 import sys
+import importlib
 current_path = os.path.dirname(os.path.abspath( __file__ ))
 sys.path.append(current_path)
 
-from dispositions import CivilDictionaryClassifier
\ No newline at end of file
+# Submodules are imported the first time they are used
+# (e.g., dispositions.CivilDictionaryClassifier), which keeps
+# "import dispositions" fast.
+__all__ = ['CivilDictionaryClassifier', 'OutcomeRules', 'EntryCache', 'CorpusClassifier', 'BulkClassifier', 'DocketPipeline']
+
+def __getattr__(name):
+    if name in __all__:
+        module = importlib.import_module('dispositions.' + name)
+        globals()[name] = module
+        return module
+    raise AttributeError("module " + __name__ + " has no attribute " + name)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Ryan Hübert
+# Department of Political Science
+# University of California, Davis
+
+"""
+judges.CourtNames v1.2
+Tools to convert court names in the FJC's database of federal judges into
+abbreviations. Used by ReshapeData (in judges.LoadData) and QueryTools.
+
+- AbbreviateCourt: converts a court name (e.g., "U.S. District Court for the
+  Northern District of California") into the abbreviations used by
+  ReshapeData (e.g., "cand"), or (table=True) into its abbreviation in
+  data/courts.csv, as used by QueryTools.SittingJudges
+- CourtAbbreviations: the abbreviations in data/courts.csv, used by QueryTools
+
+Court names are looked up with compiled regexes, and each distinct court name
+is only resolved once per process.
+
+New in v1.1: SetDataPath, to read courts.csv and states.txt from another
+directory (e.g., the synthetic data of the benchmarks)
+New in v1.2: AbbreviateCourt(name, True) looks names up in courts.csv
+"""
+
+import os
+import re
+import csv
+from functools import lru_cache
+
+current_path = os.path.dirname(os.path.realpath(__file__))
+data_path = current_path + '/data' # where courts.csv and states.txt are read from
+
+cmap = {'first': 1, 'second': 2, 'third': 3, 'fourth': 4, 'fifth': 5,
+        'sixth': 6, 'seventh': 7, 'eighth': 8, 'ninth': 9, 'tenth': 10,
+        'eleventh': 11, 'federal': 'f', 'district of columbia': 'dc'}
+dmap = {'northern': 'nd', 'eastern': 'ed', 'central': 'cd',
+        'middle': 'md', 'western': 'wd', 'southern': 'sd'}
+
+omap = {'Supreme Court of the United States'.lower(): 'ussc',
+        'Customs Court'.lower(): 'cit',
+        'Court of International Trade'.lower(): 'cit',
+        'Court of Customs and Patent Appeals'.lower(): 'cpa',
+        'Court of Claims'.lower(): 'cc'}
+
+class SubstringMatcher(object):
+    """
+    Finds which of a list of names appear anywhere in a string (same as
+    [x for x in names if x in string], including names that overlap) with a
+    single compiled regex.
+    """
+    def __init__(self, names):
+        self.names = list(names)
+        words = sorted(set([x for x in self.names if x != '']), key=len, reverse=True)
+        # At each position, the regex finds the longest name; any other name
+        # found at the same position is a prefix of it
+        self.regex = re.compile('(?=(' + '|'.join([re.escape(x) for x in words]) + '))') if words != [] else None
+        self.prefixes = {x: [y for y in words if x.startswith(y)] for x in words}
+
+    def Find(self, string):
+        found = set([''])
+        if self.regex is not None:
+            for m in self.regex.finditer(string):
+                found.update(self.prefixes[m.group(1)])
+        return [x for x in self.names if x in found]
+
+@lru_cache(maxsize=None)
+def CourtMaps():
+    """
+    Loads data/states.txt and compiles the matchers used by AbbreviateCourt
+    :return: dict
+    """
+    smap = [s.lower().split('\t') for s in open(data_path + '/states.txt').read().split('\n')]
+    smap = sorted(smap, key=lambda x: len(x[1]), reverse=True)
+    return {'smap': smap,
+            'states': SubstringMatcher([x[1] for x in smap]),
+            'districts': SubstringMatcher(list(dmap)),
+            'circuits': SubstringMatcher(list(cmap)),
+            'others': SubstringMatcher(list(omap))}
+
+@lru_cache(maxsize=None)
+def AbbreviateCourt(name, table=False):
+    """
+    Abbreviates a (lower case) court name from the FJC data, e.g.
+    "u.s. district court for the northern district of california" -> "cand"
+    Names that cannot be abbreviated return "other".
+    With table=True, name is a court name as written in the FJC data, and its
+    abbreviation in data/courts.csv is returned instead (e.g., "CAND"); names
+    missing from courts.csv raise a KeyError.
+    """
+    if table:
+        return CourtAbbreviations()[name]
+    maps = CourtMaps()
+    states = set(maps['states'].Find(name))
+    sta = [x[0] for x in maps['smap'] if x[1] in states]
+    dis = [dmap[x] for x in maps['districts'].Find(name)]
+    cir = [cmap[x] for x in maps['circuits'].Find(name)] if 'circuit' in name else []
+    oth = [omap[x] for x in maps['others'].Find(name)]
+
+    if oth != [] and all(x == [] for x in [sta, dis, cir]):
+        return oth[0]
+
+    elif sta == ['dc']:
+        return 'cadc' if cir != [] else 'dcd'
+
+    elif cir != [] and all(x == [] for x in [dis, oth, sta]):
+        return 'ca' + str(cir[0])
+
+    elif sta != [] and all(x == [] for x in [oth, cir, dis]):
+        return sta[0] + 'd'
+
+    elif sta != [] and dis != [] and all(x == [] for x in [oth, cir]):
+        return sta[0] + dis[0]
+
+    else:
+        return 'other'
+
+@lru_cache(maxsize=None)
+def CourtAbbreviations():
+    """
+    Returns a dict mapping full court names to abbreviations (data/courts.csv)
+    """
+    with open(data_path + "/courts.csv","r") as csvfile:
+        reader = csv.DictReader(csvfile.read().splitlines())
+        abbr = {"":""}
+        for row in reader:
+            abbr[row['full_name']] = row['abbr']
+    return abbr
+
+def SetDataPath(path=None):
+    """
+    Reads courts.csv and states.txt from path (default: the package's data
+    directory) from now on, and forgets the court names already resolved
+    """
+    global data_path
+    data_path = current_path + '/data' if path is None else path
+    for f in [CourtMaps, AbbreviateCourt, CourtAbbreviations]:
+        f.cache_clear()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Ryan Hübert
+# Department of Political Science
+# University of California, Davis
+
+"""
+judges.JudgeStore v1.0
+An optional SQLite copy of the FJC data (fjc_dict) and its reshaped version
+(output of ReshapeData), with indexes on last name, court and service dates.
+Many processes can open the same file and query it without loading the data
+into memory.
+
+- WriteStore: saves a store (UpdateData does this for you with store=True,
+  as directory/judges.sqlite)
+- JudgeStore: opens a store. Its SittingJudges, WhichCourt and LNSearch give
+  the same results as the functions in QueryTools, for example:
+      store = JudgeStore('judges.sqlite')
+      store.SittingJudges(begdate, enddate, 'CA9')
+      QueryTools.WhichCourt(date, None, fjc_id, index=store)
+  It can be passed to QueryTools.SittingJudges and WhichCourt with their
+  index option; LNSearch is only available as store.LNSearch.
+
+Tables:
+    fjc_judges (id, rank, first_name, middle_name, last_name, suffix, record)
+    fjc_service (judge_id, n, court_name, court_abbr, ..., start_date, end_date)
+    judges (id, rank, first_name, middle_name, last_name, suffix)
+    service (judge_id, service_number, court, judge_type, date_nomination, ...)
+fjc_* hold the FJC data (the fjc_dict from LoadData) with one row per court
+(n = 1 to 6), and judges/service hold the reshaped data. Dates are ISO
+strings (YYYY-MM-DD). Court abbreviations (courts.csv) are the ones in use
+when the store was written.
+"""
+
+import os
+import json
+import copy
+import sqlite3
+import pathlib
+import datetime
+
+from judges.CourtNames import CourtAbbreviations
+from judges.QueryTools import MakeDate, SpellDays, WhichCourt
+
+STORE_VERSION = 1
+
+schema = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE fjc_judges (id TEXT PRIMARY KEY, rank INTEGER, first_name TEXT, middle_name TEXT,
+    last_name TEXT, suffix TEXT, last_key TEXT, first_key TEXT, record TEXT);
+CREATE TABLE fjc_service (judge_id TEXT, n INTEGER, court_name TEXT, court_abbr TEXT, known INTEGER,
+    court_name_key TEXT, court_abbr_key TEXT,
+    nomination TEXT, confirmation TEXT, hearing TEXT, recess TEXT, commission TEXT, senior TEXT, termination TEXT,
+    start_date TEXT, end_date TEXT, messy INTEGER, PRIMARY KEY (judge_id, n));
+CREATE TABLE judges (id TEXT PRIMARY KEY, rank INTEGER, first_name TEXT, middle_name TEXT,
+    last_name TEXT, suffix TEXT, last_key TEXT, first_key TEXT);
+CREATE TABLE service (judge_id TEXT, service_number INTEGER, court TEXT, court_key TEXT, judge_type TEXT,
+    date_nomination TEXT, date_confirmation TEXT, date_commission TEXT, date_termination TEXT, extra TEXT,
+    PRIMARY KEY (judge_id, service_number));
+CREATE INDEX fjc_judges_last ON fjc_judges (last_key);
+CREATE INDEX fjc_service_court ON fjc_service (court_abbr, start_date, end_date);
+CREATE INDEX fjc_service_dates ON fjc_service (start_date, end_date);
+CREATE INDEX fjc_service_name_key ON fjc_service (court_name_key);
+CREATE INDEX fjc_service_abbr_key ON fjc_service (court_abbr_key);
+CREATE INDEX judges_last ON judges (last_key);
+CREATE INDEX service_court ON service (court_key);
+CREATE INDEX service_dates ON service (date_commission, date_termination);
+"""
+
+dates = ['date_nomination', 'date_confirmation', 'date_commission', 'date_termination']
+fjc_dates = ['Nomination Date', 'Confirmation Date', 'Hearing Date', 'Recess Appointment Date',
+             'Commission Date', 'Senior Status Date', 'Termination Date']
+
+def Key(string):
+    # Keys are normalized like LNIndex in QueryTools
+    return string.lower().strip() if string not in ['', None] else None
+
+def FJCRows(fjcdict):
+    """
+    Rows of the fjc_judges and fjc_service tables
+    """
+    abbr = CourtAbbreviations()
+    judges, service = [], []
+    for rank, k in enumerate(fjcdict):
+        row = fjcdict[k]
+        judges.append((k, rank, row.get('First Name', ''), row.get('Middle Name', ''), row.get('Last Name', ''),
+                       row.get('Suffix', ''), row['Last Name'].lower().strip(),
+                       row.get('First Name', '').lower().strip(), json.dumps(row)))
+        for n in range(1, 7):
+            name = row.get('Court Name (' + str(n) + ')', '')
+            raw = [row.get(x + ' (' + str(n) + ')', '') for x in fjc_dates]
+            if name == '' and all(x == '' for x in raw):
+                continue # no service (can't match any query)
+            rdate, cdate, sdate, tdate = [MakeDate(x) for x in raw[3:]]
+            messy = '' in [rdate, cdate, sdate, tdate]
+            service.append((k, n, name, abbr.get(name), int(name in abbr),
+                            Key(name), Key(abbr.get(name, '')), *raw,
+                            None if messy else min(cdate, rdate).isoformat(),
+                            None if messy else tdate.isoformat(), int(messy)))
+    return judges, service
+
+def ReshapedRows(reshaped_dict):
+    """
+    Rows of the judges and service tables
+    """
+    judges, service = [], []
+    for rank, k in enumerate(reshaped_dict):
+        row = reshaped_dict[k]
+        judges.append((k, rank, row['First Name'], row['Middle Name'], row['Last Name'], row['Suffix'],
+                       row['Last Name'].lower().strip(), row.get('First Name', '').lower().strip()))
+        for sn in row['Courts']:
+            c = row['Courts'][sn]
+            # Dates that are neither dates nor None (unparsed strings) are kept in extra
+            extra = {x: c[x] for x in dates if c[x] is not None and type(c[x]) is not datetime.date}
+            service.append((k, sn, c['court'], Key(c['court']), c['judge_type'],
+                            *[c[x].isoformat() if type(c[x]) is datetime.date else None for x in dates],
+                            json.dumps(extra) if extra != {} else None))
+    return judges, service
+
+def WriteStore(path, fjcdict, reshaped_dict=None, other_judges=False):
+    """
+    Saves fjcdict and its reshaped version (computed with ReshapeData if not
+    given) as a SQLite store at path. The file is replaced in one step, so
+    processes reading the old store are not disturbed.
+    """
+    if reshaped_dict is None:
+        from judges.LoadData import ReshapeData
+        reshaped_dict = ReshapeData(copy.deepcopy(fjcdict), other_judges)
+    tmp = path + '.' + str(os.getpid()) + '.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    con = sqlite3.connect(tmp)
+    try:
+        con.executescript(schema)
+        con.executemany('INSERT INTO meta VALUES (?,?)',
+                        [('version', str(STORE_VERSION)), ('other_judges', str(other_judges)),
+                         ('created', datetime.datetime.now().isoformat())])
+        judges, service = FJCRows(fjcdict)
+        con.executemany('INSERT INTO fjc_judges VALUES (' + ','.join(['?'] * 9) + ')', judges)
+        con.executemany('INSERT INTO fjc_service VALUES (' + ','.join(['?'] * 17) + ')', service)
+        judges, service = ReshapedRows(reshaped_dict)
+        con.executemany('INSERT INTO judges VALUES (' + ','.join(['?'] * 8) + ')', judges)
+        con.executemany('INSERT INTO service VALUES (' + ','.join(['?'] * 10) + ')', service)
+        con.commit()
+        con.execute('ANALYZE')
+        con.commit()
+    finally:
+        con.close()
+    os.replace(tmp, path)
+
+def Date(string):
+    return datetime.date.fromisoformat(string) if string is not None else None
+
+class JudgeStore(object):
+    """
+    A SQLite store written by WriteStore, opened read-only. It can be passed
+    to worker processes (each one reopens the file).
+    """
+    def __init__(self, path):
+        self.path = path
+        uri = pathlib.Path(os.path.abspath(path)).as_uri() + '?mode=ro'
+        self.connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        version = self.connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if version is None or version[0] != str(STORE_VERSION):
+            raise Exception(path + " was written by another version of JudgeStore. Run WriteStore again.")
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def close(self):
+        self.connection.close()
+
+    def SittingJudges(self, begdate, enddate=None, court_abbr=None):
+        """
+        Same as QueryTools.SittingJudges(fjc_dict, begdate, enddate, court_abbr)
+        """
+        court_abbr = court_abbr.upper() if court_abbr != None else None
+        if enddate == None:
+            enddate = begdate
+        unknown = None
+        if court_abbr != None:
+            unknown = self.connection.execute('SELECT j.rank, s.n, s.court_name FROM fjc_service s JOIN fjc_judges j '
+                                              'ON j.id = s.judge_id WHERE s.known = 0 '
+                                              'ORDER BY j.rank, s.n LIMIT 1').fetchone()
+        court = 'AND s.court_abbr = ? ' if court_abbr != None else ''
+        select = ('SELECT j.rank, s.n, s.judge_id, s.recess, s.commission, s.senior, s.termination '
+                  'FROM fjc_service s JOIN fjc_judges j ON j.id = s.judge_id ')
+        args = [court_abbr] if court_abbr != None else []
+        found = self.connection.execute(select + 'WHERE s.messy = 1 ' + court, args).fetchall()
+        found += self.connection.execute(select + 'WHERE s.start_date <= ? AND s.end_date >= ? ' + court,
+                                         [enddate.isoformat(), begdate.isoformat()] + args).fetchall()
+        # Report judges in the same order as SittingJudges
+        # (and fail the same way when a court name is unknown)
+        alljudges = {'active': [], 'senior': []}
+        for r, n, k, rdate, cdate, sdate, tdate in sorted(found):
+            if unknown is not None and unknown[:2] < (r, n):
+                raise KeyError(unknown[2])
+            SpellDays(alljudges, k, n, MakeDate(rdate), MakeDate(cdate), MakeDate(sdate), MakeDate(tdate),
+                      begdate, enddate)
+        if unknown is not None:
+            raise KeyError(unknown[2])
+        return(alljudges)
+
+    def Courts(self, fjc_id):
+        """
+        A judge's "Courts" in the reshaped data (see ReshapeData)
+        """
+        courts = {}
+        for row in self.connection.execute('SELECT service_number, court, judge_type, ' + ', '.join(dates) +
+                                           ', extra FROM service WHERE judge_id = ? ORDER BY service_number',
+                                           [fjc_id]):
+            courts[row[0]] = {'judge_type': row[2], 'service_number': row[0], 'court': row[1]}
+            courts[row[0]].update({x: Date(row[3 + i]) for i, x in enumerate(dates)})
+            courts[row[0]].update(json.loads(row[7]) if row[7] is not None else {})
+        return courts
+
+    def Judge(self, fjc_id, reshaped=False):
+        """
+        A judge's record in the FJC data (or the reshaped data if reshaped)
+        """
+        if not reshaped:
+            row = self.connection.execute('SELECT record FROM fjc_judges WHERE id = ?', [fjc_id]).fetchone()
+            if row is None:
+                raise KeyError(fjc_id)
+            return json.loads(row[0])
+        row = self.connection.execute('SELECT first_name, suffix, middle_name, last_name FROM judges '
+                                      'WHERE id = ?', [fjc_id]).fetchone()
+        if row is None:
+            raise KeyError(fjc_id)
+        return {'First Name': row[0], 'Suffix': row[1], 'Middle Name': row[2], 'Last Name': row[3],
+                'Courts': self.Courts(fjc_id)}
+
+    def WhichCourt(self, date, fjc_id, use_closest=False):
+        """
+        Same as QueryTools.WhichCourt(date, reshaped_dict, fjc_id, use_closest)
+        """
+        if self.connection.execute('SELECT 1 FROM judges WHERE id = ?', [fjc_id]).fetchone() is None:
+            raise KeyError(fjc_id)
+        return WhichCourt(date, {fjc_id: {'Courts': self.Courts(fjc_id)}}, fjc_id, use_closest)
+
+    def LNSearch(self, string, ids_only=False, first_name=None, court=None, reshaped=False):
+        """
+        Same as QueryTools.LNSearch(string, dictionary, ids_only, first_name, court)
+        where dictionary is the FJC data (or the reshaped data if reshaped)
+        """
+        if reshaped:
+            sql = 'SELECT id FROM judges j WHERE last_key = ? '
+            courts = 'EXISTS (SELECT 1 FROM service s WHERE s.judge_id = j.id AND s.court_key = ?) '
+        else:
+            sql = 'SELECT id FROM fjc_judges j WHERE last_key = ? '
+            courts = ('(EXISTS (SELECT 1 FROM fjc_service s WHERE s.judge_id = j.id AND s.court_name_key = ?) '
+                      'OR EXISTS (SELECT 1 FROM fjc_service s WHERE s.judge_id = j.id AND s.court_abbr_key = ?)) ')
+        args = [string.lower().strip()]
+        if first_name is not None:
+            sql += 'AND first_key = ? '
+            args.append(first_name.lower().strip())
+        if court is not None:
+            sql += 'AND ' + courts
+            args += [court.lower().strip()] * (1 if reshaped else 2)
+        found = [x[0] for x in self.connection.execute(sql + 'ORDER BY rank', args)]
+        if ids_only:
+            return sorted(list(set(found)))
+        else:
+            return {x: self.Judge(x, reshaped) for x in found}
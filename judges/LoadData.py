@@ -6,73 +6,319 @@
 # University of California, Davis
 
 """
-judges.LoadData v2.0
+judges.LoadData v2.6
 This script takes the Federal Judicial Center's Biographical Directory of
 Article III Federal Judges and generates a json file formatted for easy
 import/use in other federal courts-related research applications.
 
 New in v2.0: function to reshape (and shrink) data for use in other applications
+New in v2.1: binary snapshot (judges.snapshot) of the json file and its
+reshaped version, for fast loading
+New in v2.2: UpdateData only reshapes judges whose records changed (see
+ReshapeIncremental)
+New in v2.3: UpdateData streams the download and skips it if the data has not
+changed since the last download
+New in v2.4: court names are abbreviated with judges.CourtNames
+New in v2.5: UpdateData can also save the data in a SQLite store
+(judges.sqlite; see judges.JudgeStore)
+New in v2.6: LoadData only writes a snapshot if asked to (save_snapshot=True;
+UpdateData always does), and a snapshot's hash is checked before it is
+unpickled
 """
 
 # Import Modules
 import os, csv, json, re
-from urllib.request import urlopen
+import io
+import copy
+import shutil
+import pickle
+import hashlib
 import datetime
 
-def UpdateData(directory=os.getcwd(), fjclink = 'https://www.fjc.gov/sites/default/files/history/judges.csv'):
+from judges.CourtNames import AbbreviateCourt
+
+# Snapshots
+## A snapshot is a pickle of the FJC data and reshaped data, saved next to
+## judges.json, after a JSON header line with the snapshot's version, the
+## size, modification time and hash of the judges.json it was made from,
+## and the hash of the pickle. It is only unpickled if it was made from the
+## current judges.json (checked with the file's size and modification time,
+## or else its hash) and the pickle's hash matches.
+## NB: pickles can run arbitrary code when loaded, and the hash only catches
+## damaged or mismatched files. Only load data from directories you trust.
+SNAPSHOT_VERSION = 3
+
+def SourceHash(path):
+    """
+    sha256 of a file
+    """
+    h = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        for block in iter(lambda: fp.read(2**20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def RecordHash(row):
+    """
+    Content hash of one judge's record in the FJC data
+    """
+    return hashlib.sha1(json.dumps(row, sort_keys=True).encode('utf-8')).hexdigest()
+
+def WriteSnapshot(directory, fjcdict, reshaped=None, changes=None):
+    """
+    Saves fjcdict (and a dict of reshaped versions, keyed by the other_judges
+    option of ReshapeData) as a snapshot of directory/judges.json.
+    changes records the judges added/changed/removed by the last UpdateData.
+    """
+    stat = os.stat(directory + 'judges.json')
+    snapshot = {'fjcdict': fjcdict,
+                'record_hashes': {k: RecordHash(fjcdict[k]) for k in fjcdict},
+                'reshaped': {} if reshaped is None else reshaped,
+                'changes': changes}
+    payload = pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+    header = {'version': SNAPSHOT_VERSION,
+              'source_hash': SourceHash(directory + 'judges.json'),
+              'source_size': stat.st_size,
+              'source_mtime': stat.st_mtime_ns,
+              'payload_hash': hashlib.sha256(payload).hexdigest()}
+    # Write then rename, so other processes never see a partial snapshot
+    tmp = directory + 'judges.snapshot.' + str(os.getpid()) + '.tmp'
+    with open(tmp, 'wb') as fp:
+        fp.write(json.dumps(header).encode('utf-8') + b'\n')
+        fp.write(payload)
+    os.replace(tmp, directory + 'judges.snapshot')
+    return snapshot
+
+def ReadSnapshot(directory):
+    """
+    Loads the snapshot of directory/judges.json, or returns None if there is
+    no snapshot, it was made from a different version of judges.json, or
+    its hash does not match
+    """
+    if not os.path.exists(directory + 'judges.snapshot') or not os.path.exists(directory + 'judges.json'):
+        return None
+    try:
+        with open(directory + 'judges.snapshot', 'rb') as fp:
+            header = json.loads(fp.readline().decode('utf-8'))
+            if type(header) is not dict or header.get('version') != SNAPSHOT_VERSION:
+                return None
+            stat = os.stat(directory + 'judges.json')
+            if ((stat.st_size, stat.st_mtime_ns) != (header['source_size'], header['source_mtime']) and
+                    SourceHash(directory + 'judges.json') != header['source_hash']):
+                return None
+            payload = fp.read()
+        # Only unpickle what WriteSnapshot wrote
+        if hashlib.sha256(payload).hexdigest() != header['payload_hash']:
+            return None
+        snapshot = pickle.loads(payload)
+    except Exception:
+        return None
+    return snapshot if type(snapshot) is dict else None
+
+def DiffData(fjcdict, record_hashes):
+    """
+    Compares fjcdict with the record hashes of a previous version of the data
+    :return: dict with lists of IDs 'added', 'changed' and 'removed'
+    """
+    diff = {'added': [], 'changed': [], 'removed': [k for k in record_hashes if k not in fjcdict]}
+    for k in fjcdict:
+        if k not in record_hashes:
+            diff['added'].append(k)
+        elif RecordHash(fjcdict[k]) != record_hashes[k]:
+            diff['changed'].append(k)
+    return diff
+
+def ReshapeIncremental(fjcdict, snapshot, other_judges=False):
+    """
+    Same as ReshapeData(fjcdict, other_judges), but only reshapes the judges
+    that were added or changed since snapshot (from ReadSnapshot) was made,
+    reusing its reshaped data for everyone else.
+    :return: tuple - (reshaped dict, dict of IDs from DiffData)
+    """
+    diff = DiffData(fjcdict, snapshot['record_hashes'])
+    if other_judges not in snapshot['reshaped']:
+        return ReshapeData(copy.deepcopy(fjcdict), other_judges), diff
+    previous = snapshot['reshaped'][other_judges]
+    todo = set(diff['added'] + diff['changed'])
+    # NB: ReshapeData modifies its input, so give it copies
+    new = ReshapeData(copy.deepcopy({k: fjcdict[k] for k in fjcdict if k in todo}))
+    reshaped = {k: new[k] if k in todo else previous[k] for k in fjcdict}
+    if other_judges:
+        # Magistrates come from data/magistrate-list.csv, which does not change
+        for k in MagistrateIDs():
+            reshaped[k] = previous[k]
+    return reshaped, diff
+
+def MagistrateIDs():
+    """
+    IDs of the judges added by ReshapeData(other_judges=True), in order
+    """
+    with open(os.path.dirname(os.path.realpath(__file__))+'/data/magistrate-list.csv', 'r') as mf:
+        return [k['\ufeffusdc_id'] for k in csv.DictReader(mf) if k['\ufeffusdc_id'] != ""]
+
+def UpdateData(directory=os.getcwd(), fjclink = 'https://www.fjc.gov/sites/default/files/history/judges.csv',
+               snapshot=True, conditional=True, store=None):
+    """
+    Downloads the FJC's biographical data (csv) and saves it as
+    directory/judges.json. The previous judges.json is kept with its
+    modification time added to the file name.
+    :param snapshot: bool - if True, also save a snapshot (see WriteSnapshot)
+    :param conditional: bool - if True, ask the server to only send the file
+        if it changed since the last download (using the ETag/Last-Modified
+        headers saved in judges.fetch.json); if not, nothing is rewritten
+    :param store: bool - if True, also save a SQLite store (directory/judges.sqlite,
+        see judges.JudgeStore); if None, only update the store if it exists
+    :return: dict (fjc_dict)
+    """
+    from urllib.request import urlopen, Request # only needed here; slow to import
+    from urllib.error import HTTPError
+
     # Download most recent judicial biography
     print('Downloading updated data from: ' + fjclink)
     if not re.search('/ *$',directory):
         directory = directory.strip() + '/'
+
+    # Headers from the last download
+    fetched = {}
+    if conditional and os.path.exists(directory + 'judges.fetch.json') and os.path.exists(directory + 'judges.json'):
+        with open(directory + 'judges.fetch.json', 'r') as fp:
+            fetched = json.load(fp)
+        fetched = fetched if fetched.get('url') == fjclink else {}
+    headers = {}
+    if fetched.get('etag'):
+        headers['If-None-Match'] = fetched['etag']
+    if fetched.get('last_modified'):
+        headers['If-Modified-Since'] = fetched['last_modified']
+
     try:
-        urlopen(fjclink)
+        webpage = urlopen(Request(fjclink, headers=headers))
+    except HTTPError as e:
+        if e.code == 304:
+            print('FJC biographical data has not changed since the last download.')
+            fjcdict = LoadData(directory, snapshot=snapshot, save_snapshot=snapshot)
+            SaveStore(directory, fjcdict, store, changed=False)
+            return(fjcdict)
+        print("FJC biographical data no longer stored at " + fjclink)
+        print("PLEASE ENTER A VALID LINK TO judges.csv FROM THE FOLLOWING DOMAIN: https://www.fjc.gov/.")
+        raise
     except:
         print("FJC biographical data no longer stored at " + fjclink)
         print("PLEASE ENTER A VALID LINK TO judges.csv FROM THE FOLLOWING DOMAIN: https://www.fjc.gov/.")
-    with urlopen(fjclink) as webpage:
-        reader2 = csv.DictReader(webpage.read().decode('utf-8').splitlines())
+        raise
+
+    # Parse the csv as it downloads
+    with webpage:
+        reader2 = csv.DictReader(io.TextIOWrapper(webpage, encoding='utf-8', newline=''))
         fjcdict = {}
         for row in reader2:
             fjcdict[row['nid']] = row
+        fetched = {'url': fjclink, 'etag': webpage.headers.get('ETag'),
+                   'last_modified': webpage.headers.get('Last-Modified')}
+        # http.client does not complain if the connection drops before
+        # Content-Length bytes arrive; nothing is written in that case
+        if webpage.length:
+            raise Exception('Download from ' + fjclink + ' was cut off (' + str(webpage.length) + ' bytes missing)')
+
+    # Previous version of the data (to only reshape judges that changed)
+    previous = ReadSnapshot(directory) if snapshot else None
+    if previous is not None:
+        changes = DiffData(fjcdict, previous['record_hashes'])
+        if all(changes[x] == [] for x in changes):
+            print('FJC biographical data has not changed since the last download.')
+            SaveFetchHeaders(directory, fetched)
+            SaveStore(directory, previous['fjcdict'], store, changed=False,
+                      reshaped_dict=previous['reshaped'].get(False))
+            return(previous['fjcdict'])
 
     # Save as JSON
+    ## Write to a temporary file, then keep the old version and swap in the
+    ## new one, so judges.json is never missing or half-written
+    tmp = directory + 'judges.json.' + str(os.getpid()) + '.tmp'
+    with open(tmp, 'w') as fp:
+        json.dump(fjcdict, fp, sort_keys=True, indent=4)
     if os.path.exists(directory + "judges.json"):
         modtime = re.sub('[^\d]','',str(datetime.datetime.fromtimestamp(os.stat(directory+"judges.json").st_mtime))[:-2])
-        os.rename(directory + "judges.json",directory + "judges" + modtime + ".json")
-    with open(directory + 'judges.json', 'w') as fp:
-        json.dump(fjcdict, fp, sort_keys=True, indent=4)
+        try:
+            os.link(directory + "judges.json",directory + "judges" + modtime + ".json")
+        except OSError: # e.g., file system without hard links
+            shutil.copy2(directory + "judges.json",directory + "judges" + modtime + ".json")
+    os.replace(tmp, directory + 'judges.json')
+    SaveFetchHeaders(directory, fetched)
+
+    # Save snapshot (with reshaped data) for fast loading
+    # The IDs of judges that changed are saved in the snapshot's 'changes'
+    reshaped = {}
+    if snapshot and previous is None:
+        reshaped = {False: ReshapeData(copy.deepcopy(fjcdict))}
+        WriteSnapshot(directory, fjcdict, reshaped)
+    elif snapshot:
+        reshaped = {}
+        for other_judges in sorted(set([False] + list(previous['reshaped']))):
+            reshaped[other_judges], changes = ReshapeIncremental(fjcdict, previous, other_judges)
+        print('Judges added: ' + str(len(changes['added'])) + ', changed: ' + str(len(changes['changed'])) +
+              ', removed: ' + str(len(changes['removed'])))
+        WriteSnapshot(directory, fjcdict, reshaped, changes)
+    SaveStore(directory, fjcdict, store, reshaped_dict=reshaped.get(False))
 
     return(fjcdict)
 
-def LoadData(directory=os.getcwd()):
+def SaveStore(directory, fjcdict, store, changed=True, reshaped_dict=None):
+    """
+    Saves directory/judges.sqlite (see judges.JudgeStore) if store is True,
+    or if store is None and the store already exists. If the data has not
+    changed, an existing store is left alone.
+    """
+    exists = os.path.exists(directory + 'judges.sqlite')
+    if store is False or (store is None and not exists) or (exists and not changed):
+        return
+    from judges.JudgeStore import WriteStore
+    WriteStore(directory + 'judges.sqlite', fjcdict, reshaped_dict)
+
+def SaveFetchHeaders(directory, fetched):
+    """
+    Saves the ETag/Last-Modified headers of the last download
+    """
+    with open(directory + 'judges.fetch.json.tmp', 'w') as fp:
+        json.dump(fetched, fp)
+    os.replace(directory + 'judges.fetch.json.tmp', directory + 'judges.fetch.json')
+
+def LoadData(directory=os.getcwd(), reshape=False, other_judges=False, snapshot=True, save_snapshot=False):
+    """
+    Loads directory/judges.json (generated by UpdateData).
+    :param reshape: bool - if True, return the output of ReshapeData instead
+    :param other_judges: bool - passed to ReshapeData
+    :param snapshot: bool - if True, load from the binary snapshot if it is
+        up to date (see ReadSnapshot)
+    :param save_snapshot: bool - if True, (re)write the snapshot if it is
+        missing, out of date or lacks the reshaped data asked for
+    :return: dict
+    """
     if not re.search('/ *$',directory):
         directory = directory.strip() + '/'
     if os.path.exists(directory + "judges.json"):
-        with open(directory + 'judges.json', 'r') as fp:
-            fjcdict = json.load(fp)
-        return(fjcdict)
+        snap = ReadSnapshot(directory) if snapshot else None
+        save = False
+        if snap is None:
+            with open(directory + 'judges.json', 'r') as fp:
+                fjcdict = json.load(fp)
+            snap = {'fjcdict': fjcdict, 'reshaped': {}}
+            save = True
+        if reshape and other_judges not in snap['reshaped']:
+            snap['reshaped'][other_judges] = ReshapeData(copy.deepcopy(snap['fjcdict']), other_judges)
+            save = True
+        if save_snapshot and save:
+            try:
+                WriteSnapshot(directory, snap['fjcdict'], snap['reshaped'])
+            except OSError: # e.g., read-only directory
+                pass
+        return(snap['reshaped'][other_judges] if reshape else snap['fjcdict'])
     elif input("Local data does not exist. Download new version? [y/n] ") == "y":
         fjcdict = UpdateData(directory)
-        return(fjcdict)
+        return(ReshapeData(fjcdict, other_judges) if reshape else fjcdict)
     else:
         raise Exception("No data loaded!")
 
 def ReshapeData(dictionary, other_judges=False):
-    smap = [s.lower().split('\t') for s in open(os.path.dirname(os.path.realpath(__file__)) + '/data/states.txt').read().split('\n')]
-    smap = sorted(smap, key=lambda x: len(x[1]), reverse=True)
-
-    cmap = {'first': 1, 'second': 2, 'third': 3, 'fourth': 4, 'fifth': 5,
-            'sixth': 6, 'seventh': 7, 'eighth': 8, 'ninth': 9, 'tenth': 10,
-            'eleventh': 11, 'federal': 'f', 'district of columbia': 'dc'}
-    dmap = {'northern': 'nd', 'eastern': 'ed', 'central': 'cd',
-            'middle': 'md', 'western': 'wd', 'southern': 'sd'}
-
-    omap = {'Supreme Court of the United States'.lower(): 'ussc',
-            'Customs Court'.lower(): 'cit',
-            'Court of International Trade'.lower(): 'cit',
-            'Court of Customs and Patent Appeals'.lower(): 'cpa',
-            'Court of Claims'.lower(): 'cc'}
-
     for k in dictionary:
         courts = []
 
@@ -107,28 +353,7 @@ def ReshapeData(dictionary, other_judges=False):
 
         # Abbreviate court names
         for c in courts:
-            sta = [x[0] for x in smap if x[1] in c[0]]
-            dis = [dmap[x] for x in dmap if x in c[0]]
-            cir = [cmap[x] for x in cmap if x in c[0] and 'circuit' in c[0]]
-            oth = [omap[x] for x in omap if x in c[0]]
-
-            if oth != [] and all(x == [] for x in [sta, dis, cir]):
-                c[0] = oth[0]
-
-            elif sta == ['dc']:
-                c[0] = 'cadc' if cir != [] else 'dcd'
-
-            elif cir != [] and all(x == [] for x in [dis, oth, sta]):
-                c[0] = 'ca' + str(cir[0])
-
-            elif sta != [] and all(x == [] for x in [oth, cir, dis]):
-                c[0] = sta[0] + 'd'
-
-            elif sta != [] and dis != [] and all(x == [] for x in [oth, cir]):
-                c[0] = sta[0] + dis[0]
-
-            else:
-                c[0] = 'other'
+            c[0] = AbbreviateCourt(c[0])
 
         dictionary[k]['Courts'] = courts
 
@@ -6,19 +6,235 @@
 # University of California, Davis
 
 """
-judges.NameFinder v3.2
+judges.NameFinder v3.8
 A function to identify names from a list of names appearing in unstructured text.
 Optimized for use with federal judicial biographical data.
+
+New in v3.3: NameIndex, a reusable inverted index of last names that avoids
+scanning every name in the namedict for every string.
+New in v3.4: NameVariants, a cache of the normalized name variants used to
+score each match.
+New in v3.5: FindMany, to run NameFinder over a whole corpus of strings using
+multiple processes.
+New in v3.6: optional instrumentation (stats=judges.Stats.Stats()) of
+NameFinder and FindMany.
+New in v3.7: span output (spans=True), giving the position of each match in
+the normalized text instead of a tagged string.
+New in v3.8: optional fuzzy matching (fuzzy=1 or 2) of misspelled last names,
+using a deletion index built by NameIndex(namedict, fuzzy=2).
 """
 
+import os
 import re
+import bisect
+from collections import deque
+from functools import lru_cache
+
+def NormalizeLastName(name):
+    """
+    Splits a last name from the namedict into upper case tokens, formatted the
+    same way as the tokens NameFinder extracts from unstructured text
+    """
+    return name.upper().strip().replace("."," ").replace('-',' ').replace('`',"'").split()
+
+def Deletes(word, distance):
+    """
+    Returns every string obtained by deleting up to distance characters
+    from word (including word itself)
+    """
+    found = {word}
+    level = {word}
+    for d in range(distance):
+        level = {w[:i] + w[i+1:] for w in level for i in range(len(w))}
+        found |= level
+    return found
+
+def EditDistance(a, b):
+    """
+    Number of insertions, deletions, substitutions and transpositions of
+    adjacent characters needed to turn a into b
+    """
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        previous, current, before = current, [i] + [0] * len(b), previous
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j-1] + 1, previous[j-1] + (a[i-1] != b[j-1]))
+            if i > 1 and j > 1 and a[i-1] == b[j-2] and a[i-2] == b[j-1]:
+                current[j] = min(current[j], before[j-2] + 1)
+    return current[-1]
+
+@lru_cache(maxsize=None)
+def NameVariants(first, middle, last, suffix):
+    """
+    Precomputes everything NameFinder needs to score a name from the namedict.
+    Results are cached on the name itself, so they stay valid if the namedict
+    is edited or reloaded.
+    Returns a dict with:
+        fn, mn, ln, fi, mi: normalized tokens and initials
+        dict_name: the full normalized name, as reported by NameFinder
+        tiers: list of (variant string, em) in the order NameFinder tests them
+        re_middle, re_typo: compiled regexes for the fallback searches (or None)
+    """
+    dict_name = [first.upper().strip(),middle.upper().strip(),last.upper().strip(),suffix.upper().strip()]
+    dict_name = [x.replace("."," ").replace('-',' ').replace('`',"'") for x in dict_name]
+    fn, mn, ln = dict_name[0].split(), dict_name[1].split(), dict_name[2].split()
+    dict_name = ' '.join([x for x in dict_name if x != ""])
+    fi = [[x[0] for x in fn][0]] if fn != [] else [] # only pulls initial from 1st First Name
+    mi = [[x[0] for x in mn][0]] if mn != [] else [] # only pulls initial from 1st Middle Name
+
+    # The sequence of rules, giving code "em" based on how good of a match it
+    # is. Lower "em" is better. NameFinder stops at the first variant found.
+    tiers = [(' '.join([""] + fn + mn + ln + [""]), 0),
+             (' '.join([""] + fn + mi + ln + [""]), 1),
+             (' '.join([""] + fi + mn + ln + [""]), 1)]
+    if fn != [] and len(fn[0]) > 1:
+        tiers.append((' '.join([""] + fn + ln + [""]), 2))
+    # Added this 2018-05-23 to catch judges who only go by their
+    # middle names. For example, Jerome Farris of the Ninth Circuit
+    if mn != [] and len(mn[0]) > 1:
+        tiers.append((' '.join([""] + mn + ln + [""]), 2))
+    tiers.append((' '.join([""] + fi + mi + ln + [""]), 3))
+    if fn != []:
+        tiers.append((' '.join([""] + fi + ln + [""]), 5))
+    if mn != []:
+        tiers.append((' '.join([""] + mi + ln + [""]), 6))
+
+    return {'fn': fn, 'mn': mn, 'ln': ln, 'fi': fi, 'mi': mi,
+            'dict_name': dict_name,
+            'ln_str': ' '.join(ln),
+            'fi_mi_ln': ' '.join([""] + fi + mi + ln + [""]),
+            'fi_ln': ' '.join([""] + fi + ln + [""]),
+            'tiers': tuple(tiers),
+            're_middle': re.compile(' '.join([""] + fn + [mi[0] + '[A-Z]+'] + ln + [""])) if mi != [] else None,
+            're_typo': re.compile(' '.join(fn + ['[A-Z]'] + ln)) if fn != [] else None}
+
+class NameIndex(object):
+    """
+    An inverted index from (normalized) last name tokens to the IDs in a
+    namedict. Build it once and pass it to NameFinder via the `index` option,
+    so that each call only looks at names whose last name appears in the string.
+    For example:
+        index = NameIndex(namedict)
+        for string in strings:
+            NameFinder(namedict, string, index=index)
+    With fuzzy=1 or 2, it also keeps a deletion index (every string obtained
+    by deleting up to fuzzy characters from each last name) so that NameFinder's
+    fuzzy option can look up the last names within that many typos of a token
+    without comparing it to every name.
+    """
+    def __init__(self, namedict,
+                 namekeys=("First Name","Middle Name","Last Name","Suffix"), fuzzy=0):
+        self.namedict = namedict
+        self.namekeys = tuple(namekeys)
+        self.fuzzy = fuzzy
+        self.lastnames = {} # ID -> list of last name tokens
+        self.rank = {} # ID -> position in namedict (to preserve ordering)
+        self.index = {} # final last name token -> list of IDs
+        self.variants = {} # ID -> (names, NameVariants), built lazily
+        self.Update()
+
+    def Update(self, ids=None):
+        """
+        Re-indexes the IDs in ids (default: all of them) after the namedict
+        has been changed. IDs no longer in the namedict are dropped.
+        """
+        if ids is None:
+            self.lastnames, self.rank, self.index, self.variants = {}, {}, {}, {}
+            self.deletes = {} # deleted string -> set of final last name tokens
+            self.nextrank = 0
+            ids = list(self.namedict)
+        for k in ids:
+            if k in self.lastnames:
+                self.index[self.lastnames[k][-1]].remove(k)
+                del self.lastnames[k]
+            self.variants.pop(k, None)
+            if k not in self.namedict:
+                self.rank.pop(k, None)
+                continue
+            if k not in self.rank:
+                self.rank[k] = self.nextrank
+                self.nextrank += 1
+            ln = NormalizeLastName(self.namedict[k][self.namekeys[2]])
+            if ln == []:
+                continue
+            self.lastnames[k] = ln
+            if self.fuzzy > 0 and ln[-1] not in self.index:
+                for x in Deletes(ln[-1], self.fuzzy):
+                    self.deletes.setdefault(x, set()).add(ln[-1])
+            # Multi-token last names are indexed under their final token
+            # (which is what NameFinder anchors on); the other tokens are
+            # checked when candidates are generated.
+            self.index.setdefault(ln[-1], []).append(k)
+
+    def __len__(self):
+        return len(self.namedict)
+
+    def Variants(self, k):
+        """
+        Returns the (cached) NameVariants for ID k. The cache is checked
+        against the names currently in the namedict, so edits are picked up.
+        """
+        names = tuple(self.namedict[k][x] for x in self.namekeys[:4])
+        if k not in self.variants or self.variants[k][0] != names:
+            self.variants[k] = (names, NameVariants(*names))
+        return self.variants[k][1]
+
+    def Candidates(self, tokens, subset=None):
+        """
+        Returns a list of (ID, last name tokens) for every name whose last name
+        tokens all appear in tokens, in the order NameFinder would visit them
+        """
+        tokset = set(tokens)
+        found = set()
+        for t in tokset:
+            for k in self.index.get(t, ()):
+                if all(x in tokset for x in self.lastnames[k]):
+                    found.add(k)
+        if subset is None:
+            found = sorted(found, key=lambda x: self.rank[x])
+        else:
+            found = [k for k in subset if k in found]
+        return [(k, self.lastnames[k]) for k in found]
+
+    def FuzzyCandidates(self, tokens, distance, subset=None):
+        """
+        Returns a list of (ID, last name tokens, token, edit distance) for every
+        name whose final last name token is within distance typos of one of
+        tokens (see EditDistance), in the order NameFinder would visit them.
+        Other tokens of multi-token last names must appear exactly. Tokens
+        that are themselves a last name are not corrected, and the distance
+        allowed shrinks for short tokens: none below 4 characters, 1 below 6.
+        """
+        if distance > self.fuzzy:
+            raise Exception("NameIndex was built with fuzzy=" + str(self.fuzzy) + "!")
+        tokset = set(tokens)
+        found = {} # ID -> list of (token, edit distance)
+        for t in tokset:
+            d = min(distance, (len(t) - 2) // 2)
+            if d < 1 or self.index.get(t):
+                continue
+            near = set()
+            for x in Deletes(t, d):
+                near.update(self.deletes.get(x, ()))
+            for s in near:
+                e = EditDistance(t, s)
+                if e > d:
+                    continue
+                for k in self.index.get(s, ()):
+                    if all(x in tokset for x in self.lastnames[k][:-1]):
+                        found.setdefault(k, []).append((t, e))
+        if subset is None:
+            ids = sorted(found, key=lambda x: self.rank[x])
+        else:
+            ids = [k for k in subset if k in found]
+        return [(k, self.lastnames[k], t, e) for k in ids for t, e in sorted(found[k])]
 
 def NameFinder(namedict, string, subset=None, matches = 'all',
                namekeys=("First Name","Middle Name","Last Name","Suffix"),
-               easy_output=False):
+               easy_output=False, index=None, stats=None, spans=False, fuzzy=0):
     """
     ===============
-    NameFinder v3.2
+    NameFinder v3.8
     ===============
     Since v1.0:
         - Bug fixes. For example, fixes problem parsing names written in ALL CAPS.
@@ -36,6 +252,18 @@ def NameFinder(namedict, string, subset=None, matches = 'all',
     Since v3.1:
         - Allow user to specify an inclusive "best" match that returns the best
           match regardless of how good it is.
+    Since v3.2:
+        - Optional NameIndex to speed up searching over large namedicts
+    Since v3.3:
+        - Name variants for each name in namedict are computed once and cached
+    Since v3.4:
+        - FindMany (batch API with a process pool)
+    Since v3.5:
+        - Optional instrumentation (stats)
+    Since v3.6:
+        - Optional span output (spans)
+    Since v3.7:
+        - Optional fuzzy matching of misspelled last names (fuzzy)
     ===============
     Options
         namedict:
@@ -60,12 +288,49 @@ def NameFinder(namedict, string, subset=None, matches = 'all',
         easy_output:
             only return a list of IDs matched (even if duplicates); supress
             all additional information and diagnostics
+        index:
+            [type NameIndex] A NameIndex built from namedict. When supplied,
+            only names whose last name appears in the string are considered.
+            Results are identical to searching without an index.
+        stats:
+            [type judges.Stats.Stats] If supplied, the time spent in each
+            stage (namefinder.clean, .candidates, .score, .regex, .filter,
+            .consistency, .tag) and counters (strings, candidates, windows,
+            regex_searches, regex_hits, matches) are added to it.
+        spans:
+            [type bool] If True, return a tuple of (spans, text) instead,
+            where text is the normalized string (tokens joined by spaces)
+            and spans is a list of (start, end, ID, em) tuples giving the
+            characters text[start:end] matched to each ID (see MatchSpans).
+            Names found in overlapping parts of the text are resolved in
+            favor of the longer one (so, unlike the tagged string, "Q LEE"
+            is not reported inside "AL Q LEE"). Ignores easy_output.
+        fuzzy:
+            [type int] If 1 or 2, also match names whose last name is
+            misspelled in the string by up to that many typos (e.g.,
+            "JOHN G ROBRTS"), using the deletion index of a NameIndex built
+            with at least this fuzzy setting (required). Such a match needs
+            the rest of the name, once the last name is corrected, to be one
+            of the name variants tested for em 0-6 or "JUDGE" + last name
+            (em 7); the regex fallbacks (a longer middle name, a wrong middle
+            initial) and the stragglers are not tried. It gets em 9 (one
+            typo) or em 10 (two typos), so it is only returned by
+            matches='all', 'best_inclusive', 9 or 10. Off (0) by default.
         NOTE:
             an exact match indicates on of the following patterns:
               First Middle Last, F. Middle Last, First M. Last, First Last
     """
 
-    subset = namedict.keys() if subset == None else subset
+    if index is not None and (index.namedict is not namedict or index.namekeys != tuple(namekeys)):
+        raise Exception("NameIndex was not built from this namedict/namekeys!")
+    if fuzzy and index is None:
+        raise Exception("Fuzzy matching requires a NameIndex built with fuzzy=" + str(fuzzy) + "!")
+
+    if stats is not None:
+        t = stats.Clock()
+
+    # NB: keep subset=None when using an index; NameIndex handles ordering
+    subset = namedict.keys() if subset == None and index is None else subset
 
     string = string.replace('`',"'")
     string = string.replace('.'," ")
@@ -82,13 +347,32 @@ def NameFinder(namedict, string, subset=None, matches = 'all',
     # Tokenize
     tokens = [x.upper() for x in string.split()]
 
+    if stats is not None:
+        t = stats.Lap('namefinder.clean', t)
+
     # Identify all potential names in the string
     # This identifies all the last names from the name_dict that appear in the string
+    if index is None:
+        candidates = []
+        for k in subset:
+            ln = NormalizeLastName(namedict[k][namekeys[2]])
+            if ln == [] or not all(True if t in tokens else False for t in ln):
+                continue
+            candidates.append((k, ln))
+    else:
+        candidates = index.Candidates(tokens, subset)
+    if fuzzy:
+        fuzzycandidates = index.FuzzyCandidates(tokens, fuzzy, subset)
+
+    if stats is not None:
+        t = stats.Lap('namefinder.candidates', t)
+        stats.Count('namefinder.strings')
+        stats.Count('namefinder.candidates', len(candidates))
+        if fuzzy:
+            stats.Count('namefinder.fuzzy_candidates', len(fuzzycandidates))
+
     allnames = {}
-    for k in subset:
-        ln = namedict[k][namekeys[2]].upper().strip().replace("."," ").replace('-',' ').replace('`',"'").split()
-        if ln == [] or not all(True if t in tokens else False for t in ln):
-            continue
+    for k, ln in candidates:
         for n in [' '.join(tokens[max([0,i-4]):i+1]) for i,n in enumerate(tokens) if n == ln[-1]]:
             if n in allnames:
                 allnames[n].append(k)
@@ -98,55 +382,49 @@ def NameFinder(namedict, string, subset=None, matches = 'all',
     # Match all the potential names to ID numbers from namedict
     # This iterates through all the potential matches to rule out the "bad" ones
     allmatches = {x : [] for x in allnames}
+    if fuzzy:
+        # Windows ending in a misspelled last name, with the ID and typos
+        fuzzynames = {}
+        for k, ln, tok, e in fuzzycandidates:
+            for n in [' '.join(tokens[max([0,i-4]):i+1]) for i,n in enumerate(tokens) if n == tok]:
+                fuzzynames.setdefault(n, []).append((k, e))
+                allmatches.setdefault(n, [])
+    if stats is not None:
+        stats.Count('namefinder.windows', sum([len(allnames[x]) for x in allnames]))
     for a in allnames:
         for k in allnames[a]:
-            dict_name = [namedict[k][namekeys[0]].upper().strip(),namedict[k][namekeys[1]].upper().strip(),namedict[k][namekeys[2]].upper().strip(),namedict[k][namekeys[3]].upper().strip()]
-            dict_name = [x.replace("."," ").replace('-',' ').replace('`',"'") for x in dict_name]
-            fn, mn, ln = dict_name[0].split(), dict_name[1].split(), dict_name[2].split()
-            dict_name = ' '.join([x for x in dict_name if x != ""])
-            fi = [[x[0] for x in fn][0]] if fn != [] else [] # only pulls initial from 1st First Name
-            mi = [[x[0] for x in mn][0]] if mn != [] else [] # only pulls initial from 1st Middle Name
+            if index is None:
+                v = NameVariants(*[namedict[k][x] for x in namekeys[:4]])
+            else:
+                v = index.Variants(k)
+            ln = v['ln']
 
             n = ' '.join([""] + a.split() + [""])
             n = n.replace(" JUSTICE "," JUDGE ") if "JUSTICE" in n and "JUSTICE" not in ln else n
 
             # Applies series of rules, giving code "em" based on how good of
             # a match it is. Lower "em" is better.
+            # The variant strings for each rule are precomputed in NameVariants
+            # (see there for the sequence of rules).
 
-            if ' '.join([""] + fn + mn + ln + [""]) in n:
-                em, matched_text = 0, ' '.join([""] + fn + mn + ln + [""])
-            elif ' '.join([""] + fn + mi + ln + [""]) in n:
-                em, matched_text = 1, ' '.join([""] + fn + mi + ln + [""])
-            elif ' '.join([""] + fi + mn + ln + [""]) in n:
-                em, matched_text = 1, ' '.join([""] + fi + mn + ln + [""])
-            elif fn != [] and len(fn[0]) > 1 and ' '.join([""] + fn + ln + [""]) in n:
-                em, matched_text = 2, ' '.join([""] + fn + ln + [""])
-            # Added this 2018-05-23 to catch judges who only go by their
-            # middle names. For example, Jerome Farris of the Ninth Circuit
-            elif mn != [] and len(mn[0]) > 1 and ' '.join([""] + mn + ln + [""]) in n:
-                em, matched_text = 2, ' '.join([""] + mn + ln + [""])
-
-            elif ' '.join([""] + fi + mi + ln + [""]) in n:
-                em, matched_text = 3, ' '.join([""] + fi + mi + ln + [""])
-            elif fn != [] and  ' '.join([""] + fi + ln + [""]) in n:
-                em, matched_text = 5, ' '.join([""] + fi + ln + [""])
-            elif mn != [] and ' '.join([""] + mi + ln + [""]) in n:
-                em, matched_text = 6, ' '.join([""] + mi + ln + [""])
-            elif " JUDGE " in n and n[n.find(" JUDGE ")+6:].strip() == ' '.join(ln):
-                em, matched_text = 7, " JUDGE " + ' '.join(ln)
-            elif len(tokens) == 1 and n.strip() == ' '.join(ln):
-                em, matched_text = 8, ' '.join(ln)
-
-
-            else: #Stragglers
-                orig = ' ' + ' '.join([x for x in n.replace(' '.join(ln), '').split()] + ln) + ' '
-                mod = ' ' + ' '.join([x[0] for x in n.replace(' '.join(ln), '').split()] + ln) + ' '
-                if ' '.join([""] + fi + mi + ln + [""]) == mod:
-                    em, matched_text = 3, orig
-                elif ' '.join([""] + fi + ln + [""]) == mod:
-                    em, matched_text = 5, orig
-                else:
-                    em, matched_text = 99, ""
+            for matched_text, em in v['tiers']:
+                if matched_text in n:
+                    break
+            else:
+                if " JUDGE " in n and n[n.find(" JUDGE ")+6:].strip() == v['ln_str']:
+                    em, matched_text = 7, " JUDGE " + v['ln_str']
+                elif len(tokens) == 1 and n.strip() == v['ln_str']:
+                    em, matched_text = 8, v['ln_str']
+
+                else: #Stragglers
+                    orig = ' ' + ' '.join([x for x in n.replace(v['ln_str'], '').split()] + ln) + ' '
+                    mod = ' ' + ' '.join([x[0] for x in n.replace(v['ln_str'], '').split()] + ln) + ' '
+                    if v['fi_mi_ln'] == mod:
+                        em, matched_text = 3, orig
+                    elif v['fi_ln'] == mod:
+                        em, matched_text = 5, orig
+                    else:
+                        em, matched_text = 99, ""
 
             if (em > 3 and em < 7) or em > 10:
                 # Performs some regex searches to catch special cases:
@@ -160,13 +438,47 @@ def NameFinder(namedict, string, subset=None, matches = 'all',
                 # than string operations.
                 # They are only necessary if low quality matches found above.
 
-                if mi != [] and re.search(' '.join([""] + fn + [mi[0] + '[A-Z]+'] + ln + [""]),n):
-                    em, matched_text = 2, re.search("("+' '.join([""] + fn + [mi[0] + '[A-Z]+'] + ln + [""])+")",n).group(0)
-                if fn != [] and re.search(' '.join(fn + ['[A-Z]'] + ln),n):
-                    em, matched_text = 4, re.search(' '.join(fn + ['[A-Z]'] + ln),n).group(0)
+                if stats is not None:
+                    rt, before = stats.Clock(), em
+                if v['re_middle'] is not None:
+                    m = v['re_middle'].search(n)
+                    if m:
+                        em, matched_text = 2, m.group(0)
+                if v['re_typo'] is not None:
+                    m = v['re_typo'].search(n)
+                    if m:
+                        em, matched_text = 4, m.group(0)
+                if stats is not None:
+                    stats.Lap('namefinder.regex', rt)
+                    stats.Count('namefinder.regex_searches')
+                    stats.Count('namefinder.regex_hits', int(em != before))
 
             if em < 11:
-                allmatches[a].append((em,k,"FJC Name: " + dict_name,matched_text.strip()))
+                allmatches[a].append((em,k,"FJC Name: " + v['dict_name'],matched_text.strip()))
+
+    if fuzzy:
+        for a in fuzzynames:
+            for k, e in fuzzynames[a]:
+                v = index.Variants(k)
+                window = a.split()
+                if "JUSTICE" not in v['ln']:
+                    window = ["JUDGE" if x == "JUSTICE" else x for x in window]
+                # Correct the last token, then look for the name variants of
+                # em 0-6 and "JUDGE" + last name (no regex fallbacks); the
+                # match must include the corrected token
+                n = ' '.join([""] + window[:-1] + [v['ln'][-1]] + [""])
+                for matched_text, em in v['tiers']:
+                    if n.endswith(matched_text):
+                        break
+                else:
+                    matched_text = " JUDGE " + v['ln_str'] + " "
+                    if not n.endswith(matched_text):
+                        continue
+                matched_text = ' '.join(window[-len(matched_text.split()):])
+                allmatches[a].append((9 if e == 1 else 10,k,"FJC Name: " + v['dict_name'],matched_text))
+
+    if stats is not None:
+        t = stats.Lap('namefinder.score', t)
 
     # Return matches based on criteria selected in arguments
     if matches == 'exact' or matches == 'best':
@@ -182,6 +494,16 @@ def NameFinder(namedict, string, subset=None, matches = 'all',
     elif matches in [x for x in range(0,11)] + [str(x) for x in range(0,11)]:
         allmatches = {x : [y for y in allmatches[x] if y[0] <= int(matches)] for x in allmatches if allmatches[x] != []}
 
+    if stats is not None:
+        t = stats.Lap('namefinder.filter', t)
+
+    if spans:
+        found = MatchSpans(tokens, allmatches)
+        if stats is not None:
+            stats.Lap('namefinder.spans', t)
+            stats.Count('namefinder.matches', len(found))
+        return (found, ' '.join(tokens))
+
     # Consistency check: make sure that text in string aren't being
     # "tagged" with more than one person's name from namedict
     toremove = set()
@@ -200,6 +522,9 @@ def NameFinder(namedict, string, subset=None, matches = 'all',
            tosave.append(a[1])
     allmatches = {x:allmatches[x] for x in allmatches if x in tosave}
 
+    if stats is not None:
+        t = stats.Lap('namefinder.consistency', t)
+
     ## Reformat objects returned
     tokens = ' '.join(tokens)
     c = 0
@@ -211,7 +536,150 @@ def NameFinder(namedict, string, subset=None, matches = 'all',
                 allmatches[c] = allmatches[a[1]]
                 del allmatches[a[1]]
 
+    if stats is not None:
+        stats.Lap('namefinder.tag', t)
+        stats.Count('namefinder.matches', sum([len(allmatches[x]) for x in allmatches]))
+
     if easy_output == False:
         return (allmatches, tokens)
     else:
         return [y[1]  for x in allmatches for y in allmatches[x]]
+
+def MatchSpans(tokens, allmatches):
+    """
+    Turns NameFinder's matches into spans of the normalized text
+    (' '.join(tokens)): a list of (start, end, ID, em) tuples sorted by
+    position. allmatches maps each window of tokens (up to 5 tokens ending in
+    a last name) to its (em, ID, FJC Name, matched text) matches. Each match
+    is located inside the window where it was found. Spans of different
+    lengths that overlap are resolved longest first: a span is kept unless it
+    overlaps a longer span that was kept (or an earlier one, if they are as
+    long). IDs matched to the same span are
+    all kept, best em first.
+    """
+    offsets = []
+    c = 0
+    for x in tokens:
+        offsets.append(c)
+        c += len(x) + 1
+
+    def Locate(i, text):
+        # Position of text in the window ending at token i, as characters
+        base = max([0,i-4])
+        window = tokens[base:i+1]
+        mt = text.split()
+        for j in range(len(window) - len(mt), -1, -1):
+            if all(window[j+x] == mt[x] or (window[j+x], mt[x]) == ('JUSTICE','JUDGE') for x in range(len(mt))):
+                return offsets[base+j], offsets[base+j+len(mt)-1] + len(tokens[base+j+len(mt)-1])
+        pos = ' '.join(window).rfind(text)
+        if pos != -1:
+            return offsets[base] + pos, offsets[base] + pos + len(text)
+        return offsets[i], offsets[i] + len(tokens[i])
+
+    found = {} # (start, end, ID) -> em
+    for i in range(len(tokens)):
+        a = ' '.join(tokens[max([0,i-4]):i+1])
+        for em, k, name, text in allmatches.get(a, []):
+            start, end = Locate(i, text.strip())
+            if found.get((start, end, k), 99) > em:
+                found[(start, end, k)] = em
+
+    # Longest spans first (the earlier one if they are as long): a span is
+    # kept unless it overlaps a span kept already
+    groups = {} # (start, end) -> spans with those bounds
+    for start, end, k in found:
+        groups.setdefault((start, end), []).append((start, end, k, found[(start, end, k)]))
+    starts, ends = [], [] # kept spans, sorted by start
+    for start, end in sorted(groups, key=lambda x: (x[0] - x[1], x[0])):
+        i = bisect.bisect_left(starts, start)
+        if (i > 0 and ends[i-1] > start) or (i < len(starts) and starts[i] < end):
+            continue
+        starts.insert(i, start)
+        ends.insert(i, end)
+    kept = [groups[x] for x in zip(starts, ends)]
+    return [x for group in kept for x in sorted(group, key=lambda y: y[3])]
+
+# Batch processing
+## Each worker process holds its own copy of the namedict (and a NameIndex
+## built from it), which is sent once when the worker starts.
+_worker = {}
+
+def _InitWorker(namedict, options):
+    _worker['namedict'] = namedict
+    _worker['options'] = options
+    _worker['index'] = NameIndex(namedict, options['namekeys'], options['fuzzy'])
+
+def _FindChunk(strings, collect=False):
+    # Returns the results, and the chunk's stats (as a dict) if collect
+    stats = None
+    if collect:
+        from judges.Stats import Stats
+        stats = Stats()
+    results = [NameFinder(_worker['namedict'], s, index=_worker['index'], stats=stats, **_worker['options'])
+               for s in strings]
+    return results, stats.ToDict() if stats is not None else None
+
+def _Chunks(strings, chunksize):
+    chunk = []
+    for s in strings:
+        chunk.append(s)
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+    if chunk != []:
+        yield chunk
+
+def FindMany(namedict, strings, workers=None, chunksize=500, subset=None,
+             matches='all', namekeys=("First Name","Middle Name","Last Name","Suffix"),
+             easy_output=False, max_pending=None, stats=None, spans=False, fuzzy=0):
+    """
+    Runs NameFinder over an iterable of strings (e.g., a whole corpus of docket
+    entries) using a pool of worker processes. Yields one NameFinder result
+    per string, in the same order as strings.
+        namedict, subset, matches, namekeys, easy_output, spans, fuzzy:
+            same as NameFinder
+        strings:
+            [iterable of str] May be a generator; it is consumed lazily.
+        workers:
+            [int] Number of worker processes. Defaults to the number of CPUs.
+            If 1, everything runs in the current process.
+        chunksize:
+            [int] Number of strings sent to a worker at a time.
+        max_pending:
+            [int] Maximum number of chunks in flight at a time (bounds memory
+            use on very large inputs). Defaults to 4 chunks per worker.
+        stats:
+            [type judges.Stats.Stats] If supplied, the stats of every
+            worker are added to it (see NameFinder).
+    For example:
+        for ids in FindMany(namedict, open('entries.txt'), easy_output=True):
+            ...
+    """
+    options = {'subset': subset, 'matches': matches, 'namekeys': tuple(namekeys),
+               'easy_output': easy_output, 'spans': spans, 'fuzzy': fuzzy}
+    workers = (os.cpu_count() or 1) if workers is None else workers
+
+    if workers <= 1:
+        index = NameIndex(namedict, namekeys, fuzzy)
+        for s in strings:
+            yield NameFinder(namedict, s, index=index, stats=stats, **options)
+        return
+
+    import multiprocessing # only needed here; slow to import
+
+    max_pending = workers * 4 if max_pending is None else max_pending
+    with multiprocessing.Pool(workers, initializer=_InitWorker,
+                              initargs=(namedict, options)) as pool:
+        def Results(job):
+            results, chunkstats = job.get()
+            if stats is not None:
+                stats.Merge(chunkstats)
+            return results
+
+        pending = deque()
+        for chunk in _Chunks(strings, chunksize):
+            pending.append(pool.apply_async(_FindChunk, (chunk, stats is not None)))
+            while len(pending) >= max_pending:
+                yield from Results(pending.popleft())
+        while pending:
+            yield from Results(pending.popleft())
@@ -6,25 +6,39 @@
 # University of California, Davis
 
 """
-judges.QueryTools v1.0
+judges.QueryTools v1.4
 A set of functions used to query entries in the FJC's database of federal
 judges.
+
+New in v1.1: SittingIndex, a prebuilt index for fast SittingJudges queries;
+ServiceIndex and WhichCourtMany, for resolving WhichCourt for many cases;
+LNIndex, a cached index used by LNSearch.
+New in v1.2: court abbreviations are loaded from judges.CourtNames
+New in v1.3: SpellColumns, a columnar copy of service spells for finding
+the judges sitting on many dates at once (uses NumPy if it is installed)
+New in v1.4: RosterTimeline, the number of active and senior judges of each
+court over time, for judge-day totals and court-by-day/month panels
 """
 
 # Import Modules
 import os
 import re
 import csv
+import bisect
 import datetime
+from array import array
+from functools import lru_cache
 
 current_path = os.path.dirname(os.path.abspath( __file__ ))
 
 # Courts abbreviations
-with open(current_path + "/data/courts.csv","r") as csvfile:
-    reader = csv.DictReader(csvfile.read().splitlines())
-    abbr = {"":""}
-    for row in reader:
-        abbr[row['full_name']] = row['abbr']
+## Loaded the first time they are needed (as QueryTools.abbr or CourtAbbreviations())
+from judges.CourtNames import AbbreviateCourt, CourtAbbreviations
+
+def __getattr__(name):
+    if name == 'abbr':
+        return CourtAbbreviations()
+    raise AttributeError("module " + __name__ + " has no attribute " + name)
 
 def MakeDate(string):
     """
@@ -37,12 +51,16 @@ def MakeDate(string):
     else:
         return('')
 
-def SittingJudges(data,begdate,enddate=None,court_abbr=None):
+def SittingJudges(data,begdate,enddate=None,court_abbr=None,index=None):
     """
     Takes a court name and date (or range of dates) and returns IDs for
     all judges sitting in that court for that date (or range of dates)
     [including ones sitting only partially in date range, if relevant].
+    If a SittingIndex built from data is supplied as index, it is used to
+    answer the query instead of scanning data.
     """
+    if index is not None:
+        return index.SittingJudges(begdate,enddate,court_abbr)
     court_abbr = court_abbr.upper() if court_abbr != None else None
     if enddate == None:
         enddate = begdate
@@ -51,7 +69,7 @@ def SittingJudges(data,begdate,enddate=None,court_abbr=None):
         for n in range(1,7):
             # if court_abbr in ['',None]:
             #     continue
-            if court_abbr != None and abbr[data[k]['Court Name ('+str(n)+')']] != court_abbr:
+            if court_abbr != None and AbbreviateCourt(data[k]['Court Name ('+str(n)+')'], True) != court_abbr:
                 continue
             #ndate = MakeDate(data[k]['Nomination Date ('+str(n)+')']) # nomination
             #hdate = MakeDate(data[k]['Hearing Date ('+str(n)+')']) # hearing
@@ -59,26 +77,429 @@ def SittingJudges(data,begdate,enddate=None,court_abbr=None):
             cdate = MakeDate(data[k]['Commission Date ('+str(n)+')']) # commission
             sdate = MakeDate(data[k]['Senior Status Date ('+str(n)+')']) # senior status
             tdate = MakeDate(data[k]['Termination Date ('+str(n)+')']) # termination
+            SpellDays(alljudges,k,n,rdate,cdate,sdate,tdate,begdate,enddate)
+    return(alljudges)
 
-            if min(cdate,rdate) > enddate:
-                continue
-            elif tdate < begdate:
+def SpellDays(alljudges,k,n,rdate,cdate,sdate,tdate,begdate,enddate):
+    """
+    Adds a judge's days of active and/or senior service in one court
+    (service number n) between begdate and enddate to alljudges
+    """
+    if min(cdate,rdate) > enddate:
+        return
+    elif tdate < begdate:
+        return
+
+    if min(sdate,tdate) > enddate:
+        days = min((enddate - begdate).days,(enddate - min(cdate,rdate)).days)
+        alljudges['active'].append((k,str(n),days))
+    elif sdate > begdate and sdate < enddate:
+        days1 = min((sdate - begdate).days,(sdate - min(cdate,rdate)).days)
+        alljudges['active'].append((k,str(n),days1))
+        days2 = min((enddate - sdate).days,(tdate - sdate).days)
+        alljudges['senior'].append((k,str(n),days2))
+    elif sdate < begdate:
+        days = min((enddate - begdate).days,(tdate - begdate).days)
+        alljudges['senior'].append((k,str(n),days))
+
+class SittingIndex(object):
+    """
+    A prebuilt index of the FJC data (the fjc_dict from LoadData) used to
+    answer SittingJudges queries quickly. Dates are parsed once, and each
+    court's service spells are stored in a static interval tree, so a query
+    takes O(log n + k) for n spells and k judges found.
+    For example:
+        index = SittingIndex(data)
+        SittingJudges(data, begdate, enddate, 'CA9', index=index)
+    """
+    def __init__(self, data):
+        abbr = CourtAbbreviations()
+        self.unknown = [] # (r, n, court name) for court names missing from courts.csv
+        spells = {None: []} # court abbreviation (None = all courts) -> spells
+        messy = {None: []} # spells with unparseable dates, checked at query time
+        for r, k in enumerate(data):
+            for n in range(1,7):
+                name = data[k]['Court Name ('+str(n)+')']
+                rdate = MakeDate(data[k]['Recess Appointment Date ('+str(n)+')'])
+                cdate = MakeDate(data[k]['Commission Date ('+str(n)+')'])
+                sdate = MakeDate(data[k]['Senior Status Date ('+str(n)+')'])
+                tdate = MakeDate(data[k]['Termination Date ('+str(n)+')'])
+                spell = (r,n,k,rdate,cdate,sdate,tdate)
+                bucket = messy if '' in spell[3:] else spells
+                bucket[None].append(spell)
+                if name in abbr:
+                    bucket.setdefault(abbr[name],[]).append(spell)
+                else:
+                    self.unknown.append((r,n,name))
+        self.messy = messy
+        self.trees = {c: IntervalTree([(min(x[3],x[4]),x[6],x) for x in spells[c]]) for c in spells}
+
+    def SittingJudges(self,begdate,enddate=None,court_abbr=None):
+        """
+        Same as SittingJudges(data,begdate,enddate,court_abbr)
+        """
+        court_abbr = court_abbr.upper() if court_abbr != None else None
+        if enddate == None:
+            enddate = begdate
+        alljudges = {'active': [], 'senior': []}
+        found = list(self.messy.get(court_abbr,[]))
+        if court_abbr in self.trees:
+            found.extend(self.trees[court_abbr].Overlapping(begdate,enddate))
+        # Report judges in the same order as SittingJudges
+        ## (and fail the same way when a court name is unknown)
+        unknown = self.unknown[0] if court_abbr != None and self.unknown != [] else None
+        for r,n,k,rdate,cdate,sdate,tdate in sorted(found):
+            if unknown is not None and unknown[:2] < (r,n):
+                raise KeyError(unknown[2])
+            SpellDays(alljudges,k,n,rdate,cdate,sdate,tdate,begdate,enddate)
+        if unknown is not None:
+            raise KeyError(unknown[2])
+        return(alljudges)
+
+class IntervalTree(object):
+    """
+    A static interval tree: a list of (start, end, item) sorted by start, plus a
+    segment tree holding the latest end in each block of the list.
+    Overlapping(lo, hi) returns every item with start <= hi and end >= lo.
+    """
+    def __init__(self, intervals):
+        intervals = sorted(intervals, key=lambda x: x[0])
+        self.starts = [x[0] for x in intervals]
+        self.ends = [x[1] for x in intervals]
+        self.items = [x[2] for x in intervals]
+        self.size = 1
+        while self.size < len(intervals):
+            self.size *= 2
+        self.maxend = [None] * (2 * self.size)
+        for i, e in enumerate(self.ends):
+            self.maxend[self.size + i] = e
+        for i in range(self.size - 1, 0, -1):
+            kids = [x for x in self.maxend[2*i:2*i+2] if x is not None]
+            self.maxend[i] = max(kids) if kids != [] else None
+
+    def __len__(self):
+        return len(self.items)
+
+    def Overlapping(self, lo, hi):
+        m = bisect.bisect_right(self.starts, hi) # only items [0, m) start by hi
+        found = []
+        stack = [(1, 0, self.size)] if m > 0 else []
+        while stack:
+            node, a, b = stack.pop()
+            if a >= m or self.maxend[node] is None or self.maxend[node] < lo:
                 continue
+            if node >= self.size:
+                found.append(self.items[a])
+            else:
+                mid = (a + b) // 2
+                stack.append((2*node+1, mid, b))
+                stack.append((2*node, a, mid))
+        return found
 
-            if min(sdate,tdate) > enddate:
-                days = min((enddate - begdate).days,(enddate - min(cdate,rdate)).days)
-                alljudges['active'].append((k,str(n),days))
-            elif sdate > begdate and sdate < enddate:
-                days1 = min((sdate - begdate).days,(sdate - min(cdate,rdate)).days)
-                alljudges['active'].append((k,str(n),days1))
-                days2 = min((enddate - sdate).days,(tdate - sdate).days)
-                alljudges['senior'].append((k,str(n),days2))
-            elif sdate < begdate:
-                days = min((enddate - begdate).days,(tdate - begdate).days)
-                alljudges['senior'].append((k,str(n),days))
-    return(alljudges)
+@lru_cache(maxsize=None)
+def Numpy():
+    """
+    Returns numpy if it is installed (it is optional), or None
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
 
-def WhichCourt(date, reshaped_dict, fjc_id, use_closest = False):
+class SpellColumns(object):
+    """
+    A columnar copy of the service spells in the FJC data (the fjc_dict from
+    LoadData): parallel arrays of court code, judge, service number and start
+    (recess appointment or commission), senior status and termination dates as
+    date ordinals. The arrays are NumPy arrays if NumPy is installed (and
+    use_numpy is True), or else array.array.
+    Membership finds the judges sitting on each of many dates in one pass,
+    e.g., for a panel of courts by business day:
+        columns = SpellColumns(data)
+        columns.SittingJudges(dates, 'CA9')
+    gives the same result as [SittingJudges(data, x, None, 'CA9') for x in dates].
+    """
+    def __init__(self, data, use_numpy=True):
+        abbr = CourtAbbreviations()
+        self.np = Numpy() if use_numpy else None
+        self.ids = list(data) # judge -> FJC ID
+        self.codes = {} # court abbreviation -> court code
+        self.errors = [] # (judge, n, court code, court name, spell) for spells with unknown courts or messy dates
+        columns = {x: [] for x in ['court','judge','n','start','senior','end']}
+        for r, k in enumerate(data):
+            for n in range(1,7):
+                name = data[k]['Court Name ('+str(n)+')']
+                rdate = MakeDate(data[k]['Recess Appointment Date ('+str(n)+')'])
+                cdate = MakeDate(data[k]['Commission Date ('+str(n)+')'])
+                sdate = MakeDate(data[k]['Senior Status Date ('+str(n)+')'])
+                tdate = MakeDate(data[k]['Termination Date ('+str(n)+')'])
+                code = self.codes.setdefault(abbr[name],len(self.codes)) if name in abbr else -1
+                if code == -1 or '' in [rdate,cdate,sdate,tdate]:
+                    # Checked at query time, in case SittingJudges would fail
+                    self.errors.append((r,n,code,name,(k,n,rdate,cdate,sdate,tdate)))
+                if '' in [rdate,cdate,sdate,tdate] or min(rdate,cdate,sdate) == datetime.date(9999,12,31):
+                    continue # messy, or never sitting
+                for x, y in zip(['court','judge','n','start','senior','end'],
+                                [code,r,n,min(cdate,rdate).toordinal(),sdate.toordinal(),tdate.toordinal()]):
+                    columns[x].append(y)
+        for x in columns:
+            setattr(self, x, self.np.array(columns[x], dtype=self.np.int64) if self.np is not None
+                             else array('q', columns[x]))
+
+    def __len__(self):
+        return len(self.judge)
+
+    def Errors(self, date, code):
+        # Replays the spells SittingJudges would fail on, in its order
+        for r, n, c, name, spell in self.errors:
+            if code is not None and c == -1:
+                raise KeyError(name)
+            if code is None or c == code:
+                SpellDays({'active': [], 'senior': []},*spell,date,date)
+
+    def Membership(self, dates, courts=None):
+        """
+        Finds the judges sitting on each date.
+        :param dates: list of datetime.date objects
+        :param courts: None (all courts), a court abbreviation, or a list of
+            court abbreviations (one for each date)
+        :return: tuple of two lists (active, senior) giving, for each date, the
+            positions (in the arrays) of the spells of active and senior judges,
+            in the same order as SittingJudges
+        """
+        if courts is None or type(courts) is str:
+            courts = [courts] * len(dates)
+        groups = {}
+        for i, c in enumerate(courts):
+            groups.setdefault(c.upper() if c != None else None,[]).append(i)
+        active, senior = [None] * len(dates), [None] * len(dates)
+        for c in groups:
+            code = self.codes.get(c,-2) if c != None else None
+            if self.errors != []:
+                for d in set([dates[i] for i in groups[c]]):
+                    self.Errors(d, code)
+            ordinals = [dates[i].toordinal() for i in groups[c]]
+            found = self.Sweep(ordinals, code)
+            for i, a, s in zip(groups[c], *found):
+                active[i], senior[i] = a, s
+        return active, senior
+
+    def Sweep(self, ordinals, code):
+        """
+        Membership for one court code (None = all courts) on a list of date
+        ordinals. On a single date d, a spell is active if start <= d < senior
+        status and termination, and senior if start <= d and senior status < d <= termination.
+        """
+        np = self.np
+        if np is None:
+            spells = [i for i in range(len(self.court)) if code is None or self.court[i] == code]
+            order = sorted(range(len(ordinals)), key=lambda i: ordinals[i])
+            days = [ordinals[i] for i in order]
+            found = ([[] for x in days], [[] for x in days])
+            for i in spells:
+                ranges = [(bisect.bisect_left(days,self.start[i]),
+                           bisect.bisect_left(days,min(self.senior[i],self.end[i]))),
+                          (bisect.bisect_left(days,max(self.senior[i]+1,self.start[i])),
+                           bisect.bisect_right(days,self.end[i]))]
+                for lists, (lo, hi) in zip(found, ranges):
+                    for j in range(lo,hi):
+                        lists[j].append(i)
+            active, senior = [None] * len(days), [None] * len(days)
+            for j, i in enumerate(order):
+                active[i], senior[i] = found[0][j], found[1][j]
+            return active, senior
+
+        spells = np.arange(len(self.court)) if code is None else np.nonzero(self.court == code)[0]
+        ordinals = np.asarray(ordinals, dtype=np.int64)
+        order = np.argsort(ordinals, kind='stable')
+        days = ordinals[order]
+        start, sdate, tdate = self.start[spells], self.senior[spells], self.end[spells]
+        ranges = [(np.searchsorted(days,start,'left'), np.searchsorted(days,np.minimum(sdate,tdate),'left')),
+                  (np.searchsorted(days,np.maximum(sdate+1,start),'left'), np.searchsorted(days,tdate,'right'))]
+        results = []
+        for lo, hi in ranges:
+            # One (day, spell) pair for each day in [lo, hi), grouped by day
+            counts = np.clip(hi - lo, 0, None)
+            first = np.cumsum(counts) - counts
+            pairs_day = np.repeat(lo, counts) + np.arange(counts.sum()) - np.repeat(first, counts)
+            pairs_spell = np.repeat(spells, counts)
+            by_day = np.argsort(pairs_day, kind='stable')
+            pairs_spell = pairs_spell[by_day]
+            bounds = np.searchsorted(pairs_day[by_day], np.arange(len(days) + 1))
+            result = [None] * len(days)
+            for j, i in enumerate(order):
+                result[i] = pairs_spell[bounds[j]:bounds[j+1]]
+            results.append(result)
+        return tuple(results)
+
+    def SittingJudges(self, dates, courts=None):
+        """
+        Same as [SittingJudges(data, x, None, c) for x, c in zip(dates, courts)]
+        (courts may also be None or a single court abbreviation)
+        """
+        output = []
+        for a, s in zip(*self.Membership(dates, courts)):
+            output.append({'active': [(self.ids[self.judge[i]],str(self.n[i]),0) for i in a],
+                           'senior': [(self.ids[self.judge[i]],str(self.n[i]),0) for i in s]})
+        return output
+
+class RosterTimeline(object):
+    """
+    The number of active and senior judges of each court over time, built in
+    one pass over the FJC data (the fjc_dict from LoadData). Each service spell
+    adds change points (commission or recess appointment, senior status and
+    termination) to its court's timeline and to the timeline of all courts
+    (court None). Counts are kept at each change point, along with the running
+    total of judge-days, so Count and JudgeDays take O(log n) for n change
+    points. A judge counts on date d the same way as in SittingJudges(data, d):
+    active if start <= d < senior status and termination, and senior if
+    senior status < d <= termination. So
+        timeline = RosterTimeline(data)
+        timeline.JudgeDays(begdate, enddate, 'CA9')
+    gives the number of active and senior judges of SittingJudges(data, d, None,
+    'CA9'), summed over every date d from begdate to enddate. Spells with court
+    names missing from courts.csv only count toward all courts (and are listed
+    in unknown); spells with unparseable dates are left out (and listed in
+    skipped).
+    """
+    def __init__(self, data):
+        abbr = CourtAbbreviations()
+        self.skipped = [] # (FJC ID, n, court name) for spells left out
+        self.unknown = [] # (FJC ID, n, court name) for spells only in the timeline of all courts
+        events = {None: {}} # court abbreviation -> ordinal -> [change in active, change in senior]
+        for k in data:
+            for n in range(1,7):
+                name = data[k]['Court Name ('+str(n)+')']
+                rdate = MakeDate(data[k]['Recess Appointment Date ('+str(n)+')'])
+                cdate = MakeDate(data[k]['Commission Date ('+str(n)+')'])
+                sdate = MakeDate(data[k]['Senior Status Date ('+str(n)+')'])
+                tdate = MakeDate(data[k]['Termination Date ('+str(n)+')'])
+                if '' in [rdate,cdate,sdate,tdate]:
+                    self.skipped.append((k,n,name))
+                    continue
+                if min(rdate,cdate,sdate) == datetime.date(9999,12,31):
+                    continue # never sitting
+                if name not in abbr:
+                    self.unknown.append((k,n,name))
+                start, sdate, tdate = min(cdate,rdate).toordinal(), sdate.toordinal(), tdate.toordinal()
+                # Days [lo, hi) of active and of senior service
+                periods = [(start, min(sdate,tdate)), (max(sdate+1,start), tdate+1)]
+                for court in [None, abbr[name]] if name in abbr else [None]:
+                    changes = events.setdefault(court, {})
+                    for column, (lo, hi) in enumerate(periods):
+                        if lo < hi:
+                            changes.setdefault(lo,[0,0])[column] += 1
+                            changes.setdefault(hi,[0,0])[column] -= 1
+        self.timelines = {c: self.Build(events[c]) for c in events}
+
+    @staticmethod
+    def Build(changes):
+        """
+        Turns {ordinal: [change in active, change in senior]} into a timeline:
+        a dict of lists giving, at each change point, the active and senior
+        counts from that date on, and the active and senior judge-days before it
+        """
+        timeline = {'points': sorted(changes), 'active': [], 'senior': [], 'active_days': [], 'senior_days': []}
+        counts, days, last = [0, 0], [0, 0], None
+        for x in timeline['points']:
+            if last is not None:
+                days = [days[0] + counts[0] * (x - last), days[1] + counts[1] * (x - last)]
+            counts = [counts[0] + changes[x][0], counts[1] + changes[x][1]]
+            last = x
+            for column, value in zip(['active','senior','active_days','senior_days'], counts + days):
+                timeline[column].append(value)
+        return timeline
+
+    def Courts(self):
+        return sorted(c for c in self.timelines if c is not None)
+
+    def Timeline(self, court):
+        court = court.upper() if court != None else None
+        return self.timelines.get(court, self.Build({}))
+
+    @staticmethod
+    def At(timeline, i, ordinal):
+        # (active, senior, active judge-days, senior judge-days before ordinal),
+        # where i is the last change point on or before ordinal (or -1)
+        if i < 0:
+            return 0, 0, 0, 0
+        a, s = timeline['active'][i], timeline['senior'][i]
+        gap = ordinal - timeline['points'][i]
+        return a, s, timeline['active_days'][i] + a * gap, timeline['senior_days'][i] + s * gap
+
+    def Lookup(self, timeline, ordinal):
+        return self.At(timeline, bisect.bisect_right(timeline['points'], ordinal) - 1, ordinal)
+
+    def Count(self, date, court=None):
+        """
+        :return: tuple (active, senior) of the number of judges of court (None =
+            all courts) sitting on date
+        """
+        return self.Lookup(self.Timeline(court), date.toordinal())[:2]
+
+    def JudgeDays(self, begdate, enddate, court=None):
+        """
+        :return: tuple (active, senior) of the number of judge-days served in
+            court (None = all courts) from begdate to enddate, inclusive
+        """
+        timeline = self.Timeline(court)
+        # Ordinals, since enddate may be date(9999,12,31) (see MakeDate)
+        before = self.Lookup(timeline, begdate.toordinal())[2:]
+        through = self.Lookup(timeline, enddate.toordinal() + 1)[2:]
+        return through[0] - before[0], through[1] - before[1]
+
+    def Sweep(self, timeline, ordinals):
+        # At() for each of a sorted list of ordinals, in one pass
+        points, i = timeline['points'], -1
+        for x in ordinals:
+            while i + 1 < len(points) and points[i+1] <= x:
+                i += 1
+            yield self.At(timeline, i, x)
+
+    def Panel(self, begdate, enddate, courts=None, by='day', path=None):
+        """
+        A court-by-day or court-by-month panel from begdate to enddate
+        :param courts: a court abbreviation, a list of them, or None (every court)
+        :param by: 'day' for rows (court, date, active judges, senior judges), or
+            'month' for rows (court, 'YYYY-MM', active judge-days, senior
+            judge-days), counting only days from begdate to enddate
+        :param path: if given, the panel is also saved there as a CSV file
+        :return: list of rows, by court and then by date
+        """
+        courts = self.Courts() if courts is None else [courts] if type(courts) is str else courts
+        first, last = begdate.toordinal(), enddate.toordinal()
+        if by == 'day':
+            labels = [datetime.date.fromordinal(x) for x in range(first, last + 1)]
+            bounds = list(range(first, last + 1))
+        elif by == 'month':
+            labels, bounds, day = [], [first], begdate.replace(day=1)
+            while day <= enddate:
+                labels.append(day.strftime('%Y-%m'))
+                if (day.year, day.month) == (9999, 12):
+                    bounds.append(last + 1)
+                    break
+                day = datetime.date(day.year + day.month // 12, day.month % 12 + 1, 1)
+                bounds.append(min(day.toordinal(), last + 1))
+        else:
+            raise Exception("by must be 'day' or 'month'")
+        rows = []
+        for court in courts:
+            found = list(self.Sweep(self.Timeline(court), bounds))
+            if by == 'day':
+                rows.extend((court, x, y[0], y[1]) for x, y in zip(labels, found))
+            else:
+                rows.extend((court, labels[i], found[i+1][2] - found[i][2], found[i+1][3] - found[i][3])
+                            for i in range(len(labels)))
+        if path is not None:
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['court','date','active','senior'] if by == 'day' else
+                                ['court','month','active_days','senior_days'])
+                writer.writerows(rows)
+        return rows
+
+def WhichCourt(date, reshaped_dict, fjc_id, use_closest = False, index = None):
     """
     WhichCourt identifies which court a judge is sitting on as of a date
 
@@ -86,8 +507,12 @@ def WhichCourt(date, reshaped_dict, fjc_id, use_closest = False):
     :param reshaped_dict: dict object generated by ReshapeData in judges.LoadData
     :param fjc_id: str object representing FJC ID number
     :param use_closest: bool - if False, return NoneType if judge not on court during date
+    :param index: ServiceIndex built from reshaped_dict (optional, for speed)
     :return: tuple - (judge's court, judge's type)
     """
+    if index is not None:
+        return index.WhichCourt(date, fjc_id, use_closest)
+
     # Determine which court judge is sitting on during case,
     # whether judge is a magistrate.
 
@@ -151,12 +576,150 @@ def WhichCourt(date, reshaped_dict, fjc_id, use_closest = False):
         return [x for x in djcourts if x[5]][0][1], [x for x in djcourts if x[5]][0][2]
 
 
-def LNSearch(string, dictionary, ids_only = False):
-    found = []
-    for k in dictionary:
-        if dictionary[k]["Last Name"].lower().strip() == string.lower().strip():
-            found.append(k)
+def WhichCourtMany(pairs, reshaped_dict, use_closest = False, index = None):
+    """
+    WhichCourt for many (date, fjc_id) pairs at once. Each judge's service
+    spells are only computed once. Yields a (judge's court, judge's type) tuple
+    for each pair, in order.
+
+    :param pairs: iterable of (datetime.date, str) tuples
+    :param reshaped_dict: dict object generated by ReshapeData in judges.LoadData
+    :param use_closest: bool - same as WhichCourt
+    :param index: ServiceIndex built from reshaped_dict (optional, to reuse across calls)
+    """
+    index = ServiceIndex(reshaped_dict) if index is None else index
+    for date, fjc_id in pairs:
+        yield index.WhichCourt(date, fjc_id, use_closest)
+
+class ServiceIndex(object):
+    """
+    Caches each judge's service spells (from a reshaped_dict) for WhichCourt.
+    Spells are built the first time a judge is looked up, and dated spells are
+    kept sorted by start date so that the spells covering a date are found by
+    binary search. The rules for choosing a court are the same as WhichCourt.
+    """
+    def __init__(self, reshaped_dict):
+        self.reshaped_dict = reshaped_dict
+        self.spells = {}
+
+    def Spells(self, fjc_id):
+        if fjc_id not in self.spells:
+            jcourts = self.reshaped_dict[fjc_id]["Courts"]
+            spells = []
+            for k in jcourts:
+                # Termination date = termination date or 12/31/9999 (That is: not terminated yet)
+                end_date = datetime.date(9999, 12, 31) if jcourts[k]['date_termination'] is None else \
+                jcourts[k]['date_termination']
+                # Start date = commission date. If unavailable then later of confirmation or nomination dates
+                # If none available (probably a magistrate), it depends on the date; see WhichCourt
+                beg_date = [x for x in [jcourts[k]['date_nomination'], jcourts[k]['date_confirmation'],
+                                        jcourts[k]['date_commission']] if x is not None]
+                beg_date = max(beg_date) if beg_date != [] else None
+                spells.append((jcourts[k]['court'], jcourts[k]['judge_type'], beg_date, end_date))
+            dated = sorted([i for i, x in enumerate(spells) if x[2] is not None], key=lambda i: spells[i][2])
+            undated = [i for i, x in enumerate(spells) if x[2] is None]
+            self.spells[fjc_id] = (spells, [spells[i][2] for i in dated], dated, undated)
+        return self.spells[fjc_id]
+
+    def WhichCourt(self, date, fjc_id, use_closest = False):
+        spells, begs, dated, undated = self.Spells(fjc_id)
+
+        def Start(i):
+            if spells[i][2] is not None:
+                return spells[i][2]
+            return max([date - datetime.timedelta(30)] if date < spells[i][3] else [])
+
+        ## Spells that started by date (binary search), then check end dates
+        active = [i for i in dated[:bisect.bisect_right(begs, date)] if date <= spells[i][3]]
+        active = sorted(active + [i for i in undated if Start(i) <= date <= spells[i][3]])
+
+        ## If a judge is on two courts on date (eg after promotion), then assume
+        ## they're on the first court and not the promoted court.
+        ## NB: as in WhichCourt, the latest court (by name) is re-checked as
+        ## each spell is visited.
+        if len(active) > 1:
+            for i in range(len(spells)):
+                if spells[i][0] == max([spells[j][0] for j in active]):
+                    active = [j for j in active if j != i]
+
+        ## For judges who were not on the bench on date, classify them to
+        ## their closest appointment.
+        if use_closest and active == []:
+            closest_court = ('',999999)
+            for i in range(len(spells)):
+                d = min(abs(int((Start(i) - date).days)),abs(int((spells[i][3] - date).days)))
+                if d < closest_court[1]:
+                    closest_court = (spells[i][0], d)
+            active = [i for i in range(len(spells)) if spells[i][0] == closest_court[0]]
+
+        if active == []:
+            return None, None
+        else:
+            return spells[active[0]][0], spells[active[0]][1]
+
+def LNSearch(string, dictionary, ids_only = False, first_name = None, court = None):
+    """
+    Finds judges by last name (ignoring case and surrounding whitespace).
+    Optionally, also require a first name and/or a court (abbreviation, e.g.
+    "cand", or full court name in the FJC data).
+    Uses a cached LNIndex of dictionary; see GetLNIndex.
+    """
+    found = GetLNIndex(dictionary).Search(string, first_name, court)
     if ids_only:
         return sorted(list(set(found)))
     else:
-        return {x:dictionary[x] for x in found}
\ No newline at end of file
+        return {x:dictionary[x] for x in found}
+
+class LNIndex(object):
+    """
+    Hash index of the judges in a dictionary (fjc_dict from LoadData or output
+    of ReshapeData) by normalized last name, with first name and court as
+    secondary keys. A judge's courts are only looked up (with courts.csv, for
+    FJC data) when a search is filtered by court.
+    """
+    def __init__(self, dictionary):
+        self.dictionary = dictionary
+        self.size = len(dictionary)
+        self.lastnames = {} # last name -> list of IDs
+        self.firstnames = {} # ID -> first name
+        self.courts = {} # ID -> set of courts, filled in by Courts
+        for k in dictionary:
+            self.lastnames.setdefault(dictionary[k]["Last Name"].lower().strip(),[]).append(k)
+            self.firstnames[k] = dictionary[k].get("First Name","").lower().strip()
+
+    def Courts(self, k):
+        if k not in self.courts:
+            if "Courts" in self.dictionary[k]: # reshaped data
+                courts = [x['court'] for x in self.dictionary[k]["Courts"].values()]
+            else: # FJC data
+                courts = [self.dictionary[k].get('Court Name ('+str(n)+')','') for n in range(1,7)]
+                courts = courts + [CourtAbbreviations().get(x,'') for x in courts]
+            self.courts[k] = set(x.lower().strip() for x in courts if x not in ['',None])
+        return self.courts[k]
+
+    def Search(self, last_name, first_name = None, court = None):
+        found = self.lastnames.get(last_name.lower().strip(),[])
+        if first_name is not None:
+            found = [k for k in found if self.firstnames[k] == first_name.lower().strip()]
+        if court is not None:
+            found = [k for k in found if court.lower().strip() in self.Courts(k)]
+        return list(found)
+
+lnindex_cache = [] # LNIndex objects, oldest first
+
+def GetLNIndex(dictionary):
+    """
+    Returns an LNIndex for dictionary, building it only the first time a
+    dataset is searched. Indexes are matched to dictionaries by identity, so
+    loading (or reloading) data creates a new dictionary, which gets a fresh
+    index. If you edit a dictionary in place, call lnindex_cache.clear()
+    before searching it again.
+    """
+    for index in lnindex_cache:
+        if index.dictionary is dictionary and index.size == len(dictionary):
+            return index
+    # Only keep indexes for a few datasets at a time
+    lnindex_cache[:] = [x for x in lnindex_cache if x.dictionary is not dictionary][-3:]
+    index = LNIndex(dictionary)
+    lnindex_cache.append(index)
+    return index
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Ryan Hübert
+# Department of Political Science
+# University of California, Davis
+
+"""
+judges.Stats v1.0
+Opt-in instrumentation for NameFinder (judges.NameFinder) and Classify
+(dispositions.CivilDictionaryClassifier): wall time and number of calls for
+each stage, plus counters (e.g., candidates examined per string, regex
+fallback hit rate). Pass a Stats object to collect them:
+    stats = Stats()
+    NameFinder(namedict, string, stats=stats)
+    Classify(entries, stats=stats)
+    print(stats)
+    stats.Dump('stats.json')
+Without a Stats object (the default), nothing is measured.
+Stats from several processes are combined with Merge (FindMany and
+ClassifyMany do this for you).
+dispositions does not import this module: its functions take any object
+with the same Clock, Lap and Count methods (plus ToDict and Merge to combine
+stats across processes, with a constructor that takes no arguments).
+"""
+
+import json
+import time
+
+# Ratios reported by ToDict: name -> (numerator, denominator) counters
+ratios = {'namefinder.candidates_per_string': ('namefinder.candidates', 'namefinder.strings'),
+          'namefinder.windows_per_string': ('namefinder.windows', 'namefinder.strings'),
+          'namefinder.regex_hit_rate': ('namefinder.regex_hits', 'namefinder.regex_searches'),
+          'classify.entries_per_case': ('classify.entries', 'classify.cases'),
+          'classify.clauses_per_entry': ('classify.clauses', 'classify.entries'),
+          'classify.keywords_per_token': ('classify.keywords', 'classify.tokens'),
+          'classify.cache_hit_rate': ('classify.cache_hits', 'classify.cache_lookups')}
+
+class Stats(object):
+    """
+    Per-stage wall time (seconds) and calls, and counters.
+    Stages are timed with Clock and Lap:
+        t = stats.Clock()
+        ... # stage 1
+        t = stats.Lap('stage1', t)
+        ... # stage 2
+        t = stats.Lap('stage2', t)
+    """
+    def __init__(self):
+        self.times = {} # stage -> seconds
+        self.calls = {} # stage -> number of calls
+        self.counts = {} # counter -> total
+
+    def Clock(self):
+        return time.perf_counter()
+
+    def Lap(self, stage, start):
+        """
+        Adds the time since start to stage; returns the current time
+        """
+        now = time.perf_counter()
+        self.times[stage] = self.times.get(stage, 0.0) + now - start
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+        return now
+
+    def Count(self, counter, n=1):
+        self.counts[counter] = self.counts.get(counter, 0) + n
+
+    def Merge(self, other):
+        """
+        Adds the stats in other (a Stats object, or a dict from ToDict) to these
+        """
+        other = other.ToDict() if isinstance(other, Stats) else other
+        for x in ['times', 'calls', 'counts']:
+            mine = getattr(self, x)
+            for k in other[x]:
+                mine[k] = mine.get(k, 0) + other[x][k]
+        return self
+
+    def ToDict(self):
+        output = {'times': dict(self.times), 'calls': dict(self.calls), 'counts': dict(self.counts),
+                  'ratios': {}}
+        for name in ratios:
+            a, b = ratios[name]
+            if self.counts.get(b, 0) > 0:
+                output['ratios'][name] = self.counts.get(a, 0) / self.counts[b]
+        return output
+
+    @classmethod
+    def FromDict(cls, d):
+        return cls().Merge(d)
+
+    def Dump(self, path):
+        """
+        Saves the stats as JSON
+        """
+        with open(path, 'w') as fp:
+            json.dump(self.ToDict(), fp, indent=4, sort_keys=True)
+
+    @classmethod
+    def Load(cls, path):
+        with open(path, 'r') as fp:
+            return cls.FromDict(json.load(fp))
+
+    def __str__(self):
+        d = self.ToDict()
+        lines = ['{:40s} {:>10s} {:>10s}'.format('stage', 'seconds', 'calls')]
+        lines += ['{:40s} {:10.4f} {:10d}'.format(x, d['times'][x], d['calls'][x]) for x in sorted(d['times'])]
+        lines += ['{:40s} {:>10}'.format(x, d['counts'][x]) for x in sorted(d['counts'])]
+        lines += ['{:40s} {:10.4f}'.format(x, d['ratios'][x]) for x in sorted(d['ratios'])]
+        return '\n'.join(lines)
@@ -9,10 +9,18 @@
 
 import os
 import sys
+import importlib
 current_path = os.path.dirname(os.path.abspath( __file__ ))
 sys.path.append(current_path)
 #os.chdir(current_path) # deprecated
 
-from judges import LoadData
-from judges import QueryTools
-from judges import NameFinder
+# Submodules are imported the first time they are used (e.g., judges.LoadData),
+# which keeps "import judges" fast.
+__all__ = ['LoadData', 'QueryTools', 'NameFinder', 'CourtNames', 'JudgeStore', 'Stats']
+
+def __getattr__(name):
+    if name in __all__:
+        module = importlib.import_module('judges.' + name)
+        globals()[name] = module
+        return module
+    raise AttributeError("module " + __name__ + " has no attribute " + name)
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_path)
+sys.path.insert(0, os.path.join(repo_path, 'benchmarks'))
+
+import Synthetic
+
+@pytest.fixture
+def courtfiles(tmp_path):
+    # Synthetic courts.csv and states.txt (judges/data is not in the repo)
+    from judges.CourtNames import SetDataPath
+    Synthetic.WriteCourtFiles(str(tmp_path))
+    yield str(tmp_path)
+    SetDataPath()
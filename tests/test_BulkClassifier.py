@@ -0,0 +1,72 @@
+import csv
+import json
+
+import pytest
+
+pytest.importorskip('nltk')
+
+from dispositions import BulkClassifier
+from dispositions.BulkClassifier import BulkClassify
+
+texts = ['ORDER granting motion to dismiss. Case closed.',
+         'STIPULATION of dismissal with prejudice by all parties.',
+         'JUDGMENT in favor of defendant after jury verdict.',
+         'ORDER granting motion for summary judgment.']
+
+def WriteCases(path, bad=()):
+    lines = []
+    for i in range(20):
+        if i in bad:
+            lines.append('{"case_id": "bad-' + str(i) + '", "entries": ' if i % 2 == 0 else '[1, 2]')
+        else:
+            lines.append(json.dumps({'case_id': 'case-' + str(i),
+                                     'entries': {'1': {'entry_text': texts[i % len(texts)]}}}))
+    path.write_text('\n'.join(lines) + '\n')
+
+def Rows(path):
+    return [json.loads(x) for x in path.read_text().splitlines()]
+
+def test_bad_lines_give_error_rows(tmp_path):
+    WriteCases(tmp_path / 'cases.jsonl', bad=(4, 7))
+    count = BulkClassify(str(tmp_path / 'cases.jsonl'), str(tmp_path / 'out.jsonl'), workers=1,
+                         checkpoint=str(tmp_path / 'out.ckpt'))
+    rows = Rows(tmp_path / 'out.jsonl')
+    assert count == 18 and len(rows) == 20
+    assert [i for i, x in enumerate(rows) if 'error' in x] == [4, 7]
+    assert rows[4]['error'].startswith('line 5: JSONDecodeError')
+    assert rows[7]['case_id'] is None and rows[7]['error'].startswith('line 8: ')
+    assert json.loads((tmp_path / 'out.ckpt').read_text())['input_lines'] == 20
+
+def test_resume_after_crash(tmp_path, monkeypatch):
+    WriteCases(tmp_path / 'cases.jsonl', bad=(4,))
+    BulkClassify(str(tmp_path / 'cases.jsonl'), str(tmp_path / 'full.jsonl'), workers=1)
+
+    # Crash after 13 cases, with a checkpoint every 5 (and the bad line before it)
+    ClassifyMany = BulkClassifier.ClassifyMany
+    def Crash(*args, **kwargs):
+        for n, result in enumerate(ClassifyMany(*args, **kwargs)):
+            if n == 13:
+                raise KeyboardInterrupt
+            yield result
+    monkeypatch.setattr(BulkClassifier, 'ClassifyMany', Crash)
+    with pytest.raises(KeyboardInterrupt):
+        BulkClassify(str(tmp_path / 'cases.jsonl'), str(tmp_path / 'out.jsonl'), workers=1,
+                     checkpoint=str(tmp_path / 'out.ckpt'), checkpoint_every=5)
+    assert json.loads((tmp_path / 'out.ckpt').read_text())['input_lines'] == 10
+    monkeypatch.setattr(BulkClassifier, 'ClassifyMany', ClassifyMany)
+
+    count = BulkClassify(str(tmp_path / 'cases.jsonl'), str(tmp_path / 'out.jsonl'), workers=1,
+                         checkpoint=str(tmp_path / 'out.ckpt'), checkpoint_every=5, resume=True)
+    assert count == 10
+    assert (tmp_path / 'out.jsonl').read_text() == (tmp_path / 'full.jsonl').read_text()
+
+def test_csv_with_cases_without_entries(tmp_path):
+    lines = [json.dumps({'case_id': 'a', 'entries': {}}), json.dumps({'case_id': 'b'}),
+             json.dumps({'case_id': 'c', 'entries': {'1': {'entry_text': texts[0]}}}), '{bad']
+    (tmp_path / 'cases.jsonl').write_text('\n'.join(lines) + '\n')
+    count = BulkClassify(str(tmp_path / 'cases.jsonl'), str(tmp_path / 'out.csv'), fmt='csv', workers=1)
+    rows = list(csv.reader((tmp_path / 'out.csv').read_text().splitlines()))
+    assert count == 3 and len(rows) == 5
+    assert rows[0][-1] == 'error' and [x[0] for x in rows[1:]] == ['a', 'b', 'c', '']
+    assert rows[1][rows[0].index('motions_petitions')] == '' and rows[1][-1] == ''
+    assert rows[4][-1].startswith('line 4: JSONDecodeError')
@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('nltk')
+
+import Synthetic
+from dispositions.CivilDictionaryClassifier import Classify, Dictionaries
+from dispositions.CorpusClassifier import CorpusFeatures, EvaluateRules, ClassifyCorpus
+from dispositions.OutcomeRules import RuleEngine, DefaultRules
+
+def Rows(table, n):
+    return [{k: table[k][i] if k == 'motions_petitions' else bool(table[k][i]) for k in table} for i in range(n)]
+
+@pytest.mark.parametrize('habeas', [False, True])
+def test_agrees_with_classify(habeas):
+    cases = Synthetic.DocketCases(400, seed=7) + [{}]
+    expected = [Classify(x, habeas=habeas)[0] for x in cases]
+    assert Rows(ClassifyCorpus(cases, habeas=habeas), len(cases)) == expected
+    # Blocks of cases give the same results
+    features = CorpusFeatures()
+    for x in cases:
+        features.Add(x, habeas)
+    assert Rows(EvaluateRules(features, block=37), len(cases)) == expected
+
+def test_agrees_with_classify_custom_rules():
+    extra = [{'scope': 'text', 'when': ('any', 'deni', ('regex', 'judgment.+deni')), 'set': ['x1'],
+              'emit': 'tx', 'each': ['deni', 'motion']},
+             {'scope': 'clause', 'when': ('all', ('regex', '^grant'), ('not', ('outcome', 'x1'))), 'set': ['x2'],
+              'emit': 'cl', 'each': ['grant']},
+             {'scope': 'raw', 'when': ('all', '', ('option', 'habeas', True)), 'set': ['x3'], 'emit': 'rw'}]
+    rules = RuleEngine(DefaultRules(Dictionaries()['settlement_stems']) + extra)
+    cases = Synthetic.DocketCases(300, seed=8)
+    features = CorpusFeatures(rules)
+    for i, x in enumerate(cases):
+        features.Add(x, i % 2 == 0)
+    table = EvaluateRules(features, block=50)
+    expected = [Classify(x, habeas=i % 2 == 0, rules=rules)[0] for i, x in enumerate(cases)]
+    assert Rows(table, len(cases)) == [{k: x.get(k, False) for k in table} for x in expected]
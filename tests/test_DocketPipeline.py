@@ -0,0 +1,64 @@
+import asyncio
+import concurrent.futures
+import json
+
+import pytest
+
+pytest.importorskip('nltk')
+
+from dispositions.CivilDictionaryClassifier import Classify
+from dispositions.DocketPipeline import DocketPipeline, DirectorySource, JSONLSink, QueueSource, QueueSink
+
+texts = ['ORDER granting motion to dismiss. Case closed.',
+         'STIPULATION of dismissal with prejudice by all parties.',
+         'JUDGMENT in favor of defendant after jury verdict.']
+
+def Record(i):
+    return {'case_id': 'case-' + str(i), 'entries': {'1': {'entry_text': texts[i % len(texts)]}}}
+
+def Run(source, sink):
+    async def Main():
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            return await DocketPipeline(source, sink, executor=executor, workers=2).Run()
+    return asyncio.run(Main())
+
+def test_queue_source_and_sink():
+    async def Main():
+        inbox, outbox = asyncio.Queue(), asyncio.Queue()
+        for i in range(5):
+            await inbox.put(Record(i) if i % 2 == 0 else json.dumps(Record(i)))
+        await inbox.put('{"case_id": ')
+        await inbox.put(None)
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            count = await DocketPipeline(QueueSource(inbox), QueueSink(outbox), executor=executor, workers=2).Run()
+        rows = []
+        while True:
+            x = await outbox.get()
+            if x is None:
+                return count, rows
+            rows.append(x)
+    count, rows = asyncio.run(Main())
+    assert count == 6
+    rows = {x['case_id']: x for x in rows}
+    assert set(rows) == {'case-' + str(i) for i in range(5)} | {None}
+    assert rows[None]['error'].startswith('ValueError')
+    for i in range(5):
+        outcome = Classify(Record(i)['entries'])[0]
+        assert {x: rows['case-' + str(i)][x] for x in outcome} == outcome
+        assert rows['case-' + str(i)]['judges'] is None
+
+def test_directory_source_with_bad_line(tmp_path):
+    spool = tmp_path / 'spool'
+    spool.mkdir()
+    lines = [json.dumps(Record(i)) for i in range(4)]
+    lines[2] = '{"case_id": "case-2", "entries": '
+    (spool / 'a.jsonl').write_text('\n'.join(lines) + '\n')
+    (spool / 'b.json').write_text(json.dumps(Record(4), indent=2))
+    count = Run(DirectorySource(str(spool), done=str(tmp_path / 'done')), JSONLSink(str(tmp_path / 'out.jsonl')))
+    rows = [json.loads(x) for x in (tmp_path / 'out.jsonl').read_text().splitlines()]
+    assert count == 5 and len(rows) == 5
+    errors = [x for x in rows if 'error' in x]
+    assert len(errors) == 1 and errors[0]['error'].startswith('line 3: ValueError')
+    assert errors[0]['file'].endswith('a.jsonl')
+    assert sorted(x['case_id'] for x in rows if 'error' not in x) == ['case-0', 'case-1', 'case-3', 'case-4']
+    assert sorted(x.name for x in (tmp_path / 'done').iterdir()) == ['a.jsonl', 'b.json']
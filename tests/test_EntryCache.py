@@ -0,0 +1,53 @@
+import sqlite3
+
+from dispositions.EntryCache import EntryCache
+
+def Count(path):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+    finally:
+        connection.close()
+
+def test_count_is_kept_in_meta(tmp_path):
+    path = str(tmp_path / 'entries.sqlite')
+    a, b = EntryCache(path, commit_every=10**6), EntryCache(path, commit_every=10**6)
+    a.Put({str(n): n for n in range(100)})
+    b.Put({str(n): n for n in range(50, 150)})
+    a.commit()
+    b.commit()
+    # Records both processes saved are only counted once
+    assert len(a) == len(b) == Count(path) == 150
+    assert b.Get(['1', '149', 'missing']) == {'1': 1, '149': 149}
+    b.commit()
+    assert len(a) == 150
+    a.clear()
+    assert len(b) == Count(path) == 0
+    a.close()
+    b.close()
+
+def test_eviction_updates_count(tmp_path):
+    path = str(tmp_path / 'entries.sqlite')
+    with EntryCache(path, max_entries=100, commit_every=25) as cache:
+        for n in range(10):
+            cache.Put({str(n) + '-' + str(m): m for m in range(25)})
+            # Records read are kept over older ones
+            cache.Get(['0-0'])
+            assert len(cache) == Count(path) <= 100
+        cache.commit()
+        assert '0-0' in cache.Get(['0-0']) and len(cache) == Count(path)
+
+def test_file_without_count(tmp_path):
+    # Files written before the count was kept in meta
+    path = str(tmp_path / 'entries.sqlite')
+    with EntryCache(path) as cache:
+        cache.Put({'a': 1, 'b': 2})
+    connection = sqlite3.connect(path)
+    connection.execute("DELETE FROM meta WHERE key = 'count'")
+    connection.commit()
+    connection.close()
+    with EntryCache(path) as cache:
+        assert len(cache) == 2
+        cache.Put({'c': 3})
+        cache.commit()
+        assert len(cache) == Count(path) == 3
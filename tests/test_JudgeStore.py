@@ -0,0 +1,71 @@
+import copy
+import random
+import datetime
+
+import pytest
+
+import Synthetic
+from judges import QueryTools
+from judges.CourtNames import CourtAbbreviations
+from judges.JudgeStore import JudgeStore, WriteStore
+from judges.LoadData import ReshapeData
+
+def Result(function, *args, **kwargs):
+    # Return value, or the type of the exception raised
+    try:
+        return function(*args, **kwargs)
+    except Exception as e:
+        return type(e)
+
+@pytest.fixture
+def store(tmp_path, courtfiles):
+    data = Synthetic.FJCData(300, seed=6)
+    # A messy date and a court missing from courts.csv
+    keys = sorted(data)
+    data[keys[5]]['Commission Date (1)'] = 'sometime'
+    data[keys[9]]['Court Name (1)'] = 'U.S. Court of Nowhere'
+    reshaped = ReshapeData(copy.deepcopy(data))
+    WriteStore(str(tmp_path / 'judges.sqlite'), data, reshaped)
+    store = JudgeStore(str(tmp_path / 'judges.sqlite'))
+    yield data, reshaped, store
+    store.close()
+
+def test_sittingjudges(store):
+    data, reshaped, store = store
+    r = random.Random(1)
+    courts = [None] + sorted(set(CourtAbbreviations()[x] for x in Synthetic.Courts()))[::9]
+    for n in range(30):
+        d = datetime.date(1790,1,1) + datetime.timedelta(days=r.randrange(365*235))
+        end = d + datetime.timedelta(days=r.choice([0, 30, 4000]))
+        for c in courts:
+            assert Result(store.SittingJudges, d, end, c) == Result(QueryTools.SittingJudges, data, d, end, c)
+            assert Result(QueryTools.SittingJudges, data, d, end, c, index=store) == \
+                   Result(QueryTools.SittingJudges, data, d, end, c)
+
+def test_whichcourt_and_judges(store):
+    data, reshaped, store = store
+    r = random.Random(2)
+    for k in list(reshaped)[::3]:
+        assert store.Judge(k) == data[k]
+        assert store.Judge(k, reshaped=True) == reshaped[k]
+        for n in range(5):
+            d = datetime.date(1790,1,1) + datetime.timedelta(days=r.randrange(365*235))
+            for use_closest in [False, True]:
+                assert QueryTools.WhichCourt(d, None, k, use_closest, index=store) == \
+                       QueryTools.WhichCourt(d, reshaped, k, use_closest)
+    with pytest.raises(KeyError):
+        store.WhichCourt(datetime.date(2000,1,1), 'missing')
+
+def test_lnsearch(store):
+    data, reshaped, store = store
+    courts = [None, Synthetic.Courts()[4], CourtAbbreviations()[Synthetic.Courts()[4]].lower(), 'nowhere']
+    for name in Synthetic.surnames + ['  doe ', 'Nobody']:
+        for first_name in [None, 'John', 'Mary']:
+            for court in courts:
+                assert store.LNSearch(name, True, first_name, court) == \
+                       QueryTools.LNSearch(name, data, True, first_name, court)
+                assert store.LNSearch(name, False, first_name, court) == \
+                       QueryTools.LNSearch(name, data, False, first_name, court)
+                if court is None or court == court.lower():
+                    assert store.LNSearch(name, False, first_name, court, reshaped=True) == \
+                           QueryTools.LNSearch(name, reshaped, False, first_name, court)
@@ -0,0 +1,158 @@
+import json
+import os
+
+import pytest
+
+import Synthetic
+from judges import LoadData as LD
+
+def WriteJSON(directory, fjcdict):
+    with open(os.path.join(directory, 'judges.json'), 'w') as fp:
+        json.dump(fjcdict, fp, sort_keys=True, indent=4)
+    return directory + '/'
+
+def test_loaddata_only_writes_snapshot_when_asked(tmp_path, courtfiles):
+    fjcdict = Synthetic.FJCData(50)
+    directory = WriteJSON(str(tmp_path), fjcdict)
+    assert LD.LoadData(directory, reshape=True) == LD.ReshapeData(json.loads(json.dumps(fjcdict)))
+    assert not os.path.exists(directory + 'judges.snapshot')
+    LD.LoadData(directory, reshape=True, save_snapshot=True)
+    snapshot = LD.ReadSnapshot(directory)
+    assert snapshot['fjcdict'] == fjcdict and False in snapshot['reshaped']
+    assert LD.LoadData(directory) == fjcdict
+
+def test_snapshot_hash_is_checked(tmp_path, courtfiles, monkeypatch):
+    fjcdict = Synthetic.FJCData(50)
+    directory = WriteJSON(str(tmp_path), fjcdict)
+    LD.WriteSnapshot(directory, fjcdict)
+    assert LD.ReadSnapshot(directory) is not None
+    with open(directory + 'judges.snapshot', 'rb') as fp:
+        header, payload = fp.read().split(b'\n', 1)
+    # A damaged pickle is not unpickled
+    def Fail(*args):
+        raise AssertionError('unpickled')
+    with monkeypatch.context() as m:
+        m.setattr(LD.pickle, 'loads', Fail)
+        with open(directory + 'judges.snapshot', 'wb') as fp:
+            fp.write(header + b'\n' + payload[:-1] + bytes([payload[-1] ^ 1]))
+        assert LD.ReadSnapshot(directory) is None
+    assert LD.LoadData(directory) == fjcdict
+    # Nor is one made from another judges.json
+    LD.WriteSnapshot(directory, fjcdict)
+    fjcdict.pop(sorted(fjcdict)[0])
+    WriteJSON(str(tmp_path), fjcdict)
+    os.utime(directory + 'judges.json', ns=(0, 0))
+    assert LD.ReadSnapshot(directory) is None
+    assert LD.LoadData(directory) == fjcdict
+
+class Server(object):
+    # judges.csv served from a local http.server, with an ETag; cut=True
+    # drops the connection halfway through the file
+    def __init__(self, path):
+        import http.server
+        import threading
+        self.body, self.etag, self.cut, self.requests = None, None, False, []
+        server = self
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append(dict(self.headers))
+                if self.headers.get('If-None-Match') == server.etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(server.body)))
+                self.send_header('ETag', server.etag)
+                self.end_headers()
+                self.wfile.write(server.body[:len(server.body) // 2] if server.cut else server.body)
+                self.close_connection = True
+            def log_message(self, *args):
+                pass
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        self.path = path
+        self.url = 'http://127.0.0.1:' + str(self.httpd.server_address[1]) + '/judges.csv'
+
+    def Serve(self, fjcdict, etag):
+        Synthetic.WriteFJCCsv(self.path, fjcdict)
+        with open(self.path, 'rb') as fp:
+            self.body = fp.read()
+        self.etag = etag
+
+    def Close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def test_updatedata_conditional_download(tmp_path, courtfiles):
+    directory = str(tmp_path / 'data') + '/'
+    os.mkdir(directory)
+    server = Server(str(tmp_path / 'judges.csv'))
+    try:
+        fjcdict = Synthetic.FJCData(50)
+        server.Serve(fjcdict, '"v1"')
+        # 200: the data is saved with the headers of the download
+        assert LD.UpdateData(directory, server.url) == fjcdict
+        assert LD.LoadData(directory) == fjcdict
+        with open(directory + 'judges.fetch.json') as fp:
+            assert json.load(fp)['etag'] == '"v1"'
+        # 304: nothing is downloaded or rewritten
+        mtime = os.stat(directory + 'judges.json').st_mtime_ns
+        assert LD.UpdateData(directory, server.url) == fjcdict
+        assert server.requests[-1]['If-None-Match'] == '"v1"'
+        assert os.stat(directory + 'judges.json').st_mtime_ns == mtime
+        # 200 with changes: only the changed judges are reshaped
+        changed = Synthetic.FJCData(60)
+        changed[sorted(changed)[0]]['Last Name'] = 'Changed'
+        server.Serve(changed, '"v2"')
+        assert LD.UpdateData(directory, server.url) == changed
+        snapshot = LD.ReadSnapshot(directory)
+        assert len(snapshot['changes']['added']) == 10 and snapshot['changes']['changed'] == [sorted(changed)[0]]
+        assert snapshot['reshaped'][False] == LD.ReshapeData(json.loads(json.dumps(changed)))
+    finally:
+        server.Close()
+
+def test_updatedata_interrupted_download(tmp_path, courtfiles):
+    directory = str(tmp_path / 'data') + '/'
+    os.mkdir(directory)
+    server = Server(str(tmp_path / 'judges.csv'))
+    try:
+        fjcdict = Synthetic.FJCData(50)
+        server.Serve(fjcdict, '"v1"')
+        LD.UpdateData(directory, server.url)
+        # A cut-off download leaves the previous data in place
+        server.Serve(Synthetic.FJCData(80), '"v2"')
+        server.cut = True
+        with pytest.raises(Exception, match='cut off'):
+            LD.UpdateData(directory, server.url)
+        assert LD.LoadData(directory, snapshot=False) == fjcdict
+        with open(directory + 'judges.fetch.json') as fp:
+            assert json.load(fp)['etag'] == '"v1"'
+        assert [x for x in os.listdir(directory) if x.endswith('.tmp')] == []
+        # The next full download replaces it, keeping the old version
+        server.cut = False
+        assert LD.UpdateData(directory, server.url) == Synthetic.FJCData(80)
+        assert LD.LoadData(directory) == Synthetic.FJCData(80)
+        assert len([x for x in os.listdir(directory) if x.startswith('judges') and x.endswith('.json')
+                    and x != 'judges.fetch.json']) == 2
+    finally:
+        server.Close()
+
+def test_reshapeincremental_matches_full_reshape(tmp_path, courtfiles):
+    fjcdict = Synthetic.FJCData(200)
+    directory = WriteJSON(str(tmp_path), fjcdict)
+    snapshot = LD.WriteSnapshot(directory, fjcdict, {False: LD.ReshapeData(json.loads(json.dumps(fjcdict)))})
+    # Judges added, changed and removed
+    new = json.loads(json.dumps(Synthetic.FJCData(220)))
+    keys = sorted(new)
+    new[keys[0]]['Last Name'] = 'Changed'
+    new[keys[1]]['Termination Date (1)'] = ''
+    new[keys[2]]['Court Name (1)'] = Synthetic.Courts()[3]
+    del new[keys[3]]
+    reshaped, diff = LD.ReshapeIncremental(new, snapshot)
+    assert reshaped == LD.ReshapeData(json.loads(json.dumps(new)))
+    assert list(reshaped) == list(new)
+    assert sorted(diff['changed']) == keys[:3] and diff['removed'] == [keys[3]] and len(diff['added']) == 20
+    # Without reshaped data in the snapshot, everything is reshaped
+    reshaped, diff = LD.ReshapeIncremental(new, dict(snapshot, reshaped={}))
+    assert reshaped == LD.ReshapeData(json.loads(json.dumps(new)))
@@ -0,0 +1,50 @@
+import pytest
+
+import Synthetic
+from judges.NameFinder import MatchSpans, NameFinder, NameIndex
+
+@pytest.fixture(scope='module')
+def names():
+    namedict = Synthetic.NameDict(Synthetic.FJCData(400, courts=['Court']))
+    return namedict, Synthetic.NameStrings(namedict, 300)
+
+@pytest.mark.parametrize('matches', ['all', 'best', 'best_inclusive', 'exact'])
+def test_nameindex_matches_full_scan(names, matches):
+    namedict, strings = names
+    index = NameIndex(namedict)
+    for string in strings:
+        assert NameFinder(namedict, string, matches=matches, index=index) == \
+               NameFinder(namedict, string, matches=matches), string
+    subset = list(namedict)[::3]
+    for string in strings[:100]:
+        assert NameFinder(namedict, string, subset=subset, easy_output=True, index=index) == \
+               NameFinder(namedict, string, subset=subset, easy_output=True), string
+
+def test_nameindex_update(names):
+    namedict, strings = dict(names[0]), names[1]
+    index = NameIndex(namedict)
+    changed = list(namedict)[:20]
+    for k in changed:
+        namedict[k] = dict(namedict[k], **{'Last Name': namedict[k]['Last Name'] + 'son'})
+    namedict['999'] = dict(namedict[changed[-1]], **{'Last Name': 'Newname'})
+    index.Update(changed + ['999'])
+    strings = strings[:100] + ['Judge ' + namedict[k]['First Name'] + ' ' + namedict[k]['Last Name']
+                               for k in changed + ['999']]
+    for string in strings:
+        assert NameFinder(namedict, string, index=index) == NameFinder(namedict, string), string
+
+def test_matchspans_keeps_span_freed_by_longer_match():
+    # "AA BB CC DD" contains "BB" and overlaps the longer "DD EE FF GG HH",
+    # which wins; "BB" overlaps nothing that is kept
+    tokens = ['AA', 'BB', 'CC', 'DD', 'EE', 'FF', 'GG', 'HH']
+    allmatches = {'AA BB': [(5, '2', 'FJC Name: B', 'BB')],
+                  'AA BB CC DD': [(3, '1', 'FJC Name: A', 'AA BB CC DD')],
+                  'DD EE FF GG HH': [(0, '3', 'FJC Name: D', 'DD EE FF GG HH')]}
+    assert MatchSpans(tokens, allmatches) == [(3, 5, '2', 5), (9, 23, '3', 0)]
+
+def test_matchspans_same_span_and_ties():
+    tokens = ['JOHN', 'DOE', 'JANE', 'DOE']
+    allmatches = {'JOHN DOE': [(0, '1', 'FJC Name: JOHN DOE', 'JOHN DOE'), (5, '2', 'FJC Name: J DOE', 'JOHN DOE')],
+                  'JOHN DOE JANE DOE': [(0, '3', 'FJC Name: JANE DOE', 'JANE DOE'), (8, '4', 'FJC Name: DOE', 'DOE JANE')]}
+    # "DOE JANE" is as long as "JOHN DOE" and "JANE DOE", but starts between them
+    assert MatchSpans(tokens, allmatches) == [(0, 8, '1', 0), (0, 8, '2', 5), (9, 17, '3', 0)]
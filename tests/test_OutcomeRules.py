@@ -0,0 +1,150 @@
+import random
+import re
+
+import pytest
+
+from dispositions.CivilDictionaryClassifier import DedupeMotions, outvars
+from dispositions.OutcomeRules import DefaultRules, RuleEngine
+
+settlement = ['consent_judg', 'settlement_agr', 'stipul.dismiss', 'voluntari.dismiss']
+settsearch1 = '(' + '|'.join(settlement) + ')'
+settsearch2 = '(case_settl|settlement|settl|joint|consent|stipul)'
+
+stems = ['motion', 'petit', 'grant', 'deni', 'dismiss', 'by_def', 'by_pla', 'defend', 'plaintiff', 'summari',
+         'judgment', 'default', 'with_prejudic', 'without_prejudic', 'habea', 'remand', 'affirm', 'revers',
+         'transfer', 'r_r', 'adopt', 'lack', 'jurisdict', 'stand', 'stipul', 'proposed_ord', 'favor', 'against',
+         'award', 'platiff', 'damag', 'entitl', 'settl', 'consent', 'joint', 'settlement', 'case_settl',
+         'consent_judg', 'settlement_agr', 'voluntari']
+phrases = ['forma pauperis', 'forum non conveniens', 'order', 'motion']
+
+def Baseline(raw, text_merge, habeas):
+    # The rules of Classify before they were a table
+    outcome = {x: False for x in outvars}
+    if 'forma pauperis' in raw:
+        outcome['forma_pauperis'] = True
+    if 'forum non conveniens' in raw:
+        outcome['forum_non_conveniens'] = True
+    if 'r_r' in text_merge and 'adopt' in text_merge:
+        outcome['r&r'] = True
+    if 'transfer' in text_merge:
+        outcome['transfer'] = True
+    if 'default.judgment' in text_merge and 'dismiss' not in text_merge:
+        outcome['default'] = True
+    if 'remand' in text_merge:
+        outcome['remand'] = True
+        if re.search(settsearch2, text_merge):
+            outcome['settlement'] = True
+    if 'affirm' in text_merge:
+        outcome['review'] = True
+        outcome['defendant'] = True
+    if 'revers' in text_merge:
+        outcome['review'] = True
+        outcome['plaintiff'] = True
+    if habeas == True or 'habea' in text_merge:
+        if 'petit.deni' in text_merge and not 'petit.grant' in text_merge:
+            outcome['dismiss'] = True
+            if not 'without_prejudic' in text_merge:
+                outcome['w_prej-involuntary'] = True
+            else:
+                outcome['wo_prej'] = True
+        if 'petit.grant' in text_merge and not 'petit.deni' in text_merge:
+            outcome['plaintiff'] = True
+        if ('deni' in text_merge or 'dismiss' in text_merge) and not 'grant' in text_merge:
+            outcome['dismiss'] = True
+            if not 'without_prejudic' in text_merge:
+                outcome['w_prej-involuntary'] = True
+            else:
+                outcome['wo_prej'] = True
+        if ('deni' not in text_merge and 'dismiss' not in text_merge) and 'grant' in text_merge:
+            outcome['plaintiff'] = True
+    if re.search(settsearch1, text_merge):
+        outcome['dismiss'] = True
+        outcome['settlement'] = True
+        outcome['w_prej-voluntary'] = True
+    elif 'dismiss' in text_merge and (habeas == False and 'habea' not in text_merge):
+        outcome['dismiss'] = True
+        if 'without_prejudic' in text_merge:
+            outcome['wo_prej'] = True
+        if 'with_prejudic' in text_merge:
+            if re.search(settsearch2, text_merge):
+                outcome['settlement'] = True
+                outcome['w_prej-voluntary'] = True
+            else:
+                outcome['w_prej-involuntary'] = True
+        if 'without_prejudic' not in text_merge and 'with_prejudic' not in text_merge:
+            if 'stipul' in text_merge and 'proposed_ord' in text_merge:
+                outcome['settlement'] = True
+                outcome['w_prej-voluntary'] = True
+            else:
+                outcome['wo_prej_d'] = True
+    if 'lack.jurisdict' in text_merge:
+        outcome['lack_jurisdiction'] = True
+    if 'lack.stand' in text_merge:
+        outcome['lack_standing'] = True
+    mss = []
+    for i in (text_merge.split('-') if text_merge != '' else []):
+        if 'petit' in i or 'motion' in i:
+            i = i.replace('petit', 'motion')
+            if 'by_def' in i or 'defend.motion' in i:
+                mss.append('defendant/mot_pet')
+                for r in re.findall('(?:grant|deni)', i):
+                    mss.append('defendant/mot_pet/' + r)
+            if ('by_pla' in i or 'plaintiff.motion' in i) and 'grant' in i:
+                mss.append('plaintiff/mot_pet')
+                for r in re.findall('(?:grant|deni)', i):
+                    mss.append('plaintiff/mot_pet/' + r)
+        if 'summari.judgment' in i and not 'deni' in i:
+            outcome['sumjud'] = True
+            if 'motion.summari.judgment' in i and ('grant' in i and 'deni' not in i):
+                if 'by_def' in i or 'defend' in i:
+                    outcome['defendant'] = True
+                if 'by_pla' in i or 'plaintiff' in i:
+                    outcome['plaintiff'] = True
+        elif 'judgment' in i and not 'default.judgment' in i:
+            if not any(outcome[z] for z in outcome if
+                       z not in ['r&r', 'lack_jurisdiction', 'lack_standing', 'forma_pauperis',
+                                 'forum_non_conveniens']):
+                outcome['jud'] = True
+    if outcome['jud'] == True or outcome['sumjud'] == True:
+        if 'favor.defend' in text_merge or 'against.plaintiff' in text_merge:
+            outcome['defendant'] = True
+        if 'favor.plaintiff' in text_merge or 'against.defend' in text_merge:
+            outcome['plaintiff'] = True
+        if 'award.platiff.damag' in text_merge:
+            outcome['plaintiff'] = True
+        if 'plaintiff.entitl.judgment' in text_merge:
+            outcome['plaintiff'] = True
+        if 'defend.entitl.judgment' in text_merge:
+            outcome['defendant'] = True
+    outcome['motions_petitions'] = DedupeMotions(mss)
+    return outcome
+
+def Cases(n, seed=0):
+    rng = random.Random(seed)
+    for k in range(n):
+        clauses = ['.'.join(rng.choice(stems) for x in range(rng.randint(1, 6))) for y in range(rng.randint(0, 5))]
+        raw = ' '.join(rng.choice(phrases) for x in range(rng.randint(0, 3)))
+        yield raw, '-'.join(clauses), rng.random() < 0.2
+
+@pytest.mark.parametrize('regex', [False, True])
+def test_default_rules_match_baseline(regex):
+    # A settlement phrase that is not a plain string makes DefaultRules use a regex
+    rules = RuleEngine(DefaultRules(settlement + (['consent_judg(?:ment)?'] if regex else [])))
+    for raw, text_merge, habeas in Cases(5000):
+        outcome = {x: False for x in outvars}
+        outcome['motions_petitions'] = DedupeMotions(rules.Apply(raw, text_merge, outcome, habeas))
+        assert outcome == Baseline(raw, text_merge, habeas), (raw, text_merge, habeas)
+
+def test_custom_rules():
+    rules = RuleEngine([{'scope': 'text', 'when': ('regex', 'deni.*grant'), 'set': ['review']},
+                        {'scope': 'clause', 'when': ('all', 'motion', ('not', ('outcome', 'review'))),
+                         'set': ['jud'], 'emit': 'any/mot', 'each': ['grant', 'deni']},
+                        {'scope': 'raw', 'when': ('option', 'habeas', True), 'set': ['transfer']}])
+    outcome = {x: False for x in outvars}
+    assert rules.Apply('', 'motion.grant.deni-order', outcome, True) == ['any/mot', 'any/mot/grant', 'any/mot/deni']
+    assert outcome['jud'] and outcome['transfer'] and not outcome['review']
+    outcome = {x: False for x in outvars}
+    assert rules.Apply('', 'deni-motion.grant', outcome) == []
+    assert outcome['review'] and not outcome['jud'] and not outcome['transfer']
+    with pytest.raises(Exception):
+        RuleEngine([{'scope': 'text', 'when': ('not', 'a', 'b'), 'set': []}])
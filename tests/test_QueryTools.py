@@ -0,0 +1,141 @@
+import random
+import datetime
+
+import pytest
+
+import Synthetic
+from judges.CourtNames import CourtAbbreviations
+from judges.QueryTools import SittingIndex, SittingJudges
+
+def Result(function, *args, **kwargs):
+    # Return value, or the type of the exception raised
+    try:
+        return function(*args, **kwargs)
+    except Exception as e:
+        return type(e)
+
+def Dates(r, n):
+    return [datetime.date(1790,1,1) + datetime.timedelta(days=r.randrange(365*235)) for x in range(n)]
+
+@pytest.fixture
+def data(courtfiles):
+    return Synthetic.FJCData(400, seed=4)
+
+def test_sittingindex_matches_sittingjudges(data):
+    index = SittingIndex(data)
+    r = random.Random(1)
+    courts = [None] + sorted(set(CourtAbbreviations()[x] for x in Synthetic.Courts()))[::5]
+    for d in Dates(r, 40):
+        end = d + datetime.timedelta(days=r.choice([0, 1, 30, 4000]))
+        for c in courts:
+            assert SittingJudges(data, d, end, c, index=index) == SittingJudges(data, d, end, c), (d, end, c)
+        assert SittingJudges(data, d, index=index) == SittingJudges(data, d)
+    # Open-ended and messy dates (SittingJudges fails on the messy ones)
+    data[sorted(data)[0]]['Termination Date (1)'] = 'unknown'
+    index = SittingIndex(data)
+    for d in Dates(r, 20) + [datetime.date(1700,1,1), datetime.date(9999,12,31)]:
+        assert Result(SittingJudges, data, d, index=index) == Result(SittingJudges, data, d)
+
+def test_serviceindex_matches_whichcourt(data):
+    import copy
+    from judges.LoadData import ReshapeData
+    from judges.QueryTools import ServiceIndex, WhichCourt, WhichCourtMany
+    reshaped = ReshapeData(copy.deepcopy(data))
+    # Spells without start dates (like magistrates')
+    for k in sorted(reshaped)[:40]:
+        for x in ['date_nomination', 'date_confirmation', 'date_commission']:
+            reshaped[k]['Courts'][sorted(reshaped[k]['Courts'])[0]][x] = None
+    index = ServiceIndex(reshaped)
+    r = random.Random(2)
+    pairs = [(d, r.choice(list(reshaped))) for d in Dates(r, 3000)]
+    pairs += [(d, k) for d in Dates(r, 20) for k in sorted(reshaped)[:40]]
+    for use_closest in [False, True]:
+        expected = [Result(WhichCourt, d, reshaped, k, use_closest) for d, k in pairs]
+        assert [Result(WhichCourt, d, reshaped, k, use_closest, index) for d, k in pairs] == expected
+        # (WhichCourt fails on spells without start dates that ended by the date)
+        ok = [n for n, x in enumerate(expected) if type(x) is tuple]
+        assert list(WhichCourtMany([pairs[n] for n in ok], reshaped, use_closest)) == [expected[n] for n in ok]
+    assert any(x != (None, None) for x in expected) and ValueError in expected
+
+@pytest.mark.parametrize('use_numpy', [False, True])
+def test_spellcolumns_matches_sittingjudges(data, use_numpy):
+    from judges.QueryTools import SpellColumns
+    if use_numpy:
+        pytest.importorskip('numpy')
+    r = random.Random(3)
+    dates = Dates(r, 30) + [datetime.date(9999,12,31)]
+    courts = sorted(set(CourtAbbreviations()[x] for x in Synthetic.Courts()))[::7]
+    columns = SpellColumns(data, use_numpy)
+    assert columns.SittingJudges(dates) == [SittingJudges(data, d) for d in dates]
+    for c in courts:
+        assert columns.SittingJudges(dates, c.lower()) == [SittingJudges(data, d, None, c.lower()) for d in dates]
+    mixed = [r.choice(courts) for d in dates]
+    assert columns.SittingJudges(dates, mixed) == [SittingJudges(data, d, None, c) for d, c in zip(dates, mixed)]
+    # SittingJudges fails on messy dates
+    data[sorted(data)[0]]['Senior Status Date (1)'] = '1950'
+    columns = SpellColumns(data, use_numpy)
+    for d in dates[:20]:
+        assert Result(columns.SittingJudges, [d]) == Result(lambda: [SittingJudges(data, d)])
+
+def Scan(string, dictionary, first_name=None, court=None):
+    # LNSearch without an index
+    found = []
+    for k in dictionary:
+        if dictionary[k]["Last Name"].lower().strip() != string.lower().strip():
+            continue
+        if first_name is not None and dictionary[k]["First Name"].lower().strip() != first_name.lower().strip():
+            continue
+        if court is not None:
+            if "Courts" in dictionary[k]:
+                courts = [x['court'] for x in dictionary[k]["Courts"].values()]
+            else:
+                courts = [dictionary[k]['Court Name ('+str(n)+')'] for n in range(1,7)]
+                courts += [CourtAbbreviations().get(x,'') for x in courts]
+            if court.lower().strip() not in [x.lower().strip() for x in courts if x not in ['',None]]:
+                continue
+        found.append(k)
+    return found
+
+def test_lnindex_matches_scan(data, monkeypatch):
+    import copy
+    from judges import QueryTools
+    from judges.LoadData import ReshapeData
+    reshaped = ReshapeData(copy.deepcopy(data))
+    courts = [None, Synthetic.Courts()[4], CourtAbbreviations()[Synthetic.Courts()[4]], 'nowhere']
+    for dictionary in [data, reshaped]:
+        for name in Synthetic.surnames + [' DOE ', 'Nobody']:
+            for first_name in [None, 'John', 'mary ']:
+                for court in courts:
+                    assert QueryTools.LNSearch(name, dictionary, True, first_name, court) == \
+                           sorted(set(Scan(name, dictionary, first_name, court)))
+                    assert list(QueryTools.LNSearch(name, dictionary, False, first_name, court)) == \
+                           Scan(name, dictionary, first_name, court)
+    # courts.csv is only needed to filter FJC data by court
+    QueryTools.lnindex_cache.clear()
+    def Fail():
+        raise AssertionError('courts.csv loaded')
+    monkeypatch.setattr(QueryTools, 'CourtAbbreviations', Fail)
+    assert QueryTools.LNSearch('Doe', data, True, 'John') == sorted(Scan('Doe', data, 'John'))
+    with pytest.raises(AssertionError):
+        QueryTools.LNSearch('Doe', data, court='ca9')
+
+def test_lnindex_cache(data):
+    from judges import QueryTools
+    copied = dict(data)
+    index = QueryTools.GetLNIndex(data)
+    assert QueryTools.GetLNIndex(data) is index
+    assert QueryTools.GetLNIndex(copied) is not index
+    # A new judge (in place) gets a new index
+    copied['new'] = dict(data[sorted(data)[0]], **{'Last Name': 'Newname'})
+    assert QueryTools.LNSearch('newname', copied, True) == ['new']
+    for n in range(5):
+        QueryTools.GetLNIndex(dict(data))
+    assert len(QueryTools.lnindex_cache) == 4
+
+def test_sittingjudges_court_lookup(data):
+    from judges.CourtNames import AbbreviateCourt
+    for x in Synthetic.Courts():
+        assert AbbreviateCourt(x, True) == CourtAbbreviations()[x] == AbbreviateCourt(x.lower()).upper()
+    data[sorted(data)[3]]['Court Name (1)'] = 'U.S. Court of Nowhere'
+    with pytest.raises(KeyError):
+        SittingJudges(data, datetime.date(2000,1,1), None, 'CA9')
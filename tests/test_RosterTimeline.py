@@ -0,0 +1,70 @@
+import random
+import datetime
+
+import Synthetic
+from judges.QueryTools import RosterTimeline, SittingIndex, SittingJudges
+
+def Data():
+    # Synthetic judges, some of them serving in courts missing from courts.csv
+    r = random.Random(5)
+    data = Synthetic.FJCData(300, seed=2)
+    for k in data:
+        for n in range(1,7):
+            if data[k]['Court Name ('+str(n)+')'] != '' and r.random() < 0.1:
+                data[k]['Court Name ('+str(n)+')'] = 'U.S. Court of Nowhere'
+    return data
+
+def Dates(r, n):
+    return [datetime.date(1900,1,1) + datetime.timedelta(days=r.randrange(365*120)) for x in range(n)]
+
+def test_count_matches_sittingjudges(courtfiles):
+    data = Data()
+    timeline = RosterTimeline(data)
+    assert timeline.unknown != []
+    r = random.Random(1)
+    for d in Dates(r, 200):
+        found = SittingJudges(data, d)
+        assert timeline.Count(d) == (len(found['active']), len(found['senior']))
+    # SittingJudges fails on unknown courts when given a court
+    data = Synthetic.FJCData(300, seed=2)
+    timeline, index = RosterTimeline(data), SittingIndex(data)
+    for court in timeline.Courts()[:5]:
+        for d in Dates(r, 50):
+            found = SittingJudges(data, d, None, court, index=index)
+            assert timeline.Count(d, court) == (len(found['active']), len(found['senior']))
+
+def test_judgedays_matches_summed_sittingjudges(courtfiles):
+    data = Data()
+    timeline = RosterTimeline(data)
+    r = random.Random(2)
+    for begdate in Dates(r, 3):
+        enddate = begdate + datetime.timedelta(days=r.randrange(200))
+        total = [0, 0]
+        d = begdate
+        while d <= enddate:
+            found = SittingJudges(data, d)
+            total = [total[0] + len(found['active']), total[1] + len(found['senior'])]
+            d += datetime.timedelta(days=1)
+        assert timeline.JudgeDays(begdate, enddate) == tuple(total)
+
+def test_panel(courtfiles):
+    timeline = RosterTimeline(Data())
+    court = timeline.Courts()[0]
+    begdate, enddate = datetime.date(1990,1,15), datetime.date(1990,3,10)
+    days = timeline.Panel(begdate, enddate, court)
+    assert len(days) == (enddate - begdate).days + 1
+    assert all(x[2:] == timeline.Count(x[1], court) for x in days)
+    months = timeline.Panel(begdate, enddate, court, by='month')
+    assert [x[1] for x in months] == ['1990-01', '1990-02', '1990-03']
+    assert (sum(x[2] for x in months), sum(x[3] for x in months)) == timeline.JudgeDays(begdate, enddate, court)
+
+def test_open_ended_dates(courtfiles):
+    timeline = RosterTimeline(Data())
+    court = timeline.Courts()[0]
+    end = datetime.date(9999,12,31)
+    begdate = datetime.date(9999,11,20)
+    days = [timeline.Count(begdate + datetime.timedelta(days=x), court) for x in range(42)]
+    assert timeline.JudgeDays(begdate, end, court) == (sum(x[0] for x in days), sum(x[1] for x in days))
+    months = timeline.Panel(begdate, end, court, by='month')
+    assert [x[1] for x in months] == ['9999-11', '9999-12']
+    assert (months[0][2] + months[1][2], months[0][3] + months[1][3]) == timeline.JudgeDays(begdate, end, court)
@@ -0,0 +1,81 @@
+import random
+import re
+
+import pytest
+
+from dispositions.CivilDictionaryClassifier import TextNormalizer, ExpandTerm, clause_breaks
+
+def Sequential(string, abbr, keyphrs):
+    # The text standardization of BasicTextFormatter before TextNormalizer:
+    # one re.sub per shorthand term, in dictionary order
+    i = string.lower()
+    i = re.sub(r'\([^\)]*\)', ' ', i)
+    i = re.sub(r'\[[^\]]*\]', ' ', i)
+    i = ' '.join(i.replace('\n\n', '. ').split())
+    i = i.replace("'s ", " _s ")
+    i = i.replace("s' ", "s _s ")
+    i = i.replace(' respondent', ' defendant')
+    i = i.replace(' petitioner', ' plaintiff')
+    i = i.replace('&', ' and ')
+    i = i.replace(' w/ ', ' with ')
+    i = i.replace(' w/p', ' with p')
+    i = i.replace(' w/o ', ' without ')
+    i = i.replace(' w/out ', ' without ')
+    i = i.replace(' w/ out ', ' without ')
+    for s in abbr:
+        i = re.sub('(^|[^A-z])' + s + '($|[^A-z])', '\\1' + abbr[s] + '\\2', i)
+    i = i.replace(' is gr ', ' is granted ')
+    i = i.replace(" _s ", "_s ")
+    i = re.sub(' (petitions?|motions?) (?:for|to) ([^ ]+) ', ' \\1 \\2 ', i)
+    i = re.sub(' (def|pla)(?:endant|intiff)s?(?:_s)? (petitions?|motions?)', ' by_\\1 \\2 ', i)
+    i = re.sub(' (?:by|filed by) (?:the )?(def|pla)(?:endant|intiff)s? ', ' by_\\1 ', i)
+    for s in keyphrs:
+        i = i.replace(s, s.replace(' ', '_'))
+    i = i.replace(' r and r ', ' r_r ')
+    i = i.replace(' report and recommendations ', ' r_r ')
+    i = i.replace(' report and recommendation ', ' r_r ')
+    i = i.replace(' stipulation and order ', ' order ')
+    i = re.sub('judgment for (?:all )?(def|pla)', 'judgment in favor of \\1', i)
+    i = re.sub('judgment (?:is )?granted +(?:for|to) +(?:all +)?(def|pla)', 'judgment in favor of \\1', i)
+    i = re.sub('(^| )[^a-z' + clause_breaks + ']{2,}($| )', '\\1 \\2', i)
+    i = ' '.join(i.split())
+    i = i.replace('plaintiffs_s ', 'plaintiff ')
+    i = i.replace('plaintiff_s ', 'plaintiff ')
+    i = i.replace('defendants_s ', 'defendant ')
+    i = i.replace('defendant_s ', 'defendant ')
+    i = re.sub(r' ([,\.;:_])', '\\1', i)
+    return i
+
+words = ['order', 'granting', 'motion', 'motions', 'for', 'to', 'by', 'filed', 'the', 'defendant', 'plaintiffs',
+         "defendant's", "plaintiffs'", 'respondent', 'petitioner', 'petition', 'judgment', 'is', 'granted', 'all',
+         'w/', 'w/o', 'w/out', 'w/p', 'out', '&', 'r', 'and', 'report', 'recommendation', 'stipulation', 'with',
+         'prejudice', 'without', 'settlement', 'consent', 'proposed', 'ORDER', 'USDC', '12', '(sealed)', '[doc 4]',
+         '(', ')', '.', ',', ';', ':', '\n\n', '-', '/']
+punctuation = ['', '', '', '.', ',', ';', ':', "'s", "s'", '-', '/']
+
+def Texts(normalizer, n, seed=0):
+    rng = random.Random(seed)
+    vocabulary = words + [x for s in normalizer.abbr for x in (ExpandTerm(s) or [s])] + list(normalizer.abbr.values())
+    for k in range(n):
+        tokens = [rng.choice(vocabulary) + rng.choice(punctuation) for x in range(rng.randint(0, 25))]
+        yield ''.join(x + rng.choice([' ', ' ', ' ', '', '  ', '\n']) for x in tokens)
+
+def test_normalizer_matches_sequential_pipeline():
+    normalizer = TextNormalizer()
+    assert normalizer.fast
+    for string in Texts(normalizer, 5000):
+        assert normalizer.Normalize(string) == Sequential(string, normalizer.abbr, normalizer.keyphrs), string
+
+@pytest.mark.parametrize('regex', [False, True])
+def test_custom_dictionary(tmp_path, regex):
+    # Terms that create other terms (and one that is not a plain word, which
+    # makes TextNormalizer always use the sequential substitutions)
+    (tmp_path / 'shorthand.txt').write_text('Source\t\nmot\tmotion\nmo\tmot\nsj\tsum jgm\nsum\tsummary\n'
+                                            'jgm\tjudgment\ngr\tgranted' + ('\nd[ae]ft\tdefendant' if regex else ''))
+    (tmp_path / 'settlement.txt').write_text('consent judgment\nsummary judgment')
+    (tmp_path / 'prejudice.txt').write_text('with prejudice')
+    normalizer = TextNormalizer(str(tmp_path / 'shorthand.txt'), str(tmp_path / 'settlement.txt'),
+                                str(tmp_path / 'prejudice.txt'))
+    assert normalizer.fast != regex
+    for string in Texts(normalizer, 2000, seed=1):
+        assert normalizer.Normalize(string) == Sequential(string, normalizer.abbr, normalizer.keyphrs), string